@@ -0,0 +1,102 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from dotenv import load_dotenv
+from app.models.roles_model import Role
+from app.models.user_model import UserModel
+
+load_dotenv()
+
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", 10000))
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", 60))
+
+
+# bounded LRU cache with TTL of authenticated user principals, keyed by the token subject (email)
+class AuthUserCache:
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, email: str):
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            user, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[email]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(email)
+            self.hits += 1
+            return user
+
+    def set(self, email: str, user):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[email] = (user, time.monotonic() + self.ttl)
+            self._entries.move_to_end(email)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last = False)
+                self.evictions += 1
+
+    # drop the cached principal after the user was changed or deleted
+    def invalidate(self, email: str):
+        with self._lock:
+            if self._entries.pop(email, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
+
+
+auth_user_cache = AuthUserCache(max_size = AUTH_CACHE_SIZE, ttl = AUTH_CACHE_TTL)
+
+
+# load the slim projection of the authenticated user (no relationships) together with its role name
+async def load_auth_user(email: str, db: AsyncSession):
+    user = auth_user_cache.get(email)
+    if user is not None:
+        return user
+
+    result = await db.execute(
+        select(UserModel.id, UserModel.name, UserModel.email, UserModel.role_id, Role.role_name)
+        .join(Role, Role.id == UserModel.role_id)
+        .filter(UserModel.email == email)
+    )
+    user = result.first()
+
+    if user is not None:
+        auth_user_cache.set(email, user)
+    return user
@@ -11,20 +11,20 @@ class JWTBearer(HTTPBearer):
         if credentials:
             if not credentials.scheme == "Bearer":
                 raise HTTPException(status_code = 403, detail = "Invalid authentication scheme.")
-            if not self.verify_jwt(credentials.credentials):
+            email = self.verify_jwt(credentials.credentials)
+            if not email:
                 raise HTTPException(status_code = 403, detail = "Invalid token or expired token.")
+            # keep the decoded subject so the token is not decoded again later in the request
+            request.state.token_email = email
             return credentials.credentials
         else:
             raise HTTPException(status_code = 403, detail = "Invalid authorization code.")
 
 
-    # verify the jwt token
-    def verify_jwt(self, jwt_token: str) -> bool:
-        is_token_valid: bool = False
+    # verify the jwt token and return its subject (email)
+    def verify_jwt(self, jwt_token: str):
         try:
             payload = decode_jwt_token(jwt_token)
         except:
             payload = None
-        if payload:
-            is_token_valid = True
-        return is_token_valid
+        return payload
@@ -1,11 +1,136 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
 from passlib.context import CryptContext
 
-password_context = CryptContext(schemes = ["bcrypt"], deprecated = "auto")
+load_dotenv()
 
-# convert the plain password to hashed password 
-class Hash: 
+# hashing scheme and cost, hashes made with other settings are upgraded on the next successful login
+PASSWORD_SCHEME = os.getenv("PASSWORD_SCHEME", "bcrypt")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+# argon2 needs the argon2-cffi package
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", 3))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", 65536))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", 4))
+
+
+# password context for a scheme and cost, older schemes stay verifiable but are marked deprecated
+def build_password_context(scheme: str = PASSWORD_SCHEME, bcrypt_rounds: int = BCRYPT_ROUNDS, argon2_time_cost: int = ARGON2_TIME_COST, argon2_memory_cost: int = ARGON2_MEMORY_COST, argon2_parallelism: int = ARGON2_PARALLELISM):
+    schemes = ["argon2", "bcrypt"] if scheme == "argon2" else ["bcrypt"]
+    return CryptContext(
+        schemes = schemes,
+        deprecated = "auto",
+        bcrypt__rounds = bcrypt_rounds,
+        argon2__time_cost = argon2_time_cost,
+        argon2__memory_cost = argon2_memory_cost,
+        argon2__parallelism = argon2_parallelism
+    )
+
+
+password_context = build_password_context()
+
+# bcrypt releases the GIL while hashing, so a thread pool runs hashes in parallel
+HASH_POOL_SIZE = int(os.getenv("HASH_POOL_SIZE", os.cpu_count() or 1))
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", 64))
+
+
+# raised instead of queueing when the hashing pool already holds its maximum of waiting jobs
+class HashPoolBusyError(Exception):
+    pass
+
+
+# bounded worker pool running the CPU heavy hashing off the event loop
+class HashWorkerPool:
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers = max_workers, thread_name_prefix = "password-hash")
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+        self.max_run = 0.0
+
+    def _record(self, waited: float, ran: float):
+        with self._lock:
+            self.completed += 1
+            self.total_wait += waited
+            self.total_run += ran
+            self.max_wait = max(self.max_wait, waited)
+            self.max_run = max(self.max_run, ran)
+
+    async def run(self, func, *args):
+        with self._lock:
+            if self.in_flight >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise HashPoolBusyError("Password hashing pool is saturated")
+            self.in_flight += 1
+
+        submitted = time.perf_counter()
+
+        def timed_call():
+            started = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                self._record(started - submitted, time.perf_counter() - started)
+
+        # the slot is freed when the job itself finishes, not when its caller stops waiting: a cancelled request
+        # leaves a job that has already started running on the thread until it is done
+        try:
+            future = self._executor.submit(timed_call)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    # done callback of the executor future, runs on the worker thread (or at once for a job cancelled before it started)
+    def _release(self, future = None):
+        with self._lock:
+            self.in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            completed = self.completed
+            return {
+                "workers": self.max_workers,
+                "queue_limit": self.max_queue,
+                "in_flight": self.in_flight,
+                "queue_depth": max(0, self.in_flight - self.max_workers),
+                "completed": completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self.total_wait / completed * 1000, 3) if completed else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+                "avg_run_ms": round(self.total_run / completed * 1000, 3) if completed else 0.0,
+                "max_run_ms": round(self.max_run * 1000, 3)
+            }
+
+
+hash_pool = HashWorkerPool(max_workers = HASH_POOL_SIZE, max_queue = HASH_QUEUE_LIMIT)
+
+
+# convert the plain password to hashed password
+class Hash:
     def bcrypt(password: str):
         return password_context.hash(password)
 
     def verify(hashed_password, plain_password):
         return password_context.verify(plain_password, hashed_password)
+
+    # True when the hash was made with a deprecated scheme or a different cost than configured
+    def needs_update(hashed_password):
+        return password_context.needs_update(hashed_password)
+
+    # same as bcrypt / verify, run on the hashing pool so the event loop is not blocked
+    async def bcrypt_async(password: str):
+        return await hash_pool.run(Hash.bcrypt, password)
+
+    async def verify_async(hashed_password, plain_password):
+        return await hash_pool.run(Hash.verify, hashed_password, plain_password)
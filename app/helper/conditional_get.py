@@ -0,0 +1,55 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import Request, Response
+
+# clients may keep the body but have to revalidate it on every use
+CONDITIONAL_CACHE_CONTROL = "private, no-cache"
+
+
+def _timestamp(value: datetime):
+    # updated_at columns are naive TIMESTAMPs, read them the same way on every request
+    if value.tzinfo is None:
+        value = value.replace(tzinfo = timezone.utc)
+    return int(value.timestamp())
+
+
+# (etag, last modified timestamp) of a view from the values it depends on (ids, updated_at and row_version columns,
+# counts); the row versions tell apart writes within the same second of updated_at. Weak, since the body itself is
+# not hashed
+def build_validators(view: str, *parts):
+    digest = hashlib.blake2b("|".join([view] + [str(_timestamp(part)) if isinstance(part, datetime) else str(part) for part in parts]).encode(), digest_size = 12).hexdigest()
+    timestamps = [_timestamp(part) for part in parts if isinstance(part, datetime)]
+    return f'W/"{digest}"', max(timestamps) if timestamps else None
+
+
+# True when the client's copy (If-None-Match, or else If-Modified-Since) is still current
+def is_not_modified(request: Request, etag: str, last_modified: int = None):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag.removeprefix("W/") in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            return last_modified <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _validator_headers(etag: str, last_modified: int = None):
+    headers = {"ETag": etag, "Cache-Control": CONDITIONAL_CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt = True)
+    return headers
+
+
+def not_modified_response(etag: str, last_modified: int = None):
+    return Response(status_code = 304, headers = _validator_headers(etag, last_modified))
+
+
+# add the validators to the response of a route that returns its body model
+def set_validators(response: Response, etag: str, last_modified: int = None):
+    response.headers.update(_validator_headers(etag, last_modified))
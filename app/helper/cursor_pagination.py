@@ -0,0 +1,86 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import DateTime, and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+# raised when a client sends a cursor that was not issued for this listing
+class InvalidCursorError(ValueError):
+    pass
+
+
+# encode the last row position as an opaque, url safe cursor
+def encode_cursor(sort_key: str, direction: str, value, last_id: int):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps({"k": sort_key, "d": direction, "v": value, "i": last_id}, separators = (",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+# decode a cursor back into the sort value and id of the last row of the previous page
+def decode_cursor(cursor: str, sort_key: str, direction: str, sort_column):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value, last_id = payload["v"], int(payload["i"])
+    except Exception:
+        raise InvalidCursorError("Malformed cursor")
+
+    if payload.get("k") != sort_key or payload.get("d") != direction:
+        raise InvalidCursorError("Cursor was issued for a different sort order")
+
+    if value is not None and isinstance(sort_column.type, DateTime):
+        value = datetime.fromisoformat(value)
+    return value, last_id
+
+
+# keyset condition for rows after (value, last_id), NULLs sort first ascending and last descending
+def _after(sort_column, id_column, direction: str, value, last_id: int):
+    if sort_column is id_column:
+        return id_column > last_id if direction == "asc" else id_column < last_id
+
+    if direction == "asc":
+        if value is None:
+            return or_(and_(sort_column.is_(None), id_column > last_id), sort_column.isnot(None))
+        return or_(sort_column > value, and_(sort_column == value, id_column > last_id))
+
+    if value is None:
+        return and_(sort_column.is_(None), id_column < last_id)
+    return or_(sort_column < value, and_(sort_column == value, id_column < last_id), sort_column.is_(None))
+
+
+# fetch one page of a column query (which has to select the id) ordered by (sort column, id) starting after the cursor
+async def paginate_by_cursor(db: AsyncSession, query, model, size: int, sort_key: Optional[str] = None, direction: Optional[str] = None, cursor: Optional[str] = None, with_total: bool = False):
+    sort_key = sort_key or "id"
+    direction = "desc" if direction == "desc" else "asc"
+    id_column = model.__table__.c.id
+    sort_column = model.__table__.c[sort_key]
+
+    total = None
+    if with_total:
+        total = (await db.execute(select(func.count()).select_from(query.order_by(None).subquery()))).scalar()
+
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort_key, direction, sort_column)
+        query = query.filter(_after(sort_column, id_column, direction, value, last_id))
+
+    if direction == "desc":
+        query = query.order_by(None).order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(None).order_by(sort_column.asc(), id_column.asc())
+
+    # one extra row tells whether another page exists, the sort value is selected alongside the columns
+    rows = (await db.execute(query.add_columns(sort_column.label("cursor_value")).limit(size + 1))).all()
+    items = rows[:size]
+
+    next_cursor = None
+    if len(rows) > size:
+        next_cursor = encode_cursor(sort_key, direction, items[-1].cursor_value, items[-1].id)
+
+    return {
+        "items": items,
+        "next_cursor": next_cursor,
+        "total": total
+    }
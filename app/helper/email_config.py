@@ -5,6 +5,26 @@ class EmailSettings(BaseSettings):
     email_port: int
     email_user: str
     email_password: str
+    # disable both for a plain local SMTP server (e.g. aiosmtpd)
+    email_starttls: bool = True
+    email_login: bool = True
+    email_timeout: int = 30
+
+    # outbox send loop
+    email_pool_size: int = 2
+    email_batch_size: int = 50
+    email_poll_interval: float = 1.0
+    email_max_attempts: int = 5
+    email_retry_delay: int = 30
+    email_retry_max_delay: int = 3600
+    # reconnect instead of reusing a connection idle for longer than this
+    email_idle_timeout: int = 60
+    # a claimed mail is picked up again after this, if its worker died while sending
+    email_claim_timeout: int = 300
+    # sent mails are deleted after this many seconds (0 keeps them), checked every email_purge_interval seconds
+    email_sent_retention: int = 604800
+    email_purge_interval: int = 3600
+    email_purge_batch_size: int = 1000
 
     class Config:
         env_file = ".env"
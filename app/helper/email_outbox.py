@@ -0,0 +1,336 @@
+import asyncio
+import queue
+import random
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from sqlalchemy import delete, event, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.helper.email_config import email_settings
+from app.models.email_outbox_model import EmailOutbox
+from config.database import SessionLocal
+
+
+# pool of open, logged in SMTP connections reused across mails
+class SMTPConnectionPool:
+    def __init__(self, settings):
+        self.settings = settings
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+        self.dropped = 0
+
+    def _connect(self):
+        server = smtplib.SMTP(self.settings.email_host, self.settings.email_port, timeout = self.settings.email_timeout)
+        try:
+            if self.settings.email_starttls:
+                server.starttls()
+            if self.settings.email_login:
+                server.login(self.settings.email_user, self.settings.email_password)
+        except Exception:
+            self._close(server)
+            raise
+        with self._lock:
+            self.opened += 1
+        return server
+
+    def _close(self, server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    # idle connection that is still alive, otherwise a new one
+    def _acquire(self):
+        while True:
+            try:
+                server, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+
+            if time.monotonic() - last_used > self.settings.email_idle_timeout:
+                try:
+                    server.noop()
+                except Exception:
+                    self._discard(server)
+                    continue
+            with self._lock:
+                self.reused += 1
+            return server
+
+    def _discard(self, server):
+        with self._lock:
+            self.dropped += 1
+        self._close(server)
+
+    @contextmanager
+    def connection(self):
+        server = self._acquire()
+        try:
+            yield server
+        except (smtplib.SMTPServerDisconnected, OSError):
+            self._discard(server)
+            raise
+        except smtplib.SMTPException:
+            # the server rejected this mail, reset the transaction and keep the connection
+            try:
+                server.rset()
+            except Exception:
+                self._discard(server)
+                raise
+            self._idle.put((server, time.monotonic()))
+            raise
+        else:
+            self._idle.put((server, time.monotonic()))
+
+    def close_all(self):
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(server)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "idle_connections": self._idle.qsize(),
+                "connections_opened": self.opened,
+                "connections_reused": self.reused,
+                "connections_dropped": self.dropped
+            }
+
+
+# durable outbox: mails are stored in email_outbox and delivered by a batching send loop
+class EmailOutboxSender:
+    def __init__(self, settings):
+        self.settings = settings
+        self.pool = SMTPConnectionPool(settings)
+        self._executor = ThreadPoolExecutor(max_workers = settings.email_pool_size, thread_name_prefix = "smtp-send")
+        self._wakeup = None
+        self._task = None
+        self._next_purge = 0.0
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.total_send = 0.0
+        self.max_send = 0.0
+        self.total_delivery = 0.0
+        self.max_delivery = 0.0
+
+    # add a mail to the outbox in the caller's transaction, it is delivered once committed
+    def add(self, db: AsyncSession, recipient: str, subject: str, body: str):
+        now = datetime.now()
+        db.add(EmailOutbox(
+            recipient = recipient,
+            subject = subject,
+            body = body,
+            status = "pending",
+            attempts = 0,
+            next_attempt_at = now,
+            created_at = now
+        ))
+
+    # add a mail to the outbox in the caller's transaction and wake up the send loop once the caller commits it
+    def enqueue(self, db: AsyncSession, recipient: str, subject: str, body: str):
+        self.add(db, recipient, subject, body)
+        event.listen(db.sync_session, "after_commit", self._wake_after_commit, once = True)
+
+    def _wake_after_commit(self, session):
+        self.wake()
+
+    def wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.pool.close_all)
+
+    async def _run(self):
+        while True:
+            try:
+                delivered = await self.process_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print("Email outbox error:", str(e))
+                delivered = 0
+
+            if self.settings.email_sent_retention > 0 and time.monotonic() >= self._next_purge:
+                self._next_purge = time.monotonic() + self.settings.email_purge_interval
+                try:
+                    await self.purge_sent()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print("Email outbox purge error:", str(e))
+
+            # a full batch means more mails are probably due, continue right away
+            if delivered < self.settings.email_batch_size:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout = self.settings.email_poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    # claim the due mails, skipping rows another worker already locked
+    async def _claim(self):
+        now = datetime.now()
+        async with SessionLocal() as db:
+            mails = (await db.execute(
+                select(EmailOutbox)
+                .filter(EmailOutbox.status.in_(("pending", "sending")), EmailOutbox.next_attempt_at <= now)
+                .order_by(EmailOutbox.id)
+                .limit(self.settings.email_batch_size)
+                .with_for_update(skip_locked = True)
+            )).scalars().all()
+
+            for mail in mails:
+                mail.status = "sending"
+                mail.next_attempt_at = now + timedelta(seconds = self.settings.email_claim_timeout)
+            await db.commit()
+            return mails
+
+    def _send(self, mail: EmailOutbox):
+        message = MIMEMultipart()
+        message['From'] = self.settings.email_user
+        message['To'] = mail.recipient
+        message['Subject'] = mail.subject
+        message.attach(MIMEText(mail.body, 'plain'))
+
+        started = time.perf_counter()
+        try:
+            with self.pool.connection() as server:
+                server.sendmail(self.settings.email_user, mail.recipient, message.as_string())
+        except smtplib.SMTPServerDisconnected:
+            # a pooled connection can be closed by the server between mails, retry once on a fresh one
+            with self.pool.connection() as server:
+                server.sendmail(self.settings.email_user, mail.recipient, message.as_string())
+        return time.perf_counter() - started
+
+    async def _deliver(self, mail: EmailOutbox):
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, self._send, mail), None
+        except Exception as e:
+            return None, e
+
+    def _retry_delay(self, attempts: int):
+        delay = min(self.settings.email_retry_delay * 2 ** (attempts - 1), self.settings.email_retry_max_delay)
+        return delay * random.uniform(0.8, 1.2)
+
+    # send one batch of due mails, returns the number of mails claimed
+    async def process_batch(self):
+        mails = await self._claim()
+        if not mails:
+            return 0
+
+        results = await asyncio.gather(*(self._deliver(mail) for mail in mails))
+
+        now = datetime.now()
+        sent_ids = []
+        async with SessionLocal() as db:
+            for mail, (send_time, error) in zip(mails, results):
+                if error is None:
+                    sent_ids.append(mail.id)
+                    self._record_sent(send_time, (now - mail.created_at).total_seconds() if mail.created_at else 0.0)
+                    continue
+
+                attempts = mail.attempts + 1
+                # a refused recipient does not get better by retrying
+                permanent = isinstance(error, smtplib.SMTPRecipientsRefused) or attempts >= self.settings.email_max_attempts
+                values = {"attempts": attempts, "last_error": str(error)[:255]}
+                if permanent:
+                    values["status"] = "failed"
+                    print(f"Failed to send email to {mail.recipient}: {str(error)}")
+                else:
+                    values["status"] = "pending"
+                    values["next_attempt_at"] = now + timedelta(seconds = self._retry_delay(attempts))
+                self._record_failure(permanent)
+                await db.execute(update(EmailOutbox).where(EmailOutbox.id == mail.id).values(**values))
+
+            if sent_ids:
+                await db.execute(update(EmailOutbox).where(EmailOutbox.id.in_(sent_ids)).values(status = "sent", sent_at = now, last_error = None))
+            await db.commit()
+
+        return len(mails)
+
+    # delete the mails sent longer than email_sent_retention ago, in batches so no single statement locks many rows;
+    # returns the number deleted
+    async def purge_sent(self):
+        cutoff = datetime.now() - timedelta(seconds = self.settings.email_sent_retention)
+        purged = 0
+        async with SessionLocal() as db:
+            while True:
+                ids = (await db.execute(
+                    select(EmailOutbox.id)
+                    .filter(EmailOutbox.status == "sent", EmailOutbox.sent_at < cutoff)
+                    .limit(self.settings.email_purge_batch_size)
+                )).scalars().all()
+                if not ids:
+                    return purged
+                await db.execute(delete(EmailOutbox).where(EmailOutbox.id.in_(ids)))
+                await db.commit()
+                purged += len(ids)
+
+    def _record_sent(self, send_time: float, delivery_time: float):
+        with self._lock:
+            self.sent += 1
+            self.total_send += send_time
+            self.max_send = max(self.max_send, send_time)
+            self.total_delivery += delivery_time
+            self.max_delivery = max(self.max_delivery, delivery_time)
+
+    def _record_failure(self, permanent: bool):
+        with self._lock:
+            if permanent:
+                self.failed += 1
+            else:
+                self.retried += 1
+
+    # send statistics of this worker plus the queue depth of the shared outbox table; only the unsent statuses are
+    # counted, a range of the status index that leaves out the (bulk of) sent rows
+    async def stats(self, db: AsyncSession):
+        rows = (await db.execute(
+            select(EmailOutbox.status, func.count()).filter(EmailOutbox.status.in_(("pending", "sending", "failed"))).group_by(EmailOutbox.status)
+        )).all()
+        counts = {status: count for status, count in rows}
+        with self._lock:
+            sent = self.sent
+            stats = {
+                "queue_depth": counts.get("pending", 0) + counts.get("sending", 0),
+                "pending": counts.get("pending", 0),
+                "sending": counts.get("sending", 0),
+                "failed_total": counts.get("failed", 0),
+                "sent": sent,
+                "retried": self.retried,
+                "failed": self.failed,
+                "avg_send_ms": round(self.total_send / sent * 1000, 3) if sent else 0.0,
+                "max_send_ms": round(self.max_send * 1000, 3),
+                "avg_delivery_ms": round(self.total_delivery / sent * 1000, 3) if sent else 0.0,
+                "max_delivery_ms": round(self.max_delivery * 1000, 3)
+            }
+        stats.update(self.pool.stats())
+        return stats
+
+
+email_outbox = EmailOutboxSender(email_settings)
@@ -1,14 +1,11 @@
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import re
 from fastapi import Depends, HTTPException, Header, Request
-from requests import Session
 from app.auth.jwt_handler import decode_jwt_token
-from app.helper.email_config import email_settings
-import smtplib
+from app.auth.auth_user import load_auth_user
+from app.helper.email_outbox import email_outbox
 import random
 from config.database import get_db
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.company_model import CompanyModel
 from config.database import get_db
 from app.models.user_model import UserModel
@@ -22,76 +19,52 @@ class Helper:
         return otp
 
 
-    # sent the forget password OTP to mail
-    def send_email(receiver_email, otp):
+    # queue the forget password OTP mail in the outbox, it is stored when the caller commits db
+    async def send_email(receiver_email, otp, db: AsyncSession):
         try:
-            sender_email = email_settings.email_user
-            subject = "Your OTP"
-            body = f"OTP for forget password is: {otp}"
-
-            msg = MIMEMultipart()
-            msg['From'] = sender_email
-            msg['To'] = receiver_email
-            msg['Subject'] = subject
-
-            msg.attach(MIMEText(body, 'plain'))
-        
-            with smtplib.SMTP(email_settings.email_host, email_settings.email_port) as server:
-                server.starttls()
-                server.login(sender_email, email_settings.email_password)
-                server.sendmail(sender_email, receiver_email, msg.as_string())
-            print(f"Email sent to {receiver_email}")
+            email_outbox.enqueue(db, receiver_email, "Your OTP", f"OTP for forget password is: {otp}")
         except Exception as e:
-            print(f"Failed to send email to {receiver_email}: {str(e)}")
-
-        
-    
-    # sent the successful registration mail 
-    def regd_mail_send(receiver_email: str):
-        try:
-            sender_email = email_settings.email_user
+            print(f"Failed to queue email to {receiver_email}: {str(e)}")
 
-            subject = 'Registration Successful'
-            body = "Your registration was successful"
 
-            msg = MIMEMultipart()
-            msg['From'] = sender_email
-            msg['To'] = receiver_email
-            msg['Subject'] = subject
-            msg.attach(MIMEText(body, 'plain'))
 
-            
-            with smtplib.SMTP(email_settings.email_host, email_settings.email_port) as server:
-                server.starttls()
-                server.login(sender_email, email_settings.email_password)
-                server.sendmail(sender_email, receiver_email, msg.as_string())
-                # server.send_message(msg)
-            print(f'Email sent to {receiver_email}')
-            
+    # queue the successful registration mail in the outbox, it is stored when the caller commits db
+    async def regd_mail_send(receiver_email: str, db: AsyncSession):
+        try:
+            email_outbox.enqueue(db, receiver_email, 'Registration Successful', "Your registration was successful")
         except Exception as e:
-            print(f"Failed to send email to {receiver_email}: {str(e)}")
+            print(f"Failed to queue email to {receiver_email}: {str(e)}")
 
 
 
-    # get authenticated user from the request
-    def getAuthUser(request: Request, db: Session = Depends(get_db)):
+    # get authenticated user from the request (decoded and loaded once, then reused from request.state)
+    async def getAuthUser(request: Request, db: AsyncSession = Depends(get_db)):
         try:
-            authorization: str = request.headers.get("Authorization")
-            
-            if not authorization or not authorization.startswith("Bearer "):
-               raise HTTPException(status_code=401, detail="Authorization header missing")
+            auth_user = getattr(request.state, "auth_user", None)
+            if auth_user is not None:
+                return auth_user
+
+            # subject already decoded by JWTBearer for this request
+            email = getattr(request.state, "token_email", None)
 
-            token = authorization.split(" ")[1]
-            
-            email = decode_jwt_token(token)
             if not email:
-                raise HTTPException(status_code=401, detail="Invalid or expired token")
+                authorization: str = request.headers.get("Authorization")
+
+                if not authorization or not authorization.startswith("Bearer "):
+                   raise HTTPException(status_code=401, detail="Authorization header missing")
+
+                token = authorization.split(" ")[1]
+
+                email = decode_jwt_token(token)
+                if not email:
+                    raise HTTPException(status_code=401, detail="Invalid or expired token")
 
-            user = db.query(UserModel).filter(UserModel.email == email).first()
+            user = await load_auth_user(email, db)
 
             if not user:
                 raise HTTPException(status_code=404, detail="User not found")
 
+            request.state.auth_user = user
             return user
         except Exception as e:
             print("Exception occurred:", str(e))
@@ -0,0 +1,30 @@
+from typing import Any
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from app.schemas.response_schema import ResponseSchema
+
+
+# JSONResponse encoded with orjson instead of the stdlib json module, the default response class of the app;
+# already encoded bytes (EnvelopeSerializer) are sent as they are
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return orjson.dumps(content, option = orjson.OPT_NON_STR_KEYS)
+
+
+# ResponseSchema[data_type] with its validator and serializer built once, at import. A route returning the rendered
+# response skips FastAPI's own pass over the body (validating the model again against response_model, dumping it to
+# python, jsonable_encoder and json.dumps): the data is validated once, from plain dicts / rows / ORM objects, and
+# dumped straight to JSON bytes in pydantic-core. response_model stays on the route for the OpenAPI schema.
+class EnvelopeSerializer:
+    def __init__(self, data_type):
+        self.adapter = TypeAdapter(ResponseSchema[data_type])
+
+    def render(self, status: bool, response: str, data = None) -> bytes:
+        envelope = self.adapter.validate_python({"status": status, "response": response, "data": data}, from_attributes = True)
+        return self.adapter.dump_json(envelope)
+
+    def __call__(self, status: bool, response: str, data = None, headers: dict = None):
+        return FastJSONResponse(self.render(status, response, data), headers = headers)
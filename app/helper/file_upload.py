@@ -0,0 +1,139 @@
+import base64
+import binascii
+import os
+import uuid
+from dotenv import load_dotenv
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+load_dotenv()
+
+UPLOAD_MAX_SIZE = int(os.getenv("UPLOAD_MAX_SIZE", 5 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 64 * 1024))
+# partial uploads are written here, outside the served uploads directory, on the same filesystem so the final rename is atomic
+UPLOAD_TMP_DIR = os.path.join(os.getcwd(), os.getenv("UPLOAD_TMP_DIR", "uploads_tmp"))
+
+
+# only this many leading bytes are read to detect the image format
+IMAGE_HEADER_SIZE = 32
+
+
+# raised while streaming once an upload goes over the allowed size
+class UploadTooLargeError(Exception):
+    pass
+
+
+# raised when the leading bytes of an upload are not a supported image format
+class InvalidImageError(Exception):
+    pass
+
+
+# image file extension from the magic bytes at the start of the file, None when not a supported image
+def sniff_image_extension(header: bytes):
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if header.startswith(b"\xff\xd8\xff"):
+        return ".jpeg"
+    if header.startswith((b"GIF87a", b"GIF89a")):
+        return ".gif"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return ".webp"
+    if header.startswith(b"BM"):
+        return ".bmp"
+    if header.startswith((b"II*\x00", b"MM\x00*")):
+        return ".tiff"
+    return None
+
+
+def _copy_to_temp(source, temp_path: str, max_size: int):
+    size = 0
+    with open(temp_path, "wb") as target:
+        while True:
+            chunk = source.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLargeError(f"Upload is larger than {max_size} bytes")
+            target.write(chunk)
+    return size
+
+
+# stream the upload in chunks into a temp file on a worker thread, returns the temp file path
+async def save_upload_to_temp(upload: UploadFile, max_size: int = UPLOAD_MAX_SIZE):
+    if upload.size is not None and upload.size > max_size:
+        raise UploadTooLargeError(f"Upload is larger than {max_size} bytes")
+
+    temp_path = os.path.join(UPLOAD_TMP_DIR, f"{uuid.uuid4().hex}.part")
+    try:
+        await run_in_threadpool(_copy_to_temp, upload.file, temp_path, max_size)
+    except BaseException:
+        discard_temp_upload(temp_path)
+        raise
+    return temp_path
+
+
+def _copy_image_to_temp(source, temp_path: str, max_size: int):
+    extension = sniff_image_extension(source.read(IMAGE_HEADER_SIZE))
+    if extension is None:
+        raise InvalidImageError("Upload is not a supported image")
+    source.seek(0)
+    _copy_to_temp(source, temp_path, max_size)
+    return extension
+
+
+# same as save_upload_to_temp for images, returns (temp file path, extension detected from the header bytes)
+async def save_image_upload_to_temp(upload: UploadFile, max_size: int = UPLOAD_MAX_SIZE):
+    if upload.size is not None and upload.size > max_size:
+        raise UploadTooLargeError(f"Upload is larger than {max_size} bytes")
+
+    temp_path = os.path.join(UPLOAD_TMP_DIR, f"{uuid.uuid4().hex}.part")
+    try:
+        extension = await run_in_threadpool(_copy_image_to_temp, upload.file, temp_path, max_size)
+    except BaseException:
+        discard_temp_upload(temp_path)
+        raise
+    return temp_path, extension
+
+
+def _write_base64_image(image_data: str, temp_path: str, max_size: int):
+    # data URL ("data:image/png;base64,....") or bare base64
+    if "," in image_data:
+        image_data = image_data.split(",", 1)[1]
+    try:
+        file_data = base64.b64decode(image_data.strip())
+    except (binascii.Error, ValueError):
+        raise InvalidImageError("Image is not valid base64")
+
+    if len(file_data) > max_size:
+        raise UploadTooLargeError(f"Upload is larger than {max_size} bytes")
+    extension = sniff_image_extension(file_data[:IMAGE_HEADER_SIZE])
+    if extension is None:
+        raise InvalidImageError("Upload is not a supported image")
+
+    with open(temp_path, "wb") as target:
+        target.write(file_data)
+    return extension
+
+
+# decode a base64 image into a temp file on a worker thread, returns (temp file path, extension)
+async def save_base64_image_to_temp(image_data: str, max_size: int = UPLOAD_MAX_SIZE):
+    temp_path = os.path.join(UPLOAD_TMP_DIR, f"{uuid.uuid4().hex}.part")
+    try:
+        extension = await run_in_threadpool(_write_base64_image, image_data, temp_path, max_size)
+    except BaseException:
+        discard_temp_upload(temp_path)
+        raise
+    return temp_path, extension
+
+
+# atomically move a finished temp file to its final path
+async def publish_temp_upload(temp_path: str, final_path: str):
+    await run_in_threadpool(os.replace, temp_path, final_path)
+
+
+def discard_temp_upload(temp_path: str):
+    try:
+        os.remove(temp_path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,151 @@
+import asyncio
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+from PIL import Image, ImageOps
+from sqlalchemy import select, update
+from app.helper.file_upload import UPLOAD_TMP_DIR, discard_temp_upload
+from app.helper.response_cache import invalidate_company
+from app.models.company_images import CompanyImage
+from app.models.company_model import CompanyModel
+from app.models.user_model import UserModel
+from app.storage.blob_store import UPLOADS_PREFIX, blob_store, storage_key
+from config.database import SessionLocal
+
+try:
+    # registers the AVIF encoder when the pillow-avif-plugin package is installed
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+load_dotenv()
+
+# longest side in pixels of every variant, the original is never upscaled
+IMAGE_VARIANT_SIZES = [int(size) for size in os.getenv("IMAGE_VARIANT_SIZES", "96,480").split(",") if size]
+# formats not supported by the installed Pillow are skipped
+IMAGE_VARIANT_FORMATS = [name.strip().lower() for name in os.getenv("IMAGE_VARIANT_FORMATS", "webp,avif").split(",") if name.strip()]
+IMAGE_VARIANT_QUALITY = int(os.getenv("IMAGE_VARIANT_QUALITY", 80))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+
+
+def supported_formats(formats: list):
+    Image.init()
+    return [name for name in formats if name.upper() in Image.SAVE]
+
+
+# resize and re-encode one image into temp files, runs in a worker process; no exif / icc data is written to the variants
+def render_variants(source_path: str, sizes: list, formats: list, quality: int, temp_dir: str):
+    variants = {}
+
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+
+        for size in sizes:
+            resized = image.copy()
+            resized.thumbnail((size, size), reducing_gap = 3.0)
+
+            variants[str(size)] = {}
+            for name in formats:
+                temp_path = os.path.join(temp_dir, f"{uuid.uuid4().hex}.part")
+                resized.save(temp_path, format = name.upper(), quality = quality)
+                variants[str(size)][name] = temp_path
+
+    return variants
+
+
+# stored variant paths as urls, {"96": {"webp": url, ...}, ...}
+def variant_urls(variants: dict, base_url: str):
+    if not variants:
+        return None
+    return {size: {name: f"{base_url}{path}" for name, path in paths.items()} for size, paths in variants.items()}
+
+
+# flat list of the stored variant paths
+def variant_paths(variants: dict):
+    if not variants:
+        return []
+    return [path for paths in variants.values() for path in paths.values()]
+
+
+# thumbnails and modern format variants of uploaded images, rendered on a process pool after the response is sent
+class ImagePipeline:
+    def __init__(self, workers: int, sizes: list, formats: list, quality: int):
+        self.workers = workers
+        self.sizes = sizes
+        self.formats = supported_formats(formats)
+        self.quality = quality
+        self._executor = None
+
+    def _pool(self):
+        # spawned, not forked, so the workers do not inherit the event loop and open database connections
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers = self.workers, mp_context = multiprocessing.get_context("spawn"))
+        return self._executor
+
+    # variants are stored next to the image as <name>_<size>.<format>, returns their paths
+    async def render(self, image_path: str):
+        backend = blob_store.backend
+        key = storage_key(image_path)
+        stem = os.path.splitext(key)[0]
+        targets = {str(size): {name: f"{stem}_{size}.{name}" for name in self.formats} for size in self.sizes}
+        paths = {size: {name: f"{UPLOADS_PREFIX}{target}" for name, target in names.items()} for size, names in targets.items()}
+
+        # content addressed images share their variants, identical uploads are rendered only once
+        if all([await backend.exists(target) for names in targets.values() for target in names.values()]):
+            return paths
+
+        loop = asyncio.get_running_loop()
+        async with backend.local_copy(key, UPLOAD_TMP_DIR) as source_path:
+            rendered = await loop.run_in_executor(self._pool(), render_variants, source_path, self.sizes, self.formats, self.quality, UPLOAD_TMP_DIR)
+
+        temp_paths = [(temp_path, targets[size][name]) for size, names in rendered.items() for name, temp_path in names.items()]
+        try:
+            for temp_path, target in temp_paths:
+                await backend.save(temp_path, target)
+        finally:
+            for temp_path, _ in temp_paths:
+                discard_temp_upload(temp_path)
+        return paths
+
+    # render the variants of a profile image and store them, unless the user changed the image meanwhile
+    async def process_user_image(self, user_id: int, image_path: str):
+        try:
+            variants = await self.render(image_path)
+            async with SessionLocal() as db:
+                await db.execute(
+                    update(UserModel)
+                    .where(UserModel.id == user_id, UserModel.profile_img == image_path)
+                    .values(profile_img_variants = variants, updated_at = UserModel.updated_at)
+                )
+                await db.commit()
+        except Exception as e:
+            print(f"Failed to process image {image_path}: {str(e)}")
+
+    async def _process_company_image(self, image_path: str):
+        try:
+            variants = await self.render(image_path)
+            async with SessionLocal() as db:
+                await db.execute(update(CompanyImage).where(CompanyImage.image_path == image_path).values(variants = variants))
+                await db.commit()
+                # the variants are part of the cached uuid view, of every company using this (content addressed) image
+                companies = (await db.execute(select(CompanyModel.id, CompanyModel.uuid).join(CompanyImage).filter(CompanyImage.image_path == image_path))).all()
+            for company_id, uuid in companies:
+                await invalidate_company(company_id, uuid)
+        except Exception as e:
+            print(f"Failed to process image {image_path}: {str(e)}")
+
+    # render the variants of all images of a company in parallel
+    async def process_company_images(self, image_paths: list):
+        await asyncio.gather(*(self._process_company_image(image_path) for image_path in image_paths))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait = False, cancel_futures = True)
+            self._executor = None
+
+
+image_pipeline = ImagePipeline(workers = IMAGE_WORKERS, sizes = IMAGE_VARIANT_SIZES, formats = IMAGE_VARIANT_FORMATS, quality = IMAGE_VARIANT_QUALITY)
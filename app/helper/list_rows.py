@@ -0,0 +1,54 @@
+# lightweight rows of the list endpoints, built from plain column selects: nothing goes through the identity map or
+# ORM hydration, and the response schemas read them by attribute (from_attributes) like the entities they replace
+
+
+# creator of a listed company
+class CompanyCreatorRow:
+    __slots__ = ("name", "email", "country")
+
+    def __init__(self, name: str, email: str, country: str):
+        self.name = name
+        self.email = email
+        self.country = country
+
+
+class CompanyListRow:
+    __slots__ = ("id", "uuid", "company_name", "company_email", "company_number", "company_zipcode", "company_city", "company_state", "company_country", "company_profile", "company_creator")
+
+    def __init__(self, id: int, uuid: str, company_name: str, company_email: str, company_number: str, company_zipcode: str, company_city: str, company_state: str, company_country: str, company_profile: str, company_creator: CompanyCreatorRow):
+        self.id = id
+        self.uuid = uuid
+        self.company_name = company_name
+        self.company_email = company_email
+        self.company_number = company_number
+        self.company_zipcode = company_zipcode
+        self.company_city = company_city
+        self.company_state = company_state
+        self.company_country = company_country
+        self.company_profile = company_profile
+        self.company_creator = company_creator
+
+
+# company created by a listed user
+class UserCompanyRow:
+    __slots__ = ("company_name", "company_email", "company_country")
+
+    def __init__(self, company_name: str, company_email: str, company_country: str):
+        self.company_name = company_name
+        self.company_email = company_email
+        self.company_country = company_country
+
+
+class UserListRow:
+    __slots__ = ("id", "name", "email", "city", "state", "country", "profile_img", "profile_img_variants", "companies")
+
+    def __init__(self, id: int, name: str, email: str, city: str, state: str, country: str, profile_img: str, profile_img_variants: dict, companies: list):
+        self.id = id
+        self.name = name
+        self.email = email
+        self.city = city
+        self.state = state
+        self.country = country
+        self.profile_img = profile_img
+        self.profile_img_variants = profile_img_variants
+        self.companies = companies
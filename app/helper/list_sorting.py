@@ -0,0 +1,27 @@
+from typing import Optional
+
+
+# raised when a list is asked to sort on a key or direction it does not declare
+class InvalidSortError(ValueError):
+    pass
+
+
+# validate the requested sort against the registry of the list endpoint, returns (sort key, direction)
+def resolve_sort(sort_registry: dict, sort_by: Optional[str], sort_direction: Optional[str]):
+    if sort_direction not in (None, "asc", "desc"):
+        raise InvalidSortError(f"Unsupported sort direction: {sort_direction}")
+
+    if not sort_by:
+        return None, sort_direction or "asc"
+
+    if sort_by not in sort_registry:
+        raise InvalidSortError(f"Unsupported sort field: {sort_by}")
+    return sort_by, sort_direction or "asc"
+
+
+# ORDER BY (sort column, id) so ties are stable and served by the composite index
+def order_by_sort(query, sort_registry: dict, id_column, sort_key: Optional[str], direction: str):
+    columns = [sort_registry[sort_key], id_column] if sort_key and sort_key != "id" else [id_column]
+    if direction == "desc":
+        return query.order_by(*[column.desc() for column in columns])
+    return query.order_by(*[column.asc() for column in columns])
@@ -0,0 +1,155 @@
+import asyncio
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.otp_model import OTPModel
+from config.database import SessionLocal
+
+load_dotenv()
+
+# "db" keeps the OTPs in otp_table, "redis" in a Redis compatible server (needs the redis package)
+OTP_STORE = os.getenv("OTP_STORE", "db")
+OTP_TTL = int(os.getenv("OTP_TTL", 600))
+OTP_SWEEP_INTERVAL = int(os.getenv("OTP_SWEEP_INTERVAL", 300))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+# OTPs shared by all workers, an OTP is valid until its TTL passes or it is consumed
+class OTPStore(ABC):
+    # store the OTP of the email, replacing an earlier one
+    @abstractmethod
+    async def save(self, email: str, otp: str, ttl: int = OTP_TTL):
+        ...
+
+    # True when the OTP matches and has not expired, the OTP stays valid
+    @abstractmethod
+    async def check(self, email: str, otp: str):
+        ...
+
+    # same as check but removes the OTP in the same step, so it can be used only once;
+    # a store that can, removes it in the transaction of db and leaves the commit to the caller
+    @abstractmethod
+    async def consume(self, email: str, otp: str, db: AsyncSession = None):
+        ...
+
+    # remove expired OTPs, returns the number removed
+    async def sweep(self):
+        return 0
+
+
+class DatabaseOTPStore(OTPStore):
+    async def save(self, email: str, otp: str, ttl: int = OTP_TTL):
+        values = {"otp": str(otp), "expires_at": datetime.now() + timedelta(seconds = ttl)}
+        async with SessionLocal() as db:
+            result = await db.execute(update(OTPModel).where(OTPModel.email == email).values(**values))
+            if result.rowcount == 0:
+                db.add(OTPModel(email = email, **values))
+            try:
+                await db.commit()
+            except IntegrityError:
+                # another worker inserted the row first
+                await db.rollback()
+                await db.execute(update(OTPModel).where(OTPModel.email == email).values(**values))
+                await db.commit()
+
+    async def check(self, email: str, otp: str):
+        async with SessionLocal() as db:
+            row = (await db.execute(
+                select(OTPModel.id).filter(OTPModel.email == email, OTPModel.otp == str(otp), OTPModel.expires_at > datetime.now())
+            )).first()
+            return row is not None
+
+    async def consume(self, email: str, otp: str, db: AsyncSession = None):
+        statement = delete(OTPModel).where(OTPModel.email == email, OTPModel.otp == str(otp), OTPModel.expires_at > datetime.now())
+        if db is not None:
+            # the row stays locked until the caller commits, a concurrent consume of the same OTP waits and finds nothing
+            return (await db.execute(statement)).rowcount == 1
+        async with SessionLocal() as session:
+            result = await session.execute(statement)
+            await session.commit()
+            return result.rowcount == 1
+
+    async def sweep(self):
+        async with SessionLocal() as db:
+            result = await db.execute(delete(OTPModel).where(OTPModel.expires_at <= datetime.now()))
+            await db.commit()
+            return result.rowcount
+
+
+# compare and delete in one server side step
+CONSUME_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+# expiry is handled by the server (SET ... EX), so there is nothing to sweep
+class RedisOTPStore(OTPStore):
+    def __init__(self, client = None, url: str = REDIS_URL, prefix: str = "otp:"):
+        if client is None:
+            import redis.asyncio as redis
+            client = redis.from_url(url, decode_responses = True)
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, email: str):
+        return f"{self.prefix}{email}"
+
+    async def save(self, email: str, otp: str, ttl: int = OTP_TTL):
+        await self.client.set(self._key(email), str(otp), ex = ttl)
+
+    async def check(self, email: str, otp: str):
+        return await self.client.get(self._key(email)) == str(otp)
+
+    # removed at once, the server has no transaction shared with db
+    async def consume(self, email: str, otp: str, db: AsyncSession = None):
+        return await self.client.eval(CONSUME_SCRIPT, 1, self._key(email), str(otp)) == 1
+
+
+def build_otp_store(kind: str = OTP_STORE):
+    if kind == "redis":
+        return RedisOTPStore()
+    return DatabaseOTPStore()
+
+
+otp_store = build_otp_store()
+
+
+# periodically removes the expired OTPs of stores without native expiry
+class OTPSweeper:
+    def __init__(self, store: OTPStore, interval: int):
+        self.store = store
+        self.interval = interval
+        self._task = None
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.store.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print("OTP sweep error:", str(e))
+            await asyncio.sleep(self.interval)
+
+
+otp_sweeper = OTPSweeper(otp_store, OTP_SWEEP_INTERVAL)
@@ -0,0 +1,269 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+from starlette.responses import JSONResponse
+from config.database import msg
+
+load_dotenv()
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+# "memory" limits per worker, "redis" shares the buckets between workers and nodes (needs the redis package)
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+# take the client ip from X-Forwarded-For, only behind a proxy that sets it
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() in ("1", "true", "yes")
+# trusted proxies in front of the app, each appends the address it got the request from to X-Forwarded-For
+RATE_LIMIT_PROXY_HOPS = int(os.getenv("RATE_LIMIT_PROXY_HOPS", 1 if RATE_LIMIT_TRUST_PROXY else 0))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# largest body accepted on the routes limited per email, bigger ones are answered with 413 before the route runs
+MAX_BODY_SIZE = 16 * 1024
+
+
+# raised for a body over MAX_BODY_SIZE, its email could not be charged
+class RequestBodyTooLargeError(ValueError):
+    pass
+
+
+# "<requests>/<seconds>" from the environment, None when the limit is disabled
+def parse_limit(value: str):
+    if not value or value == "0":
+        return None
+    requests, seconds = value.split("/")
+    return int(requests), float(seconds)
+
+
+# (method, path) -> limits per ip and per email of the request body
+ROUTE_LIMITS = {
+    ("POST", "/api/user/login"): {
+        "ip": parse_limit(os.getenv("RATE_LIMIT_LOGIN_IP", "20/60")),
+        "email": parse_limit(os.getenv("RATE_LIMIT_LOGIN_EMAIL", "5/60"))
+    },
+    ("POST", "/api/forget_password/otp/sent"): {
+        "ip": parse_limit(os.getenv("RATE_LIMIT_OTP_SENT_IP", "10/60")),
+        "email": parse_limit(os.getenv("RATE_LIMIT_OTP_SENT_EMAIL", "3/600"))
+    },
+    ("POST", "/api/forget_password/otp/verify"): {
+        "ip": parse_limit(os.getenv("RATE_LIMIT_OTP_VERIFY_IP", "20/60")),
+        "email": parse_limit(os.getenv("RATE_LIMIT_OTP_VERIFY_EMAIL", "5/300"))
+    },
+    ("POST", "/api/forget_password/change_password"): {
+        "ip": parse_limit(os.getenv("RATE_LIMIT_CHANGE_PASSWORD_IP", "20/60")),
+        "email": parse_limit(os.getenv("RATE_LIMIT_CHANGE_PASSWORD_EMAIL", "5/300"))
+    }
+}
+
+
+# token buckets kept in this worker, least recently used keys are dropped beyond max_keys
+class MemoryBucketStore:
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    # take one token, returns (allowed, seconds until a token is available)
+    async def take(self, key: str, capacity: int, rate: float):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                allowed, retry_after = True, 0.0
+            else:
+                allowed, retry_after = False, (1 - tokens) / rate
+
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last = False)
+        return allowed, retry_after
+
+
+# refill and take in one server side step, the bucket expires once it would be full again
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, tostring(retry_after)}
+"""
+
+
+# token buckets shared through a Redis compatible server
+class RedisBucketStore:
+    def __init__(self, client = None, url: str = REDIS_URL, prefix: str = "ratelimit:"):
+        if client is None:
+            import redis.asyncio as redis
+            client = redis.from_url(url, decode_responses = True)
+        self.client = client
+        self.prefix = prefix
+
+    async def take(self, key: str, capacity: int, rate: float):
+        allowed, retry_after = await self.client.eval(TAKE_SCRIPT, 1, f"{self.prefix}{key}", capacity, rate, time.time())
+        return int(allowed) == 1, float(retry_after)
+
+
+def build_bucket_store(kind: str = RATE_LIMIT_STORE):
+    if kind == "redis":
+        return RedisBucketStore()
+    return MemoryBucketStore(max_keys = RATE_LIMIT_MAX_KEYS)
+
+
+# token bucket limits per client ip and per email of the request body, for the routes in route_limits
+class RateLimiter:
+    def __init__(self, store, route_limits: dict, enabled: bool, proxy_hops: int):
+        self.store = store
+        self.route_limits = route_limits
+        self.enabled = enabled
+        self.proxy_hops = proxy_hops
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+
+    def limits_for(self, scope):
+        if not self.enabled or scope["type"] != "http":
+            return None
+        return self.route_limits.get((scope["method"], scope["path"]))
+
+    # returns (seconds to wait or None when allowed, receive to pass on to the route);
+    # raises RequestBodyTooLargeError when the email cannot be read from a body within MAX_BODY_SIZE
+    async def check(self, scope, receive, limits: dict):
+        route = scope["path"]
+        retry_after = await self._take(f"ip:{route}:{self._client_ip(scope)}", limits.get("ip"))
+
+        if retry_after is None and limits.get("email") is not None:
+            try:
+                body, receive = await self._read_body(scope, receive)
+            except RequestBodyTooLargeError:
+                with self._lock:
+                    self.rejected += 1
+                raise
+            email = self._email(body)
+            if email:
+                retry_after = await self._take(f"email:{route}:{email}", limits["email"])
+
+        with self._lock:
+            if retry_after is None:
+                self.allowed += 1
+            else:
+                self.rejected += 1
+        return retry_after, receive
+
+    # None when allowed, otherwise the seconds to wait
+    async def _take(self, key: str, limit):
+        if limit is None:
+            return None
+        requests, seconds = limit
+        allowed, retry_after = await self.store.take(key, requests, requests / seconds)
+        return None if allowed else retry_after
+
+    # the entry added by the outermost trusted proxy; anything left of it comes from the client and can be forged
+    def _client_ip(self, scope):
+        if self.proxy_hops:
+            forwarded = [entry.strip() for name, value in scope.get("headers", []) if name == b"x-forwarded-for" for entry in value.decode("latin-1").split(",")]
+            if len(forwarded) >= self.proxy_hops:
+                return forwarded[-self.proxy_hops]
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    # read the (small) request body and hand the route a receive that replays it; a bigger body is refused, padding
+    # it past the limit would otherwise skip the email bucket
+    async def _read_body(self, scope, receive):
+        for name, value in scope.get("headers", []):
+            if name == b"content-length" and value.isdigit() and int(value) > MAX_BODY_SIZE:
+                raise RequestBodyTooLargeError(f"Body of {int(value)} bytes")
+
+        chunks = []
+        size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            size += len(chunks[-1])
+            if size > MAX_BODY_SIZE:
+                raise RequestBodyTooLargeError(f"Body over {MAX_BODY_SIZE} bytes")
+            more_body = message.get("more_body", False)
+
+        body = b"".join(chunks)
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": more_body}
+            return await receive()
+
+        return body, replay
+
+    def _email(self, body: bytes):
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return None
+        email = data.get("email") if isinstance(data, dict) else None
+        return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "store": type(self.store).__name__,
+                "allowed": self.allowed,
+                "rejected": self.rejected
+            }
+
+
+rate_limiter = RateLimiter(build_bucket_store(), ROUTE_LIMITS, RATE_LIMIT_ENABLED, RATE_LIMIT_PROXY_HOPS)
+
+
+# ASGI middleware rejecting over limit requests before the route runs,
+# so they never reach the database or the password hashing pool
+class RateLimitMiddleware:
+    def __init__(self, app, limiter: RateLimiter = rate_limiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        limits = self.limiter.limits_for(scope)
+        if limits is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            retry_after, receive = await self.limiter.check(scope, receive, limits)
+        except RequestBodyTooLargeError:
+            response = JSONResponse(status_code = 413, content = {"status": False, "response": msg["request_too_large"], "data": None})
+            await response(scope, receive, send)
+            return
+
+        if retry_after is not None:
+            response = JSONResponse(
+                status_code = 429,
+                headers = {"Retry-After": str(max(1, math.ceil(retry_after)))},
+                content = {"status": False, "response": msg["too_many_requests"], "data": None}
+            )
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
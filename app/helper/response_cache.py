@@ -0,0 +1,235 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+COMPANY_CACHE_SIZE = int(os.getenv("COMPANY_CACHE_SIZE", 5000))
+COMPANY_CACHE_TTL = int(os.getenv("COMPANY_CACHE_TTL", 300))
+# "memory" caches in every worker on its own, "redis" adds a tier shared by all workers (needs the redis package);
+# the company views are keyed by the version of the rows they show, so a write made by another worker is not served
+# from an old entry in either mode
+COMPANY_CACHE_BACKEND = os.getenv("COMPANY_CACHE_BACKEND", "memory")
+# with a shared tier the local entries only live this long, invalidations made by other workers do not reach them
+COMPANY_CACHE_LOCAL_TTL = int(os.getenv("COMPANY_CACHE_LOCAL_TTL", 5))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+# bounded LRU with TTL, entries carry tags so everything cached for one company can be dropped at once
+class LocalCacheTier:
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def _remove(self, key: str):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value, tags: tuple):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + self.ttl, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, tag: str):
+        with self._lock:
+            keys = list(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# entries as JSON in a Redis compatible server, a set per tag lists the keys to delete on invalidation
+class RedisCacheTier:
+    def __init__(self, ttl: int, client = None, url: str = REDIS_URL, prefix: str = "response-cache:"):
+        if client is None:
+            import redis.asyncio as redis
+            client = redis.from_url(url, decode_responses = True)
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    # (value, tags) or None
+    async def get(self, key: str):
+        entry = await self.client.get(f"{self.prefix}{key}")
+        if entry is None:
+            return None
+        entry = json.loads(entry)
+        return entry["value"], tuple(entry["tags"])
+
+    async def set(self, key: str, value, tags: tuple):
+        async with self.client.pipeline(transaction = False) as pipe:
+            pipe.set(f"{self.prefix}{key}", json.dumps({"value": value, "tags": list(tags)}, default = str), ex = self.ttl)
+            for tag in tags:
+                pipe.sadd(f"{self.prefix}tag:{tag}", key)
+                pipe.expire(f"{self.prefix}tag:{tag}", self.ttl)
+            await pipe.execute()
+
+    async def invalidate(self, tag: str):
+        keys = await self.client.smembers(f"{self.prefix}tag:{tag}")
+        await self.client.delete(f"{self.prefix}tag:{tag}", *(f"{self.prefix}{key}" for key in keys))
+        return len(keys)
+
+
+# read-through cache of JSON-able responses: the local tier first, then the shared one; failures of the shared tier
+# count as misses so a cache outage only costs the database queries
+class ResponseCache:
+    def __init__(self, local: LocalCacheTier, shared = None):
+        self.local = local
+        self.shared = shared
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.errors = 0
+        # bumped on every invalidation of a tag, so a load that raced with a write is not cached
+        self._generations = {}
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    async def get(self, key: str):
+        value = self.local.get(key)
+        if value is not None:
+            self._count("local_hits")
+            return value
+
+        if self.shared is not None:
+            try:
+                entry = await self.shared.get(key)
+            except Exception as e:
+                print("Response cache error:", str(e))
+                self._count("errors")
+                entry = None
+            if entry is not None:
+                self._count("shared_hits")
+                value, tags = entry
+                self.local.set(key, value, tags)
+                return value
+
+        self._count("misses")
+        return None
+
+    async def set(self, key: str, value, tags: tuple = ()):
+        self.local.set(key, value, tags)
+        if self.shared is not None:
+            try:
+                await self.shared.set(key, value, tags)
+            except Exception as e:
+                print("Response cache error:", str(e))
+                self._count("errors")
+
+    # cached value of key, or the result of await loader(); only dict results are cached, other results
+    # (error codes, None) are returned as they are
+    async def get_or_load(self, key: str, tags: tuple, loader):
+        value = await self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            generations = [self._generations.get(tag, 0) for tag in tags]
+        value = await loader()
+        with self._lock:
+            unchanged = generations == [self._generations.get(tag, 0) for tag in tags]
+        if isinstance(value, dict) and unchanged:
+            await self.set(key, value, tags)
+        return value
+
+    # drop every entry tagged with tag, call after the change is committed
+    async def invalidate(self, tag: str):
+        with self._lock:
+            self._generations[tag] = self._generations.get(tag, 0) + 1
+        removed = self.local.invalidate(tag)
+        if self.shared is not None:
+            try:
+                removed += await self.shared.invalidate(tag)
+            except Exception as e:
+                print("Response cache error:", str(e))
+                self._count("errors")
+        self._count("invalidations", removed)
+
+    def stats(self):
+        with self._lock:
+            hits = self.local_hits + self.shared_hits
+            lookups = hits + self.misses
+            return {
+                "backend": "redis" if self.shared is not None else "memory",
+                "size": len(self.local),
+                "max_size": self.local.max_size,
+                "local_ttl_seconds": self.local.ttl,
+                "local_hits": self.local_hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.local.evictions,
+                "expirations": self.local.expirations,
+                "invalidations": self.invalidations,
+                "errors": self.errors
+            }
+
+
+def build_response_cache(kind: str = COMPANY_CACHE_BACKEND):
+    if kind == "redis":
+        return ResponseCache(LocalCacheTier(COMPANY_CACHE_SIZE, min(COMPANY_CACHE_LOCAL_TTL, COMPANY_CACHE_TTL)), RedisCacheTier(COMPANY_CACHE_TTL))
+    return ResponseCache(LocalCacheTier(COMPANY_CACHE_SIZE, COMPANY_CACHE_TTL))
+
+
+company_cache = build_response_cache()
+
+
+# tag of everything cached for one company
+def company_tag(company_id: int):
+    return f"company:{company_id}"
+
+
+def company_uuid_tag(uuid: str):
+    return f"company-uuid:{uuid}"
+
+
+# drop the cached views of a company, by id and (when known) by uuid; call after the change is committed
+async def invalidate_company(company_id: int, uuid: str = None):
+    await company_cache.invalidate(company_tag(company_id))
+    if uuid:
+        await company_cache.invalidate(company_uuid_tag(uuid))
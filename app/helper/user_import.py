@@ -0,0 +1,67 @@
+import codecs
+import csv
+import json
+import os
+from itertools import islice
+from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+
+load_dotenv()
+
+# rows checked, hashed and inserted (and committed) together
+USER_IMPORT_BATCH_SIZE = int(os.getenv("USER_IMPORT_BATCH_SIZE", 500))
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+
+# "csv" or "ndjson" from the file name / content type of the upload, None when neither
+def detect_import_format(filename: str, content_type: str):
+    extension = os.path.splitext(filename or "")[1].lower()
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if extension == ".csv" or content_type in ("text/csv", "application/csv"):
+        return "csv"
+    if extension in (".ndjson", ".jsonl") or content_type in ("application/x-ndjson", "application/jsonl", "application/x-jsonlines"):
+        return "ndjson"
+    return None
+
+
+def _csv_records(text):
+    for number, record in enumerate(csv.DictReader(text), start = 1):
+        # columns missing from a short line come back as None, extra ones under the None key
+        record.pop(None, None)
+        yield number, record
+
+
+def _ndjson_records(text):
+    number = 0
+    for line in text:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield number, record if isinstance(record, dict) else None
+
+
+# decoded lines of the upload, split on "\n" only; the binary file is iterated as it is, since the SpooledTemporaryFile
+# of an upload is no io.IOBase before Python 3.11 and cannot be wrapped in a TextIOWrapper there
+def _text_lines(file):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    for line in file:
+        yield decoder.decode(line)
+    tail = decoder.decode(b"", final = True)
+    if tail:
+        yield tail
+
+
+# (row number, dict or None when the row cannot be parsed) for every record, read lazily from the upload's file
+def import_records(file, file_format: str):
+    text = _text_lines(file)
+    return _csv_records(text) if file_format == "csv" else _ndjson_records(text)
+
+
+# the next batch of records, parsed on a worker thread since the upload is read from a spooled temp file
+async def read_import_batch(records, size: int = USER_IMPORT_BATCH_SIZE):
+    return await run_in_threadpool(lambda: list(islice(records, size)))
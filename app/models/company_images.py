@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy import JSON, Column, ForeignKey, Integer, String
 from sqlalchemy.orm import relationship
 from config.database import Base
 
@@ -7,6 +7,8 @@ class CompanyImage(Base):
 
     id = Column(Integer, primary_key = True, index = True)
     image_path = Column(String(255), nullable = False)
+    # resized webp / avif copies of image_path, filled in by the image pipeline
+    variants = Column(JSON, nullable = True)
     company_id = Column(Integer, ForeignKey('company_table.id'))
 
     company = relationship('CompanyModel', back_populates='images')
@@ -1,9 +1,15 @@
 from config.database import Base
-from sqlalchemy import TIMESTAMP, Column, ForeignKey, Integer, String, text
+from sqlalchemy import TIMESTAMP, Column, ForeignKey, Index, Integer, String, text
 from sqlalchemy.orm import relationship
 
 class CompanyModel(Base):
     __tablename__ = 'company_table'
+    __table_args__ = (
+        # (sort column, id) indexes for the sortable company list keys
+        Index('ix_company_table_company_name_id', 'company_name', 'id'),
+        Index('ix_company_table_company_country_id', 'company_country', 'id'),
+        Index('ix_company_table_created_at_id', 'created_at', 'id'),
+    )
 
     id = Column(Integer, primary_key = True, index = True)
     company_name = Column(String(100), nullable = False)
@@ -18,9 +24,11 @@ class CompanyModel(Base):
 
     created_at = Column(TIMESTAMP, nullable = False, server_default = text("CURRENT_TIMESTAMP"))
     updated_at = Column(TIMESTAMP, nullable = True, server_default = text("CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"))
+    # raised by every update of the row, part of the etag of its views since updated_at only has one second resolution
+    row_version = Column(Integer, nullable = True, server_default = text("0"), onupdate = text("coalesce(row_version, 0) + 1"))
 
     user_id = Column(Integer, ForeignKey('usertable.id'))
-    company_creator = relationship('UserModel', back_populates = 'companies', primaryjoin = 'CompanyModel.user_id == UserModel.id', lazy = 'joined')
+    company_creator = relationship('UserModel', back_populates = 'companies', primaryjoin = 'CompanyModel.user_id == UserModel.id')
 
-    company_users = relationship('UserCompany', back_populates = 'company', lazy = 'joined')
-    images = relationship('CompanyImage', back_populates='company', lazy='joined')
\ No newline at end of file
+    company_users = relationship('UserCompany', back_populates = 'company')
+    images = relationship('CompanyImage', back_populates='company', cascade = 'all, delete-orphan')
\ No newline at end of file
@@ -0,0 +1,24 @@
+from config.database import Base
+from sqlalchemy import TIMESTAMP, Column, Index, Integer, String, Text, text
+
+class EmailOutbox(Base):
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        # the send loop claims due mails by (status, next_attempt_at)
+        Index('ix_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+        # the purge finds the sent mails past their retention by (status, sent_at)
+        Index('ix_email_outbox_status_sent_at', 'status', 'sent_at'),
+    )
+
+    id = Column(Integer, primary_key = True, index = True)
+    recipient = Column(String(100), nullable = False)
+    subject = Column(String(255), nullable = False)
+    body = Column(Text, nullable = False)
+    # pending -> sending -> sent, or failed once the attempts are used up
+    status = Column(String(20), nullable = False, default = 'pending')
+    attempts = Column(Integer, nullable = False, default = 0)
+    last_error = Column(String(255), nullable = True)
+    next_attempt_at = Column(TIMESTAMP, nullable = False)
+    sent_at = Column(TIMESTAMP, nullable = True)
+
+    created_at = Column(TIMESTAMP, nullable = False, server_default = text("CURRENT_TIMESTAMP"))
@@ -0,0 +1,12 @@
+from config.database import Base
+from sqlalchemy import TIMESTAMP, Column, Integer, String, text
+
+class OTPModel(Base):
+    __tablename__ = 'otp_table'
+
+    id = Column(Integer, primary_key = True, index = True)
+    email = Column(String(100), unique = True, nullable = False)
+    otp = Column(String(10), nullable = False)
+    expires_at = Column(TIMESTAMP, nullable = False, index = True)
+
+    created_at = Column(TIMESTAMP, nullable = False, server_default = text("CURRENT_TIMESTAMP"))
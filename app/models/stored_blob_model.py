@@ -0,0 +1,20 @@
+from config.database import Base
+from sqlalchemy import TIMESTAMP, BigInteger, Column, Index, Integer, String, text
+
+class StoredBlob(Base):
+    __tablename__ = 'stored_blob_table'
+    __table_args__ = (
+        # garbage collection looks up unreferenced blobs by (ref_count, released_at)
+        Index('ix_stored_blob_table_ref_count_released_at', 'ref_count', 'released_at'),
+    )
+
+    id = Column(Integer, primary_key = True, index = True)
+    # sha256 of the content, identical uploads share one blob
+    digest = Column(String(64), unique = True, nullable = False)
+    storage_key = Column(String(255), nullable = False)
+    size = Column(BigInteger, nullable = False)
+    # number of rows (profile images, company images) pointing at this blob
+    ref_count = Column(Integer, nullable = False, default = 0)
+    released_at = Column(TIMESTAMP, nullable = True)
+
+    created_at = Column(TIMESTAMP, nullable = False, server_default = text("CURRENT_TIMESTAMP"))
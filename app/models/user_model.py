@@ -1,10 +1,18 @@
 # SQLAlchemy Models
 from config.database import Base
-from sqlalchemy import TIMESTAMP, Column, ForeignKey, Integer, String, text
+from sqlalchemy import JSON, TIMESTAMP, Column, ForeignKey, Index, Integer, String, text
 from sqlalchemy.orm import relationship
 
 class UserModel(Base):
     __tablename__ = 'usertable'
+    __table_args__ = (
+        # word / word-prefix search over name and email (search_mode=fulltext)
+        Index('ix_usertable_name_email_fulltext', 'name', 'email', mysql_prefix = 'FULLTEXT'),
+        # (sort column, id) indexes for the sortable user list keys
+        Index('ix_usertable_name_id', 'name', 'id'),
+        Index('ix_usertable_country_id', 'country', 'id'),
+        Index('ix_usertable_created_at_id', 'created_at', 'id'),
+    )
 
     id = Column(Integer, primary_key = True, index = True)
     name = Column(String(100), nullable = True)
@@ -13,15 +21,20 @@ class UserModel(Base):
     city = Column(String(50), nullable = True)
     state = Column(String(50), nullable = True)
     country = Column(String(50), nullable = True)
+    # uploads/blobs/<2>/<sha256><extension sniffed from the content>, at most 86 characters
     profile_img = Column(String(100), nullable = True)
+    # resized webp / avif copies of profile_img, filled in by the image pipeline
+    profile_img_variants = Column(JSON, nullable = True)
 
     created_at = Column(TIMESTAMP, nullable = False, server_default = text("CURRENT_TIMESTAMP"))
     updated_at = Column(TIMESTAMP, nullable = True, server_default = text("CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"))
+    # raised by every update of the row, part of the etag of its views since updated_at only has one second resolution
+    row_version = Column(Integer, nullable = True, server_default = text("0"), onupdate = text("coalesce(row_version, 0) + 1"))
 
-    companies = relationship('CompanyModel', back_populates = 'company_creator', primaryjoin = 'CompanyModel.user_id == UserModel.id', lazy='joined')
+    companies = relationship('CompanyModel', back_populates = 'company_creator', primaryjoin = 'CompanyModel.user_id == UserModel.id')
 
-    user_companies = relationship('UserCompany', back_populates='user', lazy='joined')
+    user_companies = relationship('UserCompany', back_populates='user')
 
     role_id = Column(Integer, ForeignKey('role_table.id'), nullable = False)
-    role = relationship('Role', back_populates ='users', primaryjoin = 'UserModel.role_id == Role.id', lazy = 'joined')
+    role = relationship('Role', back_populates ='users', primaryjoin = 'UserModel.role_id == Role.id')
     
\ No newline at end of file
@@ -1,96 +1,153 @@
-from fastapi import APIRouter, Depends, Header
+from fastapi import APIRouter, BackgroundTasks, Depends, File, Form, Header, UploadFile
 from fastapi_pagination import Params
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.auth.jwt_bearer import JWTBearer
 from app.modules.company import company_service
 from app.schemas.company_register_schema import CompanyRegisterSchema
-from app.schemas.user_company_schema import UserCompanySchema
+from app.schemas.user_company_schema import UserCompanyBulkResultSchema, UserCompanyBulkSchema, UserCompanySchema
 from config.database import get_db, msg
-from typing import List, Optional
+from typing import List, Optional, Union
 from app.schemas.response_schema import ResponseSchema
-from app.schemas.company_response_schema import CompanyResponseSchema, CompanyWithUsersSchema
+from app.schemas.company_response_schema import CompanyDetailsSchema, CompanyResponseSchema, CompanyWithUsersSchema
 from app.schemas.company_update_schema import CompanyUpdateSchema
+from app.schemas.cursor_page_schema import CursorPageSchema
+from app.helper.conditional_get import is_not_modified, not_modified_response, set_validators
+from app.helper.fast_json import EnvelopeSerializer
 from fastapi import Request
 
 
 router = APIRouter(prefix="/api/company", tags = ["Company"])
 
+# envelopes of the read (and delete / update) routes, rendered straight to JSON without FastAPI's second pass over the body
+company_envelope = EnvelopeSerializer(CompanyResponseSchema)
+company_list_envelope = EnvelopeSerializer(List[CompanyResponseSchema])
+company_cursor_page_envelope = EnvelopeSerializer(CursorPageSchema[CompanyResponseSchema])
+company_users_envelope = EnvelopeSerializer(CompanyWithUsersSchema)
+company_details_envelope = EnvelopeSerializer(CompanyDetailsSchema)
+
+# message of each per-user code returned by add_users_to_company
+USER_COMPANY_RESULT_MESSAGES = {
+    None: "user_added_to_company",
+    4: "user_to_add_not_found",
+    5: "user_already_in_company",
+    6: "user_in_another_company"
+}
+
 
 # Register a new company
 @router.post("/register", summary = "Register a new company", response_model = ResponseSchema[CompanyResponseSchema], dependencies = [Depends(JWTBearer())])
-async def register_company(company_data: CompanyRegisterSchema, request: Request, db: Session = Depends(get_db)):
-    new_company = await company_service.create_company(company_data = company_data, request = request, db = db)
+async def register_company(company_data: CompanyRegisterSchema, request: Request, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db)):
+    new_company = await company_service.create_company(company_data = company_data, request = request, db = db, background_tasks = background_tasks)
 
     if new_company == 1:
         return ResponseSchema(status = False, response = msg["invalid_email_format"], data = None)
     elif new_company == 2:
         return ResponseSchema(status = False, response = msg["create_not_authorized"], data = None)
+    elif new_company == 3:
+        return ResponseSchema(status = False, response = msg["file_too_large"], data = None)
+    elif new_company == 4:
+        return ResponseSchema(status = False, response = msg["invalid_image"], data = None)
     elif new_company:
         return ResponseSchema(status = True, response = msg["company_register"], data = new_company)
     else:
         return ResponseSchema(status = False, response = msg["company_already_exists"], data = None)
 
 
-# Get all company list 
-@router.get("/list", summary = "List of companies", response_model = ResponseSchema[List[CompanyResponseSchema]], dependencies = [Depends(JWTBearer())])
-def list_companies(request: Request, params: Params = Depends(), db: Session = Depends(get_db), sort_by: Optional[str] = None, sort_direction: Optional[str] = None):
-    all_company = company_service.get_all_company(request = request, db = db, params = params, sort_by = sort_by, sort_direction = sort_direction)
+
+# Register a new company with the images as multipart file uploads, streamed to disk instead of sent as base64
+@router.post("/register/upload", summary = "Register a new company with image uploads", response_model = ResponseSchema[CompanyResponseSchema], dependencies = [Depends(JWTBearer())])
+async def register_company_upload(request: Request, background_tasks: BackgroundTasks, company_name: str = Form(...), company_email: str = Form(...), company_number: str = Form(...), company_zipcode: str = Form(None), company_city: str = Form(None), company_state: str = Form(None), company_country: str = Form(...), company_images: List[UploadFile] = File(None), db: AsyncSession = Depends(get_db)):
+    company_data = CompanyRegisterSchema(company_name = company_name, company_email = company_email, company_number = company_number, company_zipcode = company_zipcode, company_city = company_city, company_state = company_state, company_country = company_country, company_profile = None)
+    new_company = await company_service.create_company(company_data = company_data, request = request, db = db, background_tasks = background_tasks, image_files = company_images)
+
+    if new_company == 1:
+        return ResponseSchema(status = False, response = msg["invalid_email_format"], data = None)
+    elif new_company == 2:
+        return ResponseSchema(status = False, response = msg["create_not_authorized"], data = None)
+    elif new_company == 3:
+        return ResponseSchema(status = False, response = msg["file_too_large"], data = None)
+    elif new_company == 4:
+        return ResponseSchema(status = False, response = msg["invalid_image"], data = None)
+    elif new_company:
+        return ResponseSchema(status = True, response = msg["company_register"], data = new_company)
+    else:
+        return ResponseSchema(status = False, response = msg["company_already_exists"], data = None)
+
+
+# Get all company list (pass cursor_mode=true or a cursor for keyset pagination, the response then carries next_cursor)
+@router.get("/list", summary = "List of companies", response_model = ResponseSchema[Union[List[CompanyResponseSchema], CursorPageSchema[CompanyResponseSchema]]], dependencies = [Depends(JWTBearer())])
+async def list_companies(request: Request, params: Params = Depends(), db: AsyncSession = Depends(get_db), sort_by: Optional[str] = None, sort_direction: Optional[str] = None, cursor: Optional[str] = None, cursor_mode: bool = False, with_total: bool = False):
+    all_company = await company_service.get_all_company(request = request, db = db, params = params, sort_by = sort_by, sort_direction = sort_direction, cursor = cursor, cursor_mode = cursor_mode, with_total = with_total)
     
     if all_company == 1:
         return ResponseSchema(status = False, response = msg["view_not_authorized"], data = None)
+    elif all_company == 2:
+        return ResponseSchema(status = False, response = msg["invalid_cursor"], data = None)
+    elif all_company == 3:
+        return ResponseSchema(status = False, response = msg["invalid_sort"], data = None)
     elif all_company is None:
         return ResponseSchema(status = False, response = msg["company_list_not_found"], data = None)
+    elif cursor_mode or cursor:
+        return company_cursor_page_envelope(True, msg["company_list_found"], all_company)
     else: 
-        return ResponseSchema(status = True, response=msg["company_list_found"], data = all_company.items)
+        return company_list_envelope(True, msg["company_list_found"], all_company.items)
 
 
 
 # Get company information by id 
 @router.get("/{companyId}", summary = "Get company information by ID", response_model = ResponseSchema[CompanyResponseSchema], dependencies = [Depends(JWTBearer())])
-def view_company(company_id: int, request: Request, db: Session = Depends(get_db)):
-    get_company = company_service.get_company_by_id(company_id = company_id, request = request, db = db)
+async def view_company(company_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    # polling clients revalidate with If-None-Match / If-Modified-Since and get a bodyless 304 while unchanged
+    validators = await company_service.get_company_validators(company_id = company_id, view = "company", request = request, db = db)
+    if validators and is_not_modified(request, *validators):
+        return not_modified_response(*validators)
+
+    get_company = await company_service.get_company_by_id(company_id = company_id, request = request, db = db, version = validators[0] if validators else None)
     
     if get_company == 1:
         return ResponseSchema(status = False, response = msg["not_allowed_to_view"], data = None)
     elif get_company is None:
         return ResponseSchema(status = False, response = msg["get_company_by_id_not_found"], data = None)
     else:
-        return ResponseSchema(status = True, response = msg["get_company_by_id"], data = get_company.__dict__)
+        response = company_envelope(True, msg["get_company_by_id"], get_company)
+        if validators:
+            set_validators(response, *validators)
+        return response
 
 
 
 # Delete compapny by id
 @router.delete("/delete/{companyId}", summary = "Delete company by ID", response_model = ResponseSchema[CompanyResponseSchema], dependencies = [Depends(JWTBearer())])
-def delete_company(company_id: int, request: Request, db: Session = Depends(get_db)):
-    delete_company = company_service.delete_company_by_id(company_id = company_id, request = request, db = db)
+async def delete_company(company_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    delete_company = await company_service.delete_company_by_id(company_id = company_id, request = request, db = db)
     
     if delete_company == 1:
         return ResponseSchema(status = False, response = msg["delete_not_authorized"], data = None)
     elif delete_company is None:
         return ResponseSchema(status = False, response = msg["delete_company_by_id_not_found"], data = None)
     else:
-        return ResponseSchema(status = True, response = msg["delete_company_by_id"], data = delete_company.__dict__)
+        return company_envelope(True, msg["delete_company_by_id"], delete_company)
 
     
     
 # Update company by id
 @router.put("/update/{companyId}", summary = "Update company by ID", response_model = ResponseSchema[CompanyResponseSchema], dependencies = [Depends(JWTBearer())])
-def update_company(company_id: int, request: Request, company_data: CompanyUpdateSchema, db: Session = Depends(get_db)):
-    updated_company = company_service.update_company_by_id(company_id = company_id, company_data = company_data, request = request, db = db)
+async def update_company(company_id: int, request: Request, company_data: CompanyUpdateSchema, db: AsyncSession = Depends(get_db)):
+    updated_company = await company_service.update_company_by_id(company_id = company_id, company_data = company_data, request = request, db = db)
     
     if updated_company == 1:
         return ResponseSchema(status = False, response = msg["update_not_authorized"], data = None)
     elif updated_company is None:
         return ResponseSchema(status = False, response = msg["update_company_by_id_not_found"], data = None)
     else:
-        return ResponseSchema(status = True, response = msg["update_company_by_id"], data = updated_company.__dict__)
+        return company_envelope(True, msg["update_company_by_id"], updated_company)
     
 
 
 # add user in the specific company 
 @router.post("/adduser/{companyId}/{userId}", summary = "Add user to a company", response_model = ResponseSchema[UserCompanySchema], dependencies = [Depends(JWTBearer())])
-def add_user_to_company_route(company_id: int, request: Request, user_id: int, db: Session = Depends(get_db)):
-    result = company_service.add_user_to_company(company_id = company_id, user_id = user_id, request = request, db = db)
+async def add_user_to_company_route(company_id: int, request: Request, user_id: int, db: AsyncSession = Depends(get_db)):
+    result = await company_service.add_user_to_company(company_id = company_id, user_id = user_id, request = request, db = db)
     
     if result == 1:
         return ResponseSchema(status= False, response = msg["user_not_found"], data = None)
@@ -111,10 +168,30 @@ def add_user_to_company_route(company_id: int, request: Request, user_id: int, d
  
 
 
+# add many users to the specific company in one call, with the outcome for every user
+@router.post("/addusers/{company_id}", summary = "Add users to a company", response_model = ResponseSchema[UserCompanyBulkResultSchema], dependencies = [Depends(JWTBearer())])
+async def add_users_to_company_route(company_id: int, request: Request, user_data: UserCompanyBulkSchema, db: AsyncSession = Depends(get_db)):
+    result = await company_service.add_users_to_company(company_id = company_id, user_ids = user_data.user_ids, request = request, db = db)
+
+    if result == 1:
+        return ResponseSchema(status = False, response = msg["user_not_found"], data = None)
+    elif result == 2:
+        return ResponseSchema(status = False, response = msg["not_authorized"], data = None)
+    elif result == 3:
+        return ResponseSchema(status = False, response = msg["company_not_found"], data = None)
+    elif result is None:
+        return ResponseSchema(status = False, response = msg["user_add_failed"], data = None)
+    else:
+        for user_result in result["results"]:
+            user_result["response"] = msg[USER_COMPANY_RESULT_MESSAGES[user_result["code"]]]
+        return ResponseSchema(status = True, response = msg["users_added_to_company"], data = result)
+
+
+
 # get all users of a company by company_id
 @router.get("/userlist/{companyId}", summary = "Get company details with associated users", response_model = ResponseSchema[CompanyWithUsersSchema], dependencies = [Depends(JWTBearer())])
-def get_company_with_users_route(company_id: int, request: Request, db: Session = Depends(get_db)):
-    company_with_users = company_service.get_company_users(company_id = company_id, request = request, db = db)
+async def get_company_with_users_route(company_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    company_with_users = await company_service.get_company_users(company_id = company_id, request = request, db = db)
     
     if company_with_users == 1:
         return ResponseSchema(status = False, response = msg["company_not_found"], data = None)
@@ -123,30 +200,37 @@ def get_company_with_users_route(company_id: int, request: Request, db: Session
     elif company_with_users == 3:
         return ResponseSchema(status = False, response = msg["no_users_found"], data = None)
     else:
-        return ResponseSchema(status = True, response = msg["users_found"], data = company_with_users)
+        return company_users_envelope(True, msg["users_found"], company_with_users)
 
 
 
 # get created and updated time of the company
 @router.get("/companyinfo/{companyId}", summary = "Get created and updated time of the company", response_model = ResponseSchema, dependencies = [Depends(JWTBearer())])
-def get_company_details(company_id: int, request: Request, db: Session = Depends(get_db)):
-    company_details = company_service.get_company_details_by_id(company_id = company_id, db = db, request = request)
+async def get_company_details(company_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    validators = await company_service.get_company_validators(company_id = company_id, view = "companyinfo", request = request, db = db)
+    if validators and is_not_modified(request, *validators):
+        return not_modified_response(*validators)
+
+    company_details = await company_service.get_company_details_by_id(company_id = company_id, db = db, request = request, version = validators[0] if validators else None)
     
     if company_details is None:
         return ResponseSchema(status = False, response = msg["company_not_found"], data = None)
     elif company_details == 1:
         return ResponseSchema(status = False, response = msg["not_authorized"], data = None)
     else:
-        return ResponseSchema(status = True, response = msg["company_details_fetched"], data = company_details)
+        response = company_details_envelope(True, msg["company_details_fetched"], company_details)
+        if validators:
+            set_validators(response, *validators)
+        return response
 
 
 
 # get company details by using UUID (pass the uuid in header)
 @router.post("/info/uuid", summary = "Get company details by UUID", response_model = ResponseSchema[CompanyResponseSchema], dependencies = [Depends(JWTBearer())])
-def get_company_details(uuid: str = Header(None), db: Session = Depends(get_db)):
-    company = company_service.get_company_by_uuid(uuid = uuid, db = db)
+async def get_company_details(uuid: str = Header(None), db: AsyncSession = Depends(get_db)):
+    company = await company_service.get_company_by_uuid(uuid = uuid, db = db)
 
     if company:
-        return ResponseSchema(status = True, response = msg["company_details_fetched"], data = company)
+        return company_envelope(True, msg["company_details_fetched"], company)
     else:
         return ResponseSchema(status = False, response= msg["company_not_found"], data = None)
\ No newline at end of file
@@ -1,10 +1,19 @@
-import base64
-from typing import Optional
-from fastapi import Header, Request
+from typing import List, Optional
+from fastapi import BackgroundTasks, Header, Request, UploadFile
 from fastapi_pagination.ext.sqlalchemy import paginate
 from fastapi_pagination import Params
-from sqlalchemy.orm import Session, load_only, joinedload
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only, joinedload, selectinload
 from app.helper.email_sender import Helper
+from app.helper.cursor_pagination import InvalidCursorError, paginate_by_cursor
+from app.helper.list_sorting import InvalidSortError, order_by_sort, resolve_sort
+from app.helper.image_pipeline import image_pipeline, variant_paths, variant_urls
+from app.helper.response_cache import company_cache, company_tag, company_uuid_tag, invalidate_company
+from app.helper.conditional_get import build_validators
+from app.helper.list_rows import CompanyCreatorRow, CompanyListRow
+from app.helper.file_upload import InvalidImageError, UploadTooLargeError, discard_temp_upload, save_base64_image_to_temp, save_image_upload_to_temp
+from app.storage.blob_store import blob_store
 from app.models.company_model import CompanyModel
 from app.models.roles_model import Role
 from app.models.company_images import CompanyImage
@@ -18,14 +27,21 @@ from datetime import datetime
 import os
 from dotenv import load_dotenv
 import uuid
-from PIL import Image
-from io import BytesIO
 
 
 load_dotenv()
 
 BASE_URL = os.getenv("BASE_URL")
 
+# sort keys accepted by the company list, each backed by a (column, id) index
+COMPANY_SORT_COLUMNS = {
+    "id": CompanyModel.id,
+    "company_name": CompanyModel.company_name,
+    "company_email": CompanyModel.company_email,
+    "company_country": CompanyModel.company_country,
+    "created_at": CompanyModel.created_at
+}
+
 # create a new company
 # async def create_company(company_data: CompanyRegisterSchema, request: Request, db: Session):
 #     try:
@@ -123,9 +139,10 @@ BASE_URL = os.getenv("BASE_URL")
 
 
 
-async def create_company(company_data: CompanyRegisterSchema, request: Request, db: Session):
+async def create_company(company_data: CompanyRegisterSchema, request: Request, db: AsyncSession, background_tasks: Optional[BackgroundTasks] = None, image_files: Optional[List[UploadFile]] = None):
+    staged_images = []
     try:
-        user = Helper.getAuthUser(request, db)
+        user = await Helper.getAuthUser(request, db)
         if not user:
             return None
         
@@ -133,14 +150,36 @@ async def create_company(company_data: CompanyRegisterSchema, request: Request,
             return 1
 
         # Ensure the user has the 'superadmin' role
-        role = db.query(Role).filter(Role.id == user.role_id).first()
-        if not role or role.id != 1:
+        if user.role_id != 1:
             return 2  # Not authorized to create company
 
-        existing_company = db.query(CompanyModel).filter(CompanyModel.company_email == company_data.company_email).first()
+        existing_company = (await db.execute(select(CompanyModel.id).filter(CompanyModel.company_email == company_data.company_email))).first()
         if existing_company:
             return None  
 
+        # stage the images as temp files first, streamed multipart uploads or the older base64 strings
+        try:
+            if image_files:
+                for upload in image_files:
+                    if upload and upload.filename:
+                        staged_images.append(await save_image_upload_to_temp(upload))
+            elif company_data.company_profile:
+                for image_data in company_data.company_profile:
+                    if image_data:
+                        staged_images.append(await save_base64_image_to_temp(image_data))
+        except UploadTooLargeError:
+            return 3
+        except InvalidImageError:
+            return 4
+
+        # blob references, the company and its images are written in one transaction;
+        # files of new blobs are only written after the commit
+        # content addressed, a logo already stored for another company is only referenced again
+        pending_blobs = []
+        company_images = await blob_store.store_many(db, staged_images, pending = pending_blobs) if staged_images else []
+
+        company_profile_image = company_images[0] if company_images else None
+
         new_company = CompanyModel(
             company_name = company_data.company_name,
             company_email = company_data.company_email,
@@ -149,52 +188,25 @@ async def create_company(company_data: CompanyRegisterSchema, request: Request,
             company_city = company_data.company_city,
             company_state = company_data.company_state,
             company_country = company_data.company_country,
+            company_profile = company_profile_image,
             user_id = user.id,
             uuid=str(uuid.uuid4())
         )
         db.add(new_company)
-        db.commit()
-        db.refresh(new_company)
-
-        company_images = []
-        company_profile_image = None
-
-        if company_data.company_profile:
-            for index, image_data in enumerate(company_data.company_profile):
-                if image_data:
-                    if "," in image_data:
-                        header, image_data = image_data.split(",", 1)
-                    else:
-                        image_data = image_data.strip()
-
-                    file_data = base64.b64decode(image_data)
-                    image = Image.open(BytesIO(file_data))
-                    file_extension = f".{image.format.lower()}"
-                    
-                    image_number = index + 1
-                    timestamp = int(datetime.now().timestamp())
-                    image_path = f"uploads/company/{new_company.id}_{timestamp}_{image_number}{file_extension}"
-                    
-                    with open(image_path, "wb") as file:
-                        file.write(file_data)
-                    
-                    company_images.append(image_path)
+        await db.flush()
 
-                    if index == 0:  
-                        company_profile_image = image_path
+        # one multi-row insert instead of an ORM object (and insert) per image
+        if company_images:
+            await db.execute(insert(CompanyImage), [{"image_path": image_path, "company_id": new_company.id} for image_path in company_images])
 
-        for image_path in company_images:
-            company_image = CompanyImage(
-                image_path = image_path,
-                company_id = new_company.id
-            )
-            db.add(company_image)
-        
-        db.commit()
+        company_creator = (await db.execute(select(UserModel.name, UserModel.email, UserModel.country).filter(UserModel.id == user.id))).first()
+
+        await db.commit()
+        await blob_store.publish(pending_blobs)
 
-        if company_profile_image:
-            new_company.company_profile = company_profile_image
-            db.commit()
+        # thumbnails / webp variants are rendered after the response is sent
+        if company_images and background_tasks is not None:
+            background_tasks.add_task(image_pipeline.process_company_images, company_images)
 
         company_profile_url = f"{BASE_URL}{company_profile_image}" if company_profile_image else None
         company_images_urls = [f"{BASE_URL}{img}" for img in company_images]
@@ -210,93 +222,153 @@ async def create_company(company_data: CompanyRegisterSchema, request: Request,
             "company_country": new_company.company_country,
             "company_profile": company_profile_url,
             "company_images": company_images_urls,  
-            "company_creator": new_company.company_creator,
+            "company_creator": company_creator,
             "uuid": new_company.uuid,
         }
         return response
     except Exception as e:
         print("An exception occurred:", str(e))
+    finally:
+        for temp_path, _ in staged_images:
+            discard_temp_upload(temp_path)
 
 
 
 # get all company information
-def get_all_company(request: Request, db: Session, params: Params, sort_by: Optional[str] = None, sort_direction: Optional[str] = None):
+async def get_all_company(request: Request, db: AsyncSession, params: Params, sort_by: Optional[str] = None, sort_direction: Optional[str] = None, cursor: Optional[str] = None, cursor_mode: bool = False, with_total: bool = False):
     try:
-        user = Helper.getAuthUser(request, db)
+        user = await Helper.getAuthUser(request, db)
         if not user:
             return None
 
         # Ensure the user has role_id 1 (superadmin) to allow company list view
         if user.role_id != 1:
             return 1  # Not authorized to view companies
-        all_company = db.query(CompanyModel).options(load_only(CompanyModel.id, CompanyModel.company_email, CompanyModel.company_name, CompanyModel.company_city, CompanyModel.company_country, CompanyModel.company_state), joinedload(CompanyModel.company_creator).options(load_only(UserModel.name, UserModel.email, UserModel.country)))
+        # the listed columns and the creator's in one select, read into plain rows instead of hydrated entities
+        all_company = select(CompanyModel.id, CompanyModel.uuid, CompanyModel.company_name, CompanyModel.company_email, CompanyModel.company_number, CompanyModel.company_zipcode, CompanyModel.company_city, CompanyModel.company_state, CompanyModel.company_country, CompanyModel.company_profile, UserModel.name.label("creator_name"), UserModel.email.label("creator_email"), UserModel.country.label("creator_country")).outerjoin(UserModel, CompanyModel.user_id == UserModel.id)
 
 
-        if sort_by and sort_direction:
-            if sort_direction == "desc":
-                all_company = all_company.order_by(getattr(CompanyModel, sort_by).desc())
-            elif sort_direction == "asc":
-                all_company = all_company.order_by(getattr(CompanyModel, sort_by).asc())
-        
-        paginated_company = paginate(all_company, params = params)
+        sort_by, sort_direction = resolve_sort(COMPANY_SORT_COLUMNS, sort_by, sort_direction)
+        all_company = order_by_sort(all_company, COMPANY_SORT_COLUMNS, CompanyModel.id, sort_by, sort_direction)
 
-        for company in paginated_company.items:
-            if company.company_profile:
-                company.company_profile = f"{BASE_URL}{company.company_profile}"
+        # keyset pagination over (sort column, id), deep pages cost the same as the first one
+        if cursor_mode or cursor:
+            paginated_company = await paginate_by_cursor(db, all_company, CompanyModel, size = params.size, sort_key = sort_by, direction = sort_direction, cursor = cursor, with_total = with_total)
+            paginated_company["items"] = _company_list_rows(paginated_company["items"])
+        else:
+            paginated_company = await paginate(db, all_company, params = params, unique = False)
+            paginated_company.items = _company_list_rows(paginated_company.items)
         return paginated_company
     
+    except InvalidCursorError as e:
+        print("Invalid cursor:", str(e))
+        return 2
+    except InvalidSortError as e:
+        print("Invalid sort:", str(e))
+        return 3
     except Exception as e:
         print("An exception occurred:", str(e))
 
 
+def _company_list_rows(rows):
+    return [CompanyListRow(
+        id = row.id,
+        uuid = row.uuid,
+        company_name = row.company_name,
+        company_email = row.company_email,
+        company_number = row.company_number,
+        company_zipcode = row.company_zipcode,
+        company_city = row.company_city,
+        company_state = row.company_state,
+        company_country = row.company_country,
+        company_profile = f"{BASE_URL}{row.company_profile}" if row.company_profile else None,
+        company_creator = CompanyCreatorRow(row.creator_name, row.creator_email, row.creator_country) if row.creator_email is not None else None
+    ) for row in rows]
+
+
 
 
 # get company by id
-def get_company_by_id(company_id: int, request: Request, db: Session):
+async def get_company_by_id(company_id: int, request: Request, db: AsyncSession, version: Optional[str] = None):
     try:
-        user = Helper.getAuthUser(request, db)
+        user = await Helper.getAuthUser(request, db)
         if not user:
             return None
 
         # Check if the user has role_id 1 (superadmin) or role_id 2 (companyadmin)
         if user.role_id != 1 and user.role_id != 2:
             return 1  # Not authorized to view the company
-    
-        company = db.query(CompanyModel).filter(CompanyModel.id == company_id).first()
-        if not company:
-            return None
-        if company.company_profile:
-                company.company_profile = f"{BASE_URL}{company.company_profile}"
-        
+
+        # cached per company (the view is the same for both roles), dropped again by every write to the company; the
+        # version (etag) keeps an entry another worker has not dropped yet from being served under newer validators
+        company = await company_cache.get_or_load(f"company:{company_id}:{version}", (company_tag(company_id),), lambda: _load_company_by_id(company_id, db))
         return company
     except Exception as e:
         print("An exception occurred:", str(e))
 
 
+async def _load_company_by_id(company_id: int, db: AsyncSession):
+    company = (await db.execute(select(CompanyModel).options(joinedload(CompanyModel.company_creator).load_only(UserModel.name, UserModel.email, UserModel.country)).filter(CompanyModel.id == company_id))).scalars().first()
+    if not company:
+        return None
+    return _company_response(company)
+
+
+# the company (with its creator loaded) as a plain dict; the profile url is set on the dict, the loaded entity stays
+# as it is in the session
+def _company_response(company: CompanyModel):
+    data = CompanyResponseSchema.model_validate(company).model_dump()
+    if data["company_profile"]:
+        data["company_profile"] = f"{BASE_URL}{data['company_profile']}"
+    return data
+
+
+
+
+# etag / last modified of a company view (by id, details) from the updated_at / row_version of the company and its
+# creator, one primary key lookup without loading the company; None when the view is not served to the user
+async def get_company_validators(company_id: int, view: str, request: Request, db: AsyncSession):
+    try:
+        user = await Helper.getAuthUser(request, db)
+        if not user or (user.role_id != 1 and user.role_id != 2):
+            return None
+
+        validators = (await db.execute(select(CompanyModel.id, CompanyModel.updated_at, CompanyModel.row_version, UserModel.id, UserModel.updated_at, UserModel.row_version).outerjoin(UserModel, CompanyModel.user_id == UserModel.id).filter(CompanyModel.id == company_id))).first()
+        if not validators:
+            return None
+        return build_validators(view, *validators)
+    except Exception as e:
+        print("An exception occurred:", str(e))
+
+
 
 
 # delete company by id
-def delete_company_by_id(company_id: int, request: Request, db: Session):
+async def delete_company_by_id(company_id: int, request: Request, db: AsyncSession):
     try:
-        user = Helper.getAuthUser(request, db)
+        user = await Helper.getAuthUser(request, db)
         if not user:
             return None
 
         # Check if the user has role_id 1 (superadmin) to allow deletion
         if user.role_id != 1:
             return 1  # Not authorized to delete the company
-        company = db.query(CompanyModel).filter(CompanyModel.id == company_id).first()
+        company = (await db.execute(select(CompanyModel).options(joinedload(CompanyModel.company_creator).load_only(UserModel.name, UserModel.email, UserModel.country), selectinload(CompanyModel.company_users), selectinload(CompanyModel.images)).filter(CompanyModel.id == company_id))).scalars().first()
 
         if company is None:
             return None
-        
-        if company.company_profile:
-                company.company_profile = f"{BASE_URL}{company.company_profile}"
 
-        db.delete(company)
-        db.commit()
+        image_paths = [image.image_path for image in company.images]
+        await blob_store.release(db, image_paths)
+        deleted_company = _company_response(company)
 
-        return company
+        await db.delete(company)
+        await db.commit()
+        await invalidate_company(company.id, company.uuid)
+        # files from before content addressing belong to this company only
+        await blob_store.remove_unmanaged(image_paths + [path for image in company.images for path in variant_paths(image.variants)])
+
+        return deleted_company
 
     except Exception as e:
         print("Exception occurred:", str(e))
@@ -305,16 +377,16 @@ def delete_company_by_id(company_id: int, request: Request, db: Session):
 
 
 # update company by id 
-def update_company_by_id(company_id: int,  request: Request, db: Session, company_data: CompanyUpdateSchema):
+async def update_company_by_id(company_id: int,  request: Request, db: AsyncSession, company_data: CompanyUpdateSchema):
     try:
-        user = Helper.getAuthUser(request, db)
+        user = await Helper.getAuthUser(request, db)
         if not user:
             return None
 
         # Check if the user has role_id 1 (superadmin) to allow updates
         if user.role_id != 1:
             return 1  # Not authorized to update the company
-        existing_company = db.query(CompanyModel).filter(CompanyModel.id == company_id).first()
+        existing_company = (await db.execute(select(CompanyModel).options(joinedload(CompanyModel.company_creator).load_only(UserModel.name, UserModel.email, UserModel.country)).filter(CompanyModel.id == company_id))).scalars().first()
 
         if not existing_company:
             return None
@@ -342,57 +414,46 @@ def update_company_by_id(company_id: int,  request: Request, db: Session, compan
         
         existing_company.updated_at = datetime.now()
 
-        db.commit()
-        db.refresh(existing_company)
-        return CompanyResponseSchema(
-            id = existing_company.id,
-            company_name = existing_company.company_name,
-            company_email = existing_company.company_email,
-            company_number = existing_company.company_number,
-            company_zipcode = existing_company.company_zipcode,
-            company_city = existing_company.company_city,
-            company_state = existing_company.company_state,
-            company_country = existing_company.company_country,
-            company_profile = existing_company.company_profile,
-            company_creator = existing_company.company_creator,
-            uuid = existing_company.uuid
-            )
+        await db.commit()
+        await invalidate_company(existing_company.id, existing_company.uuid)
+        return _company_response(existing_company)
 
     except Exception as e:
         print("Exception occurred:", str(e))
 
 
 # add user to specific company
-def add_user_to_company(company_id: int, request: Request, user_id: int, db: Session):
+async def add_user_to_company(company_id: int, request: Request, user_id: int, db: AsyncSession):
     try:
-        user = Helper.getAuthUser(request, db)
+        user = await Helper.getAuthUser(request, db)
         if not user:
             return 1 # User not found
 
         if user.role_id != 2:
             return 2  # Not authorized
         
-        company = db.query(CompanyModel).filter(CompanyModel.id == company_id).first()
+        company = (await db.execute(select(CompanyModel.id, CompanyModel.company_name, CompanyModel.company_email).filter(CompanyModel.id == company_id))).first()
         if not company:
             return 3  # Company not found
         
-        user_to_add = db.query(UserModel).filter(UserModel.id == user_id).first()
+        user_to_add = (await db.execute(select(UserModel.id, UserModel.name, UserModel.email).filter(UserModel.id == user_id))).first()
         if not user_to_add:
             return 4  # User to add not found
         
-        existing_user_company = db.query(UserCompany).filter_by(user_id=user_id, company_id=company_id).first()
+        existing_user_company = (await db.execute(select(UserCompany).filter_by(user_id=user_id, company_id=company_id))).scalars().first()
         if existing_user_company:
             return 5  # User already in the company
         
-        user_association = db.query(UserCompany).filter_by(user_id=user_id).first()
+        user_association = (await db.execute(select(UserCompany).filter_by(user_id=user_id))).scalars().first()
         if user_association:
-            user_associated_company = db.query(CompanyModel).filter(CompanyModel.id == user_association.company_id).first()
+            user_associated_company = (await db.execute(select(CompanyModel.id).filter(CompanyModel.id == user_association.company_id))).first()
             return 6  # User in another company
         
         user_company = UserCompany(user_id=user_id, company_id=company_id)
         db.add(user_company)
-        db.commit()
-        db.refresh(user_company)
+        await db.commit()
+        await invalidate_company(company_id)
+        await db.refresh(user_company)
         
         return UserCompanySchema(
             user_id = user_company.user_id,
@@ -408,104 +469,218 @@ def add_user_to_company(company_id: int, request: Request, user_id: int, db: Ses
 
 
 
-def get_company_users(company_id: int, request: Request, db: Session):
+# add many users to a company at once: the same checks as add_user_to_company, but one IN query for the users and one for
+# their memberships, then a single insert of the new links; each user gets the add_user_to_company code (None when added)
+async def add_users_to_company(company_id: int, request: Request, user_ids: List[int], db: AsyncSession):
     try:
-        user = Helper.getAuthUser(request, db)
+        user = await Helper.getAuthUser(request, db)
         if not user:
-            return None
-            # return 2  # User not found
+            return 1 # User not found
+
+        if user.role_id != 2:
+            return 2  # Not authorized
 
-        company = db.query(CompanyModel).filter(CompanyModel.id == company_id).first()
+        company = (await db.execute(select(CompanyModel.id, CompanyModel.company_name, CompanyModel.company_email).filter(CompanyModel.id == company_id))).first()
         if not company:
-            return 1  # Company not found
+            return 3  # Company not found
 
-        # Check if the user has role_id 1 (superadmin) or role_id 2 (companyadmin)
-        if user.role_id != 1 and user.role_id != 2:
-            return 2  # Not authorized to view the company
+        user_ids = list(dict.fromkeys(user_ids))
+        found = set((await db.execute(select(UserModel.id).filter(UserModel.id.in_(user_ids)))).scalars().all())
+        memberships = {}
+        for user_id, member_of in (await db.execute(select(UserCompany.user_id, UserCompany.company_id).filter(UserCompany.user_id.in_(found)))).all():
+            # a link to this company wins over links to other companies
+            if memberships.get(user_id) != company_id:
+                memberships[user_id] = member_of
+
+        results = []
+        new_links = []
+        for user_id in user_ids:
+            if user_id not in found:
+                code = 4  # User to add not found
+            elif memberships.get(user_id) == company_id:
+                code = 5  # User already in the company
+            elif user_id in memberships:
+                code = 6  # User in another company
+            else:
+                code = None
+                new_links.append({"user_id": user_id, "company_id": company_id})
+            results.append({"user_id": user_id, "status": code is None, "code": code})
+
+        if new_links:
+            await db.execute(insert(UserCompany), new_links)
+            await db.commit()
+            await invalidate_company(company_id)
+
+        return {
+            "company_id": company.id,
+            "company_name": company.company_name,
+            "company_email": company.company_email,
+            "added": len(new_links),
+            "skipped": len(results) - len(new_links),
+            "results": results
+        }
+
+    except Exception as e:
+        print("Exception occurred:", str(e))
 
-        users = db.query(UserModel).join(UserCompany).filter(UserCompany.company_id == company_id).all()
 
-        user_details = [UserDetailSchema(user_id=user.id, user_name=user.name, user_email=user.email)
-                        for user in users]
 
-        company_with_users = CompanyWithUsersSchema(
-            company_id = company.id,
-            company_name = company.company_name,
-            company_email = company.company_email,
-            company_state = company.company_state,
-            company_country = company.company_country,
-            users = user_details
-        )
+async def get_company_users(company_id: int, request: Request, db: AsyncSession):
+    try:
+        user = await Helper.getAuthUser(request, db)
+        if not user:
+            return None
+            # return 2  # User not found
+
+        # Check if the user has role_id 1 (superadmin) or role_id 2 (companyadmin)
+        if user.role_id != 1 and user.role_id != 2:
+            company = (await db.execute(select(CompanyModel.id).filter(CompanyModel.id == company_id))).first()
+            return 2 if company else 1  # Not authorized to view the company / Company not found
 
-        if not company_with_users.users:
-            return 3  # No users found
+        version = await _company_users_version(company_id, db)
+        if version is None:
+            return 1  # Company not found
 
+        # keyed by the version of the rows the view shows, a worker that did not see the invalidation of a write
+        # misses on the new key instead of serving the old member list
+        company_with_users = await company_cache.get_or_load(f"company:{company_id}:users:{version}", (company_tag(company_id),), lambda: _load_company_users(company_id, db))
         return company_with_users
     except Exception as e:
         print("Exception occurred:", str(e))
 
 
+# version of the member list view: the company row and the count / newest link / summed row_version of its members,
+# one primary key lookup; None when the company does not exist
+async def _company_users_version(company_id: int, db: AsyncSession):
+    member_count = select(func.count(UserCompany.id)).where(UserCompany.company_id == CompanyModel.id).scalar_subquery()
+    newest_link = select(func.max(UserCompany.id)).where(UserCompany.company_id == CompanyModel.id).scalar_subquery()
+    member_versions = select(func.sum(UserModel.row_version)).join(UserCompany, UserCompany.user_id == UserModel.id).where(UserCompany.company_id == CompanyModel.id).scalar_subquery()
+    validators = (await db.execute(select(CompanyModel.id, CompanyModel.updated_at, CompanyModel.row_version, member_count, newest_link, member_versions).filter(CompanyModel.id == company_id))).first()
+    if not validators:
+        return None
+    return build_validators("userlist", *validators)[0]
+
+
+async def _load_company_users(company_id: int, db: AsyncSession):
+    company = (await db.execute(select(CompanyModel.id, CompanyModel.company_name, CompanyModel.company_email, CompanyModel.company_state, CompanyModel.company_country).filter(CompanyModel.id == company_id))).first()
+    if not company:
+        return 1  # Company not found
+
+    users = (await db.execute(select(UserModel.id, UserModel.name, UserModel.email).join(UserCompany).filter(UserCompany.company_id == company_id))).all()
+
+    user_details = [UserDetailSchema(user_id=user.id, user_name=user.name, user_email=user.email)
+                    for user in users]
+
+    company_with_users = CompanyWithUsersSchema(
+        company_id = company.id,
+        company_name = company.company_name,
+        company_email = company.company_email,
+        company_state = company.company_state,
+        company_country = company.company_country,
+        users = user_details
+    )
+
+    if not company_with_users.users:
+        return 3  # No users found
+
+    return company_with_users.model_dump()
+
+
 
 
 # get created and updated time of the company
-def get_company_details_by_id(company_id: int, request: Request,  db: Session):
+async def get_company_details_by_id(company_id: int, request: Request,  db: AsyncSession, version: Optional[str] = None):
     try:
-        user = Helper.getAuthUser(request, db)
+        user = await Helper.getAuthUser(request, db)
         if not user:
             return None
 
         # access is only granted if the user has either role ID 1 or 2
         if user.role_id != 1 and user.role_id != 2:
             return 1
-        
-        company = db.query(CompanyModel).options(joinedload(CompanyModel.company_creator)).filter(CompanyModel.id == company_id).first()
-        
-        if not company:
-            return None
-        
-        created_by_user = company.company_creator
 
-        def format_datetime(dt: datetime) -> str:
-            return dt.strftime('%Y-%m-%d %H:%M:%S') if dt else None
-        
-        return CompanyDetailsSchema(
-            company_id = company.id,
-            company_name = company.company_name,
-            description = company.company_profile,
-            created_at = format_datetime(company.created_at),
-            updated_at = format_datetime(company.updated_at),
-            created_by_user={
-                "user_id": created_by_user.id,
-                "user_name": created_by_user.name,
-                "user_email": created_by_user.email
-            } 
-        )
+        company_details = await company_cache.get_or_load(f"company:{company_id}:details:{version}", (company_tag(company_id),), lambda: _load_company_details(company_id, db))
+        return company_details
     except Exception as e:
         print("Exception occurred:", str(e))
 
 
+async def _load_company_details(company_id: int, db: AsyncSession):
+    company = (await db.execute(select(CompanyModel).options(load_only(CompanyModel.id, CompanyModel.company_name, CompanyModel.company_profile, CompanyModel.created_at, CompanyModel.updated_at), joinedload(CompanyModel.company_creator).load_only(UserModel.id, UserModel.name, UserModel.email)).filter(CompanyModel.id == company_id))).scalars().first()
+
+    if not company:
+        return None
+
+    created_by_user = company.company_creator
+
+    def format_datetime(dt: datetime) -> str:
+        return dt.strftime('%Y-%m-%d %H:%M:%S') if dt else None
+
+    return CompanyDetailsSchema(
+        company_id = company.id,
+        company_name = company.company_name,
+        description = company.company_profile,
+        created_at = format_datetime(company.created_at),
+        updated_at = format_datetime(company.updated_at),
+        created_by_user={
+            "user_id": created_by_user.id,
+            "user_name": created_by_user.name,
+            "user_email": created_by_user.email
+        } 
+    ).model_dump()
+
+
 
     
 # get company information by company uuid
-def get_company_by_uuid(db: Session, uuid: str = Header(None)):
+async def get_company_by_uuid(db: AsyncSession, uuid: str = Header(None)):
     try:
-        company = db.query(CompanyModel).filter(CompanyModel.uuid == uuid).one()
-        company_profile_url = f"{BASE_URL}{company.company_profile}" if company.company_profile else None
-        company_images = [f"{BASE_URL}{img.image_path}" for img in company.images] if company.images else None
+        version = await _company_uuid_version(uuid, db)
+        if version is None:
+            return None
 
-        return CompanyResponseSchema(
-            id = company.id,
-            uuid = company.uuid,
-            company_name = company.company_name,
-            company_email = company.company_email,
-            company_number = company.company_number,
-            company_zipcode = company.company_zipcode,
-            company_city = company.company_city,
-            company_state = company.company_state,
-            company_country = company.company_country,
-            company_profile = company_profile_url,
-            company_images=company_images,
-            company_creator = company.company_creator
-        )
+        # the uuid view has no role check, so it is cached by uuid and the version of the rows it shows only
+        company = await company_cache.get_or_load(f"company-uuid:{uuid}:{version}", (company_uuid_tag(uuid),), lambda: _load_company_by_uuid(uuid, db))
+        return company
     except Exception as e:
         print("An exception occurred:", str(e))
+
+
+# version of the uuid view: the company and creator rows and the count / newest / rendered variants of its images;
+# None when no company has the uuid
+async def _company_uuid_version(uuid: str, db: AsyncSession):
+    image_count = select(func.count(CompanyImage.id)).where(CompanyImage.company_id == CompanyModel.id).scalar_subquery()
+    newest_image = select(func.max(CompanyImage.id)).where(CompanyImage.company_id == CompanyModel.id).scalar_subquery()
+    # the image pipeline fills in the variants without touching the company row
+    rendered_images = select(func.count(CompanyImage.variants)).where(CompanyImage.company_id == CompanyModel.id).scalar_subquery()
+    validators = (await db.execute(
+        select(CompanyModel.id, CompanyModel.updated_at, CompanyModel.row_version, UserModel.id, UserModel.row_version, image_count, newest_image, rendered_images)
+        .outerjoin(UserModel, CompanyModel.user_id == UserModel.id)
+        .filter(CompanyModel.uuid == uuid)
+    )).first()
+    if not validators:
+        return None
+    return build_validators("uuid", *validators)[0]
+
+
+async def _load_company_by_uuid(uuid: str, db: AsyncSession):
+    company = (await db.execute(select(CompanyModel).options(joinedload(CompanyModel.company_creator).load_only(UserModel.name, UserModel.email, UserModel.country), selectinload(CompanyModel.images).load_only(CompanyImage.image_path, CompanyImage.variants)).filter(CompanyModel.uuid == uuid))).scalar_one()
+    company_profile_url = f"{BASE_URL}{company.company_profile}" if company.company_profile else None
+    company_images = [f"{BASE_URL}{img.image_path}" for img in company.images] if company.images else None
+    company_image_variants = [variant_urls(img.variants, BASE_URL) for img in company.images] if company.images else None
+
+    return CompanyResponseSchema(
+        id = company.id,
+        uuid = company.uuid,
+        company_name = company.company_name,
+        company_email = company.company_email,
+        company_number = company.company_number,
+        company_zipcode = company.company_zipcode,
+        company_city = company.company_city,
+        company_state = company.company_state,
+        company_country = company.company_country,
+        company_profile = company_profile_url,
+        company_images=company_images,
+        company_image_variants = company_image_variants,
+        company_creator = company.company_creator
+    ).model_dump()
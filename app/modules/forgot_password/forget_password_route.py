@@ -1,5 +1,5 @@
 from fastapi import APIRouter, BackgroundTasks, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.modules.forgot_password import forget_password_service
 from app.schemas.response_schema import ResponseSchema
 from app.schemas.forget_password_schema import *
@@ -9,8 +9,8 @@ router = APIRouter(prefix="/api/forget_password", tags=["Forgot Password"])
 
 # send forgot password OTP
 @router.post("/otp/sent", summary = "Send forgot password OTP", response_model = ResponseSchema[SentOtpResponseSchema])
-def forgot_password(request: SentForgotPasswordOTPSchema, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    forget_pwd = forget_password_service.send_forgot_password_otp(email = request.email, background_tasks = background_tasks, db = db)
+async def forgot_password(request: SentForgotPasswordOTPSchema, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db)):
+    forget_pwd = await forget_password_service.send_forgot_password_otp(email = request.email, background_tasks = background_tasks, db = db)
     
     if forget_pwd == 1:
         return ResponseSchema(status = False, response = msg['invalid_email_format'], data = None)
@@ -23,8 +23,8 @@ def forgot_password(request: SentForgotPasswordOTPSchema, background_tasks: Back
 
 # verify the OTP
 @router.post("/otp/verify", summary = "Verify the OTP", response_model = ResponseSchema[VerifyOtpResponseSchema])
-def otp_verification(request: VerifyForgotPasswordOTPSchema, db: Session = Depends(get_db)):
-    otp_verify = forget_password_service.verify_otp(email = request.email, otp = request.otp, db = db)
+async def otp_verification(request: VerifyForgotPasswordOTPSchema, db: AsyncSession = Depends(get_db)):
+    otp_verify = await forget_password_service.verify_otp(email = request.email, otp = request.otp, db = db)
 
     if otp_verify == 1:
         return ResponseSchema(status = False, response = msg['invalid_email_format'], data = None)
@@ -39,8 +39,8 @@ def otp_verification(request: VerifyForgotPasswordOTPSchema, db: Session = Depen
 
 # change user password
 @router.post("/change_password", summary = "Change user password", response_model = ResponseSchema[ChangePasswordResponseSchema])
-def change_user_password(request: ChangePasswordSchema, db: Session = Depends(get_db)):
-    password_change = forget_password_service.change_password(email = request.email, otp = request.otp, new_password = request.new_password, confirm_password = request.confirm_password, db = db)
+async def change_user_password(request: ChangePasswordSchema, db: AsyncSession = Depends(get_db)):
+    password_change = await forget_password_service.change_password(email = request.email, otp = request.otp, new_password = request.new_password, confirm_password = request.confirm_password, db = db)
 
     if password_change == 1:
         return ResponseSchema(status = False, response = msg['invalid_email_format'], data = None)
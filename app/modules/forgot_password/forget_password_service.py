@@ -1,36 +1,31 @@
-from typing import Dict, Tuple
 from fastapi import BackgroundTasks
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.helper.email_sender import Helper
 from app.models.user_model import UserModel
-from app.hashing.password_hash import Hash
-from datetime import datetime, timedelta
+from app.hashing.password_hash import Hash, HashPoolBusyError
+from app.auth.auth_user import auth_user_cache
+from app.helper.otp_store import otp_store
 
 
-otp_storage: Dict[str, Tuple[str, datetime]] = {}
-
 # send forgot password OTP
-def send_forgot_password_otp(email: str, background_tasks: BackgroundTasks, db: Session):
+async def send_forgot_password_otp(email: str, background_tasks: BackgroundTasks, db: AsyncSession):
     try:
         if not Helper.is_valid_email(email):
             return 1
         
-        user = db.query(UserModel).filter(UserModel.email == email).first()
+        user = (await db.execute(select(UserModel.id).filter(UserModel.email == email))).first()
         if not user:
             return None
 
         otp = Helper.generate_otp()
 
-        # store OTP and expiration time in the dictionary 
-        expiration_time = datetime.now() + timedelta(minutes=10)
-        otp_storage[email] = (otp, expiration_time)
-
-        # nested function for sending email
-        def send_email_task():
-            Helper.send_email(email, otp)
+        # store OTP in the shared OTP store, it expires after OTP_TTL seconds
+        await otp_store.save(email, otp)
 
-        # email sending task to the background tasks
-        background_tasks.add_task(send_email_task)
+        # the mail is stored in the outbox and delivered by its send loop
+        await Helper.send_email(email, otp, db)
+        await db.commit()
 
         return {
             "message": "OTP sent to the email",
@@ -45,22 +40,13 @@ def send_forgot_password_otp(email: str, background_tasks: BackgroundTasks, db:
 
 
 # verify the OTP
-def verify_otp(email: str, otp: int, db: Session):
+async def verify_otp(email: str, otp: int, db: AsyncSession):
     try:
         if not Helper.is_valid_email(email):
             return 1
         
-        stored_data = otp_storage.get(email)
-
-        if stored_data is None:
-            return None  
-
-        stored_otp, expiration_time = stored_data
-
-        if datetime.now() > expiration_time:
-            return {"message":"OTP was expired"} 
-        
-        if str(otp) == str(stored_otp):
+        # expired OTPs are not returned by the store, the OTP stays valid for change_password
+        if await otp_store.check(email, otp):
             return {"message": "OTP is valid"}
        
     except Exception as e:
@@ -71,23 +57,15 @@ def verify_otp(email: str, otp: int, db: Session):
 
 
 # change user password
-def change_password(email: str, otp: int, new_password: str, confirm_password: str, db: Session):
+async def change_password(email: str, otp: int, new_password: str, confirm_password: str, db: AsyncSession):
     try:
         if not Helper.is_valid_email(email):
             return 1
         
-        stored_data = otp_storage.get(email)
-        if not stored_data:
+        if not await otp_store.check(email, otp):
             return {"message": "Invalid OTP"}
 
-        stored_otp, expiration_time = stored_data
-        if datetime.now() > expiration_time:
-            return {"message": "OTP has expired"}
-
-        if str(otp) != str(stored_otp):
-            return {"message": "OTP does not match"}
-
-        get_db_user = db.query(UserModel).filter(UserModel.email == email).first()
+        get_db_user = (await db.execute(select(UserModel).filter(UserModel.email == email))).scalars().first()
         
         if not get_db_user:
             return {"message": "User not found"}
@@ -95,13 +73,22 @@ def change_password(email: str, otp: int, new_password: str, confirm_password: s
         if new_password != confirm_password:
             return {"message": "new password and confirm password do not match"}
 
-        get_db_user.password = Hash.bcrypt(new_password)
-        db.commit()
+        # hash before the OTP is consumed, a busy hashing pool or a failed hash does not burn it
+        password = await Hash.bcrypt_async(new_password)
+
+        # consume the OTP only now, a request failing the checks above does not burn it; the OTP is removed in the
+        # transaction of the new password, so it stays valid if the commit fails
+        if not await otp_store.consume(email, otp, db = db):
+            return {"message": "Invalid OTP"}
 
-        del otp_storage[email] 
+        get_db_user.password = password
+        await db.commit()
+        auth_user_cache.invalidate(email)
 
         return {"message": "Password changed successfully"}
         
+    except HashPoolBusyError:
+        raise
     except Exception as e:
         print("Exception Occurred:", str(e))
         return None
@@ -1,6 +1,6 @@
 from typing import Optional
-from fastapi import APIRouter, Depends, Header
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, Header
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.modules.login import user_login_service
 from app.schemas.user_response_schema import UserInformationSchema
 from config.database import get_db, msg
@@ -12,8 +12,8 @@ router = APIRouter(prefix="/api/user", tags=["Login"])
 
 # User login
 @router.post('/login', summary = "User login", response_model = ResponseSchema[LoginResponseSchema])
-def login_user(login_data: LoginSchema, db: Session = Depends(get_db)):
-    logged_user = user_login_service.login_user(email = login_data.email, password = login_data.password, db = db)
+async def login_user(login_data: LoginSchema, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db)):
+    logged_user = await user_login_service.login_user(email = login_data.email, password = login_data.password, db = db, background_tasks = background_tasks)
     
     if logged_user == 1:
         return ResponseSchema(status = False, response = msg['invalid_email_format'], data = None)
@@ -26,8 +26,8 @@ def login_user(login_data: LoginSchema, db: Session = Depends(get_db)):
 
 # Get user information by access token
 @router.get("/info", summary = "Get User Information by Access Token", response_model = ResponseSchema[UserInformationSchema])
-def get_user_info(token: Optional[str] = Header(None), db: Session = Depends(get_db)):
-    user_info = user_login_service.userinfo_by_token(token = token, db = db)
+async def get_user_info(token: Optional[str] = Header(None), db: AsyncSession = Depends(get_db)):
+    user_info = await user_login_service.userinfo_by_token(token = token, db = db)
     
     if user_info == 1:
         return ResponseSchema(status = False, response = msg['access_token_not_found'], data = None)
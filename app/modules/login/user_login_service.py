@@ -1,5 +1,7 @@
-from sqlalchemy.orm import Session
-from app.hashing.password_hash import Hash
+from fastapi import BackgroundTasks
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.hashing.password_hash import Hash, HashPoolBusyError
 from app.auth.jwt_handler import create_access_token, decode_jwt_token
 from app.models.company_model import CompanyModel
 from app.models.roles_model import Role
@@ -8,23 +10,45 @@ from app.models.user_model import UserModel
 from app.modules.company.company_service import BASE_URL
 from app.schemas.user_response_schema import CompanyDetailSchema
 from app.helper.email_sender import Helper
+from config.database import SessionLocal
+
+
+# rehash a password stored with an outdated scheme or cost, runs after the login response is sent
+async def upgrade_password_hash(user_id: int, old_hash: str, plain_password: str):
+    try:
+        new_hash = await Hash.bcrypt_async(plain_password)
+        async with SessionLocal() as db:
+            # only replace the verified hash so a concurrent password change wins, updated_at and row_version are kept
+            # as they are (the hash is not part of any view)
+            await db.execute(
+                update(UserModel)
+                .where(UserModel.id == user_id, UserModel.password == old_hash)
+                .values(password = new_hash, updated_at = UserModel.updated_at, row_version = UserModel.row_version)
+            )
+            await db.commit()
+    except Exception as e:
+        print("Password hash upgrade failed:", str(e))
+
 
 
 # user login
-def login_user(email: str, password: str, db: Session):
+async def login_user(email: str, password: str, db: AsyncSession, background_tasks: BackgroundTasks = None):
     try:
         if not Helper.is_valid_email(email):
             return 1
         
-        user = db.query(UserModel).filter(UserModel.email == email).first()
+        # user credentials and role name in a single query
+        user = (await db.execute(
+            select(UserModel.id, UserModel.name, UserModel.email, UserModel.password, Role.role_name)
+            .join(Role, Role.id == UserModel.role_id)
+            .filter(UserModel.email == email)
+        )).first()
 
-        if not user or not Hash.verify(user.password, password):
-            return None
-        
-        # return the role of user
-        role = db.query(Role).filter(Role.id == user.role_id).first()
-        if not role:
+        if not user or not await Hash.verify_async(user.password, password):
             return None
+
+        if background_tasks is not None and Hash.needs_update(user.password):
+            background_tasks.add_task(upgrade_password_hash, user.id, user.password, password)
         
         access_token = create_access_token(data={"sub": user.email})
 
@@ -32,16 +56,18 @@ def login_user(email: str, password: str, db: Session):
             "name": user.name,
             "email": user.email,
             "access_token": access_token,
-            "role": role.role_name
+            "role": user.role_name
         }
     
+    except HashPoolBusyError:
+        raise
     except Exception as e:
         print("An exception occurred:", str(e))
 
 
 
 # get user information by access token
-def userinfo_by_token(token: str, db: Session):
+async def userinfo_by_token(token: str, db: AsyncSession):
     try:
         if not token:
             return 1  # token was not found
@@ -51,27 +77,27 @@ def userinfo_by_token(token: str, db: Session):
         if email is None:
             return None
 
-        user = db.query(UserModel).filter(UserModel.email == email).first()
+        # user, role and first associated company in a single query
+        user = (await db.execute(
+            select(UserModel.id, UserModel.name, UserModel.email, UserModel.role_id, Role.role_name, UserModel.city, UserModel.state, UserModel.country, UserModel.profile_img, CompanyModel.id.label("company_id"), CompanyModel.company_name, CompanyModel.company_email)
+            .join(Role, Role.id == UserModel.role_id)
+            .outerjoin(UserCompany, UserCompany.user_id == UserModel.id)
+            .outerjoin(CompanyModel, CompanyModel.id == UserCompany.company_id)
+            .filter(UserModel.email == email)
+            .limit(1)
+        )).first()
         
         if not user:
             return None
 
-        role = db.query(Role).filter(Role.id == user.role_id).first()
-        if not role:
-            return None
-
-        user_company = db.query(UserCompany).filter(UserCompany.user_id == user.id).first()
-        
         company_details = None
 
-        if user_company:
-            company = db.query(CompanyModel).filter(CompanyModel.id == user_company.company_id).first()
-            if company:
-                company_details = CompanyDetailSchema(
-                    company_id = company.id,
-                    company_name = company.company_name,
-                    company_email = company.company_email
-                )
+        if user.company_id:
+            company_details = CompanyDetailSchema(
+                company_id = user.company_id,
+                company_name = user.company_name,
+                company_email = user.company_email
+            )
 
         profile_img_url = f"{BASE_URL}{user.profile_img}" if user.profile_img else None
         
@@ -80,7 +106,7 @@ def userinfo_by_token(token: str, db: Session):
             "name": user.name,
             "email": user.email,
             "role_id": user.role_id,
-            "role_name": role.role_name,
+            "role_name": user.role_name,
             "city": user.city,
             "state": user.state,
             "country": user.country,
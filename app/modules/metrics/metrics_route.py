@@ -0,0 +1,77 @@
+from fastapi import APIRouter, Depends, Request
+from app.auth.jwt_bearer import JWTBearer
+from app.schemas.response_schema import ResponseSchema
+from sqlalchemy.ext.asyncio import AsyncSession
+from config.database import engine, get_db, msg
+from config.pool_metrics import pool_status
+from app.auth.auth_user import auth_user_cache
+from app.helper.email_sender import Helper
+from app.hashing.password_hash import hash_pool
+from app.helper.email_outbox import email_outbox
+from app.helper.rate_limiter import rate_limiter
+from app.helper.response_cache import company_cache
+
+router = APIRouter(prefix="/api/metrics", tags=["Metrics"])
+
+
+# the metrics expose internals of the workers, only a superadmin may read them
+async def is_superadmin(request: Request, db: AsyncSession):
+    user = await Helper.getAuthUser(request, db)
+    return user is not None and user.role_id == 1
+
+
+def not_authorized():
+    return ResponseSchema(status = False, response = msg["metrics_not_authorized"], data = None)
+
+
+# database connection pool metrics of this worker
+@router.get("/db", summary = "Database connection pool metrics", response_model = ResponseSchema[dict], dependencies = [Depends(JWTBearer())])
+async def database_pool_metrics(request: Request, db: AsyncSession = Depends(get_db)):
+    if not await is_superadmin(request, db):
+        return not_authorized()
+    return ResponseSchema(status = True, response = msg["pool_metrics"], data = pool_status(engine))
+
+
+
+# authenticated user cache metrics of this worker
+@router.get("/auth-cache", summary = "Authenticated user cache metrics", response_model = ResponseSchema[dict], dependencies = [Depends(JWTBearer())])
+async def auth_cache_metrics(request: Request, db: AsyncSession = Depends(get_db)):
+    if not await is_superadmin(request, db):
+        return not_authorized()
+    return ResponseSchema(status = True, response = msg["auth_cache_metrics"], data = auth_user_cache.stats())
+
+
+
+# password hashing pool metrics of this worker
+@router.get("/hash-pool", summary = "Password hashing pool metrics", response_model = ResponseSchema[dict], dependencies = [Depends(JWTBearer())])
+async def hash_pool_metrics(request: Request, db: AsyncSession = Depends(get_db)):
+    if not await is_superadmin(request, db):
+        return not_authorized()
+    return ResponseSchema(status = True, response = msg["hash_pool_metrics"], data = hash_pool.stats())
+
+
+
+# email outbox queue depth and send latency
+@router.get("/email-outbox", summary = "Email outbox metrics", response_model = ResponseSchema[dict], dependencies = [Depends(JWTBearer())])
+async def email_outbox_metrics(request: Request, db: AsyncSession = Depends(get_db)):
+    if not await is_superadmin(request, db):
+        return not_authorized()
+    return ResponseSchema(status = True, response = msg["email_outbox_metrics"], data = await email_outbox.stats(db))
+
+
+
+# login / OTP rate limit counters of this worker
+@router.get("/rate-limit", summary = "Rate limit metrics", response_model = ResponseSchema[dict], dependencies = [Depends(JWTBearer())])
+async def rate_limit_metrics(request: Request, db: AsyncSession = Depends(get_db)):
+    if not await is_superadmin(request, db):
+        return not_authorized()
+    return ResponseSchema(status = True, response = msg["rate_limit_metrics"], data = rate_limiter.stats())
+
+
+
+# company response cache hit rate of this worker
+@router.get("/company-cache", summary = "Company response cache metrics", response_model = ResponseSchema[dict], dependencies = [Depends(JWTBearer())])
+async def company_cache_metrics(request: Request, db: AsyncSession = Depends(get_db)):
+    if not await is_superadmin(request, db):
+        return not_authorized()
+    return ResponseSchema(status = True, response = msg["company_cache_metrics"], data = company_cache.stats())
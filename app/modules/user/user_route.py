@@ -1,6 +1,6 @@
-from fastapi import APIRouter, BackgroundTasks, Depends, File, UploadFile, Form
-from typing import List, Optional
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, File, Request, UploadFile, Form
+from typing import List, Literal, Optional, Union
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi_pagination import Params
 from app.modules.user import user_service
 from config.database import get_db, msg
@@ -8,17 +8,30 @@ from app.schemas.response_schema import ResponseSchema
 from app.auth.jwt_bearer import JWTBearer
 from app.schemas.user_update_schema import UserUpdateSchema
 from app.schemas.user_response_schema import UserResponseSchema
+from app.schemas.user_import_schema import UserImportSchema
+from app.schemas.cursor_page_schema import CursorPageSchema
+from app.helper.conditional_get import is_not_modified, not_modified_response, set_validators
+from app.helper.fast_json import EnvelopeSerializer
 
 router = APIRouter(prefix="/api/user", tags=["User"])  
 
+# envelopes of the read (and delete / update) routes, rendered straight to JSON without FastAPI's second pass over the body
+user_envelope = EnvelopeSerializer(UserResponseSchema)
+user_list_envelope = EnvelopeSerializer(List[UserResponseSchema])
+user_cursor_page_envelope = EnvelopeSerializer(CursorPageSchema[UserResponseSchema])
+
 
 # New user register
 @router.post('/register', summary = "Register new users", response_model = ResponseSchema[UserResponseSchema])
-async def register_user(background_tasks: BackgroundTasks, name: str = Form(...), email: str = Form(...), password: str = Form(...), role_id: int = Form(...), city: str = Form(None), state: str = Form(None), country: str = Form(None), profile_img: Optional[UploadFile] = File(None), db: Session = Depends(get_db)):
+async def register_user(background_tasks: BackgroundTasks, name: str = Form(...), email: str = Form(...), password: str = Form(...), role_id: int = Form(...), city: str = Form(None), state: str = Form(None), country: str = Form(None), profile_img: Optional[UploadFile] = File(None), db: AsyncSession = Depends(get_db)):
 
     new_user = await user_service.create_user(name = name, email = email, password = password, role_id = role_id, city = city, state = state, country = country, profile_img = profile_img, background_tasks = background_tasks, db = db)
     if new_user == 1:
         return ResponseSchema(status = False, response = msg['invalid_email_format'], data = None)
+    if new_user == 2:
+        return ResponseSchema(status = False, response = msg['file_too_large'], data = None)
+    if new_user == 3:
+        return ResponseSchema(status = False, response = msg['invalid_image'], data = None)
     if new_user:
         return ResponseSchema(status = True, response = msg['user_register'], data = new_user)
     else:
@@ -26,12 +39,37 @@ async def register_user(background_tasks: BackgroundTasks, name: str = Form(...)
 
 
 
-# Get all user information
-@router.get( "/list", summary = "List of users", response_model = ResponseSchema[List[UserResponseSchema]], dependencies =[Depends(JWTBearer())])
-def list_users( params: Params = Depends(), db: Session = Depends(get_db), search_string: Optional[str] = None, sort_by: Optional[str] = None, sort_direction: Optional[str] = None):
-    all_users = user_service.get_all_users(db = db, params = params, search_string = search_string, sort_by = sort_by, sort_direction = sort_direction)
+# Import users in bulk from a csv or ndjson file, optionally adding them to a company; reports the outcome of every row
+@router.post('/import', summary = "Import users from a csv / ndjson file", response_model = ResponseSchema[UserImportSchema], dependencies = [Depends(JWTBearer())])
+async def import_users(request: Request, users_file: UploadFile = File(...), company_id: Optional[int] = Form(None), default_role_id: Optional[int] = Form(None), file_format: Optional[Literal["csv", "ndjson"]] = Form(None), db: AsyncSession = Depends(get_db)):
+    result = await user_service.import_users(users_file = users_file, request = request, db = db, company_id = company_id, default_role_id = default_role_id, file_format = file_format)
+    if result == 1:
+        return ResponseSchema(status = False, response = msg['import_not_authorized'], data = None)
+    if result == 2:
+        return ResponseSchema(status = False, response = msg['company_not_found'], data = None)
+    if result == 3:
+        return ResponseSchema(status = False, response = msg['import_invalid_format'], data = None)
+    if result == 4:
+        return ResponseSchema(status = False, response = msg['import_company_not_allowed'], data = None)
+    if result:
+        return ResponseSchema(status = True, response = msg['user_import'], data = result)
+    else:
+        return ResponseSchema(status = False, response = msg['user_import_failed'], data = None)
+
+
+
+# Get all user information (pass cursor_mode=true or a cursor for keyset pagination, the response then carries next_cursor)
+@router.get( "/list", summary = "List of users", response_model = ResponseSchema[Union[List[UserResponseSchema], CursorPageSchema[UserResponseSchema]]], dependencies =[Depends(JWTBearer())])
+async def list_users( params: Params = Depends(), db: AsyncSession = Depends(get_db), search_string: Optional[str] = None, sort_by: Optional[str] = None, sort_direction: Optional[str] = None, cursor: Optional[str] = None, cursor_mode: bool = False, with_total: bool = False, search_mode: Literal["contains", "prefix", "fulltext"] = "contains"):
+    all_users = await user_service.get_all_users(db = db, params = params, search_string = search_string, sort_by = sort_by, sort_direction = sort_direction, cursor = cursor, cursor_mode = cursor_mode, with_total = with_total, search_mode = search_mode)
+    if all_users == 1:
+        return ResponseSchema(status = False, response = msg['invalid_cursor'], data = None)
+    if all_users == 2:
+        return ResponseSchema(status = False, response = msg['invalid_sort'], data = None)
+    if all_users and (cursor_mode or cursor):
+        return user_cursor_page_envelope(True, msg['user_list_found'], all_users)
     if all_users:
-        return ResponseSchema(status = True, response = msg['user_list_found'], data = all_users.items)
+        return user_list_envelope(True, msg['user_list_found'], all_users.items)
     else:
         return ResponseSchema(status = False, response = msg['user_list_not_found'], data = None)
 
@@ -40,10 +78,18 @@ def list_users( params: Params = Depends(), db: Session = Depends(get_db), searc
 # Get user information by id
 @router.get('/{id}', summary = "Get user",  response_model = ResponseSchema[UserResponseSchema], dependencies = [Depends(JWTBearer())])
 
-def get_user(id: int, db: Session = Depends(get_db)):
-    user = user_service.show_user(id = id, db = db)
+async def get_user(id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    # polling clients revalidate with If-None-Match / If-Modified-Since and get a bodyless 304 while unchanged
+    validators = await user_service.get_user_validators(id = id, db = db)
+    if validators and is_not_modified(request, *validators):
+        return not_modified_response(*validators)
+
+    user = await user_service.show_user(id = id, db = db)
     if user is not None:
-        return ResponseSchema(status = True, response = msg['get_user_by_id'], data = user)
+        response = user_envelope(True, msg['get_user_by_id'], user)
+        if validators:
+            set_validators(response, *validators)
+        return response
     else:
         return ResponseSchema(status = False, response = msg['get_user_by_id_not_found'], data = None)
 
@@ -52,10 +98,10 @@ def get_user(id: int, db: Session = Depends(get_db)):
 # Delete user by id
 @router.delete('/delete/{id}', summary = "Delete user", response_model = ResponseSchema[UserResponseSchema], dependencies = [Depends(JWTBearer())])
 
-def delete_user(id: int, db: Session = Depends(get_db)):
-    delete_user = user_service.delete_user_info(id = id, db = db)
+async def delete_user(id: int, db: AsyncSession = Depends(get_db)):
+    delete_user = await user_service.delete_user_info(id = id, db = db)
     if delete_user is not None: 
-        return ResponseSchema(status = True, response = msg['delete_user_by_id'], data = delete_user.__dict__)
+        return user_envelope(True, msg['delete_user_by_id'], delete_user)
     else:
         return ResponseSchema(status = False, response = msg['delete_user_by_id_not_found'], data = None)
 
@@ -64,10 +110,10 @@ def delete_user(id: int, db: Session = Depends(get_db)):
 # Update current logged user
 @router.put('/update/loggeduser', summary = "Update current logged user",  response_model = ResponseSchema[UserResponseSchema], dependencies = [Depends(JWTBearer())])
 
-def update_user_info(user_update_data: UserUpdateSchema, token: str = Depends(JWTBearer()), db: Session = Depends(get_db)):
-    update_user = user_service.update_user_info(user_update_data = user_update_data, token = token, db = db)
+async def update_user_info(user_update_data: UserUpdateSchema, request: Request, db: AsyncSession = Depends(get_db)):
+    update_user = await user_service.update_user_info(user_update_data = user_update_data, request = request, db = db)
     if update_user:
-        return ResponseSchema(status = True, response = msg['update_current_logged_user'], data = update_user.__dict__)
+        return user_envelope(True, msg['update_current_logged_user'], update_user)
     else:
         return ResponseSchema(status = False, response = msg['update_current_logged_user_error'], data = None)
 
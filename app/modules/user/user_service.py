@@ -1,21 +1,34 @@
+import asyncio
 from datetime import datetime
-import pathlib
-from fastapi import BackgroundTasks, HTTPException, UploadFile, status
-from sqlalchemy.orm import Session, load_only, joinedload
-from sqlalchemy import or_
+import re
+from fastapi import BackgroundTasks, HTTPException, Request, UploadFile, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only, selectinload
+from sqlalchemy import func, insert, or_, select
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.dialects.mysql import match
 from fastapi_pagination import Params
 from app.models.roles_model import Role
 from app.models.user_model import UserModel
 from app.models.company_model import CompanyModel
-from app.schemas.user_response_schema import UserResponseSchema
+from app.models.user_company_model import UserCompany
 from app.schemas.user_update_schema import UserUpdateSchema
-from app.hashing.password_hash import Hash
-from app.auth.jwt_handler import decode_jwt_token
+from app.hashing.password_hash import Hash, HashPoolBusyError, hash_pool
 from fastapi_pagination.ext.sqlalchemy import paginate
 from typing import Optional
 import os
 from dotenv import load_dotenv
 from app.helper.email_sender import Helper
+from app.helper.cursor_pagination import InvalidCursorError, paginate_by_cursor
+from app.helper.list_sorting import InvalidSortError, order_by_sort, resolve_sort
+from app.auth.auth_user import auth_user_cache
+from app.helper.image_pipeline import image_pipeline, variant_paths, variant_urls
+from app.helper.file_upload import InvalidImageError, UploadTooLargeError, discard_temp_upload, save_image_upload_to_temp
+from app.helper.user_import import IMPORT_FORMATS, detect_import_format, import_records, read_import_batch
+from app.helper.response_cache import invalidate_company
+from app.helper.conditional_get import build_validators
+from app.helper.list_rows import UserCompanyRow, UserListRow
+from app.storage.blob_store import blob_store
 
 
 load_dotenv()
@@ -23,48 +36,58 @@ BASE_URL = os.getenv("BASE_URL")
 
 
 # New user register
-async def create_user(name: str, email: str, password: str, role_id: int, city: str, state: str, country: str, profile_img: Optional[UploadFile], background_tasks: BackgroundTasks, db: Session):
+async def create_user(name: str, email: str, password: str, role_id: int, city: str, state: str, country: str, profile_img: Optional[UploadFile], background_tasks: BackgroundTasks, db: AsyncSession):
     try:
         if not Helper.is_valid_email(email):
             return 1
         
-        role = db.query(Role).filter(Role.id == role_id).first()
+        role = (await db.execute(select(Role.id).filter(Role.id == role_id))).first()
         if not role:
             return None
         
-        existing_user = db.query(UserModel).filter(UserModel.email == email).first()
+        existing_user = (await db.execute(select(UserModel.id).filter(UserModel.email == email))).first()
         if existing_user:
             return None
 
-        new_user = UserModel( 
-            name = name,
-            email = email,
-            password = Hash.bcrypt(password),
-            role_id = role_id,
-            city = city,
-            state = state,
-            country = country,
-            # profile_img = profile_img_path,
-            created_at = datetime.now()
-        )
-        db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
-
-        profile_img_path = None
-        if profile_img:
-            filename = profile_img.filename
-            timestamp = int(datetime.now().timestamp())
-            file_extension = pathlib.Path(filename).suffix
-
-            profile_img_path = f"uploads/user/{new_user.id}_{timestamp}{file_extension}"
-            contents = await profile_img.read()
-
-            with open(profile_img_path, "wb") as f:
-                f.write(contents)
-            
-            new_user.profile_img = profile_img_path
-            db.commit()
+        # stream the image to a temp file before anything is stored, so an oversized upload or one that is not an image
+        # creates no user; the extension comes from the image header, never the client's filename
+        temp_img_path = None
+        if profile_img and profile_img.filename:
+            try:
+                temp_img_path, file_extension = await save_image_upload_to_temp(profile_img)
+            except UploadTooLargeError:
+                return 2
+            except InvalidImageError:
+                return 3
+
+        try:
+            new_user = UserModel( 
+                name = name,
+                email = email,
+                password = await Hash.bcrypt_async(password),
+                role_id = role_id,
+                city = city,
+                state = state,
+                country = country,
+                created_at = datetime.now()
+            )
+            db.add(new_user)
+            await db.flush()
+
+            profile_img_path = None
+            if temp_img_path:
+                # content addressed, an image already stored for another user is only referenced again
+                profile_img_path = await blob_store.store(db, temp_img_path, file_extension)
+                new_user.profile_img = profile_img_path
+
+            await db.commit()
+        finally:
+            if temp_img_path:
+                discard_temp_upload(temp_img_path)
+
+        # thumbnails / webp variants are rendered after the response is sent
+        if profile_img_path:
+            background_tasks.add_task(image_pipeline.process_user_image, new_user.id, profile_img_path)
 
         user_profile_url = f"{BASE_URL}{profile_img_path}" if profile_img_path else None
 
@@ -78,55 +101,338 @@ async def create_user(name: str, email: str, password: str, role_id: int, city:
             "profile_img": user_profile_url,
             "companies": []  
         }
+    except HashPoolBusyError:
+        raise
+    except Exception as e:
+        print("Exception occurred", str(e))
+
+
+
+# import users from an uploaded csv / ndjson file (columns name, email, password, role_id, city, state, country),
+# batch by batch: one IN query for the existing emails, passwords hashed in parallel, one insert per batch;
+# each batch is committed on its own, so a rerun of a partly imported file only reports the existing users;
+# rows the saturated hashing pool turns away, and every row after their batch, are reported as retryable instead;
+# a companyadmin only imports into a company it created or belongs to, and rows cannot ask for a role above its own
+async def import_users(users_file: UploadFile, request: Request, db: AsyncSession, company_id: Optional[int] = None, default_role_id: Optional[int] = None, file_format: Optional[str] = None):
+    try:
+        user = await Helper.getAuthUser(request, db)
+        if not user or user.role_id not in (1, 2):
+            return 1  # Not authorized
+
+        if company_id is not None:
+            company = (await db.execute(select(CompanyModel.id, CompanyModel.user_id).filter(CompanyModel.id == company_id))).first()
+            if not company:
+                return 2  # Company not found
+            if user.role_id != 1 and company.user_id != user.id:
+                member = (await db.execute(select(UserCompany.id).filter_by(user_id = user.id, company_id = company_id))).first()
+                if not member:
+                    return 4  # Not allowed to import into this company
+
+        file_format = file_format or detect_import_format(users_file.filename, users_file.content_type)
+        if file_format not in IMPORT_FORMATS:
+            return 3  # Unsupported file format
+
+        role_ids = set((await db.execute(select(Role.id))).scalars().all())
+        records = import_records(users_file.file, file_format)
+        seen_emails = set()
+        results = []
+        pool_busy = False
+
+        while True:
+            batch = await read_import_batch(records)
+            if not batch:
+                break
+            if pool_busy:
+                # the earlier batches stay committed, the rest of the file is left for a retry instead of adding to the load
+                results.extend({"row": row_number, "email": _import_value(record, "email") if record else None, "status": "retryable", "user_id": None} for row_number, record in batch)
+                continue
+            batch_results = await _import_user_batch(batch, role_ids, default_role_id, user.role_id, seen_emails, company_id, db)
+            pool_busy = any(row["status"] == "retryable" for row in batch_results)
+            results.extend(batch_results)
+
+        created = sum(1 for row in results if row["status"] == "created")
+        retryable = sum(1 for row in results if row["status"] == "retryable")
+        return {
+            "total": len(results),
+            "created": created,
+            "skipped": len(results) - created - retryable,
+            "retryable": retryable,
+            "company_id": company_id,
+            "rows": results
+        }
     except Exception as e:
         print("Exception occurred", str(e))
 
 
+# VARCHAR limits of the imported columns, checked per row so one long value cannot fail the insert of its batch
+IMPORT_COLUMN_LENGTHS = {column: UserModel.__table__.c[column].type.length for column in ("name", "email", "city", "state", "country")}
+
+
+def _import_value(record: dict, key: str):
+    value = record.get(key)
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+async def _import_user_batch(batch: list, role_ids: set, default_role_id: Optional[int], importer_role_id: int, seen_emails: set, company_id: Optional[int], db: AsyncSession):
+    results = []
+    candidates = []
+
+    for row_number, record in batch:
+        result = {"row": row_number, "email": None, "status": None, "user_id": None}
+        results.append(result)
+        if record is None:
+            result["status"] = "invalid_row"
+            continue
+
+        email = _import_value(record, "email")
+        password = record.get("password")
+        result["email"] = email
+        try:
+            role_id = int(_import_value(record, "role_id") or default_role_id)
+        except (TypeError, ValueError):
+            role_id = None
+
+        if not email or not password:
+            result["status"] = "missing_field"
+        elif not Helper.is_valid_email(email):
+            result["status"] = "invalid_email"
+        elif email.lower() in seen_emails:
+            result["status"] = "duplicate"
+        elif role_id not in role_ids:
+            result["status"] = "invalid_role"
+        elif role_id < importer_role_id:
+            # role ids grow downwards in privilege (1 superadmin, 2 companyadmin, 3 user)
+            result["status"] = "role_not_allowed"
+        else:
+            values = {
+                "name": _import_value(record, "name"),
+                "email": email,
+                "password": str(password),
+                "role_id": role_id,
+                "city": _import_value(record, "city"),
+                "state": _import_value(record, "state"),
+                "country": _import_value(record, "country")
+            }
+            if any(values[column] is not None and len(values[column]) > length for column, length in IMPORT_COLUMN_LENGTHS.items()):
+                result["status"] = "too_long"
+                continue
+            seen_emails.add(email.lower())
+            candidates.append((result, values))
+
+    candidates = await _skip_existing_users(candidates, db)
+
+    # bounded to the pool's workers so an import never fills the queue that login / register requests wait in
+    limit = asyncio.Semaphore(hash_pool.max_workers)
+
+    async def hash_password(values: dict):
+        async with limit:
+            values["password"] = await Hash.bcrypt_async(values["password"])
+
+    hashed = await asyncio.gather(*(hash_password(values) for _, values in candidates), return_exceptions = True)
+    for error in hashed:
+        if error is not None and not isinstance(error, HashPoolBusyError):
+            raise error
+
+    # rows turned away by the saturated hashing pool are not inserted, the others of the batch still are
+    for (result, _), error in zip(candidates, hashed):
+        if error is not None:
+            result["status"] = "retryable"
+    candidates = [candidate for candidate, error in zip(candidates, hashed) if error is None]
+
+    try:
+        await _insert_imported_users(candidates, company_id, db)
+    except DBAPIError as e:
+        await db.rollback()
+        if isinstance(e, IntegrityError):
+            # some of the emails were registered meanwhile
+            candidates = await _skip_existing_users(candidates, db)
+        # row by row, so a value the database rejects fails its own row only and the report still covers the batch
+        for candidate in candidates:
+            try:
+                await _insert_imported_users([candidate], company_id, db)
+            except DBAPIError as e:
+                await db.rollback()
+                print("User import row failed:", str(e))
+                candidate[0]["status"] = "failed"
+    return results
+
+
+async def _skip_existing_users(candidates: list, db: AsyncSession):
+    if not candidates:
+        return candidates
+    existing = (await db.execute(select(UserModel.email).filter(UserModel.email.in_([values["email"] for _, values in candidates])))).scalars().all()
+    existing = {email.lower() for email in existing}
+
+    remaining = []
+    for result, values in candidates:
+        if values["email"].lower() in existing:
+            result["status"] = "exists"
+        else:
+            remaining.append((result, values))
+    return remaining
+
+
+async def _insert_imported_users(candidates: list, company_id: Optional[int], db: AsyncSession):
+    if not candidates:
+        return
+    created_at = datetime.now()
+    await db.execute(insert(UserModel), [dict(values, created_at = created_at) for _, values in candidates])
+
+    # executemany returns no ids, read them back by email
+    emails = [values["email"] for _, values in candidates]
+    user_ids = {email.lower(): user_id for user_id, email in (await db.execute(select(UserModel.id, UserModel.email).filter(UserModel.email.in_(emails)))).all()}
+
+    if company_id is not None:
+        await db.execute(insert(UserCompany), [{"user_id": user_ids[email.lower()], "company_id": company_id} for email in emails])
+    await db.commit()
+    if company_id is not None:
+        await invalidate_company(company_id)
+
+    for result, values in candidates:
+        result["status"] = "created"
+        result["user_id"] = user_ids[values["email"].lower()]
+
+
+
+# sort keys accepted by the user list, each backed by a (column, id) index
+USER_SORT_COLUMNS = {
+    "id": UserModel.id,
+    "name": UserModel.name,
+    "email": UserModel.email,
+    "country": UserModel.country,
+    "created_at": UserModel.created_at
+}
+
+# shortest word indexed by the MySQL FULLTEXT parser (innodb_ft_min_token_size)
+FULLTEXT_MIN_TOKEN_SIZE = int(os.getenv("FULLTEXT_MIN_TOKEN_SIZE", 3))
+
+
+# user search condition for the given search mode
+def user_search_filter(search_string: str, search_mode: str = "contains"):
+    if search_mode == "fulltext":
+        # every word must match as a word prefix, words below the indexed token size cannot be matched
+        terms = [term for term in re.findall(r"\w+", search_string) if len(term) >= FULLTEXT_MIN_TOKEN_SIZE]
+        if terms:
+            boolean_query = " ".join(f"+{term}*" for term in terms)
+            return match(UserModel.name, UserModel.email, against = boolean_query).in_boolean_mode()
+        search_mode = "prefix"
+
+    if search_mode == "prefix":
+        # constant 'term%' pattern so MySQL can range scan the name and email indexes
+        pattern = re.sub(r"([\\%_])", r"\\\1", search_string) + "%"
+        return or_(
+            UserModel.name.like(pattern, escape = "\\"),
+            UserModel.email.like(pattern, escape = "\\")
+        )
+
+    # substring search, scans the whole table
+    return or_(
+        UserModel.name.like('%' + search_string + '%'),
+        UserModel.email.like('%' + search_string + '%')
+    )
+
+
 
 # Get all user information
-def get_all_users(db: Session, params: Params, search_string: str, sort_by: Optional[str] = None, sort_direction: Optional[str] = None):
+async def get_all_users(db: AsyncSession, params: Params, search_string: str, sort_by: Optional[str] = None, sort_direction: Optional[str] = None, cursor: Optional[str] = None, cursor_mode: bool = False, with_total: bool = False, search_mode: str = "contains"):
     try:
-        all_user = db.query(UserModel).options(load_only(UserModel.email, UserModel.name, UserModel.city, UserModel.country, UserModel.state), joinedload(UserModel.companies).load_only(CompanyModel.id, CompanyModel.company_name, CompanyModel.company_email, CompanyModel.company_country))
+        # plain rows of the listed columns, the companies of the whole page follow in one more query
+        all_user = select(UserModel.id, UserModel.name, UserModel.email, UserModel.city, UserModel.state, UserModel.country, UserModel.profile_img, UserModel.profile_img_variants)
 
-        if sort_by and sort_direction:
-            if sort_direction == "desc":
-                all_user = all_user.order_by(getattr(UserModel, sort_by).desc())
-            elif sort_direction == "asc":
-                all_user = all_user.order_by(getattr(UserModel, sort_by).asc())
+        sort_by, sort_direction = resolve_sort(USER_SORT_COLUMNS, sort_by, sort_direction)
+        all_user = order_by_sort(all_user, USER_SORT_COLUMNS, UserModel.id, sort_by, sort_direction)
 
         if search_string:
-            all_user = all_user.filter(or_(
-                UserModel.name.like('%' + search_string + '%'),
-                UserModel.email.like('%' + search_string + '%')
-            ))
-
-        paginated_users = paginate(all_user, params=params)
-        
-        for user in paginated_users.items:
-            if user.profile_img:
-                user.profile_img = f"{BASE_URL}{user.profile_img}"
+            all_user = all_user.filter(user_search_filter(search_string, search_mode))
+
+        # keyset pagination over (sort column, id), deep pages cost the same as the first one
+        if cursor_mode or cursor:
+            paginated_users = await paginate_by_cursor(db, all_user, UserModel, size = params.size, sort_key = sort_by, direction = sort_direction, cursor = cursor, with_total = with_total)
+            paginated_users["items"] = await _user_list_rows(paginated_users["items"], db)
+        else:
+            paginated_users = await paginate(db, all_user, params=params, unique = False)
+            paginated_users.items = await _user_list_rows(paginated_users.items, db)
         
         return paginated_users
 
+    except InvalidCursorError as e:
+        print("Invalid cursor:", str(e))
+        return 1
+    except InvalidSortError as e:
+        print("Invalid sort:", str(e))
+        return 2
     except Exception as e:
         print("Exception occurred:", str(e))
         return None
 
 
+# the companies created by every user of the page come from one query, grouped here by user
+async def _user_list_rows(rows, db: AsyncSession):
+    companies = {}
+    if rows:
+        user_companies = (await db.execute(select(CompanyModel.user_id, CompanyModel.company_name, CompanyModel.company_email, CompanyModel.company_country).filter(CompanyModel.user_id.in_([row.id for row in rows])).order_by(CompanyModel.id))).all()
+        for company in user_companies:
+            companies.setdefault(company.user_id, []).append(UserCompanyRow(company.company_name, company.company_email, company.company_country))
+
+    return [UserListRow(
+        id = row.id,
+        name = row.name,
+        email = row.email,
+        city = row.city,
+        state = row.state,
+        country = row.country,
+        profile_img = f"{BASE_URL}{row.profile_img}" if row.profile_img else None,
+        profile_img_variants = variant_urls(row.profile_img_variants, BASE_URL),
+        companies = companies.get(row.id, [])
+    ) for row in rows]
+
+
 
 
 # Get user information by id
-def show_user(id: int, db: Session):
+async def show_user(id: int, db: AsyncSession):
     try:
-        user = db.query(UserModel).options(load_only(UserModel.id, UserModel.name, UserModel.email, UserModel.city, UserModel.state, UserModel.country, UserModel.profile_img)).filter(UserModel.id == id).first()
+        user = (await db.execute(select(UserModel).options(load_only(UserModel.id, UserModel.name, UserModel.email, UserModel.city, UserModel.state, UserModel.country, UserModel.profile_img, UserModel.profile_img_variants), selectinload(UserModel.companies).load_only(CompanyModel.company_name, CompanyModel.company_email, CompanyModel.company_country)).filter(UserModel.id == id))).scalars().first()
 
         if not user:
             return None
+        return _user_response(user)
+    except Exception as e:
+        print("Exception occurred:", str(e))
 
-        if user.profile_img:
-            user.profile_img = f"{BASE_URL}{user.profile_img}"
-        
-        return user
+
+# the user (with its companies loaded) as a plain dict, the urls are not written back to the loaded instance
+def _user_response(user: UserModel):
+    return {
+        "id": user.id,
+        "name": user.name,
+        "email": user.email,
+        "city": user.city,
+        "state": user.state,
+        "country": user.country,
+        "companies": [{"company_name": company.company_name, "company_email": company.company_email, "company_country": company.company_country} for company in user.companies],
+        "profile_img": f"{BASE_URL}{user.profile_img}" if user.profile_img else None,
+        "profile_img_variants": variant_urls(user.profile_img_variants, BASE_URL)
+    }
+
+
+
+
+# etag / last modified of the user view: the user's updated_at / row_version and the count / latest updated_at / summed
+# row_version of the companies it shows, in one primary key lookup without loading the user or its companies
+async def get_user_validators(id: int, db: AsyncSession):
+    try:
+        company_count = select(func.count(CompanyModel.id)).where(CompanyModel.user_id == UserModel.id).scalar_subquery()
+        company_updated_at = select(func.max(CompanyModel.updated_at)).where(CompanyModel.user_id == UserModel.id).scalar_subquery()
+        company_versions = select(func.sum(CompanyModel.row_version)).where(CompanyModel.user_id == UserModel.id).scalar_subquery()
+        # the image pipeline adds the variants without touching updated_at, row_version still changes
+        validators = (await db.execute(select(UserModel.id, UserModel.updated_at, UserModel.row_version, company_count, company_updated_at, company_versions).filter(UserModel.id == id))).first()
+        if not validators:
+            return None
+        return build_validators("user", *validators)
     except Exception as e:
         print("Exception occurred:", str(e))
 
@@ -134,10 +440,13 @@ def show_user(id: int, db: Session):
 
 
 # Update current logged user
-def update_user_info(user_update_data: UserUpdateSchema, token: str, db: Session):
+async def update_user_info(user_update_data: UserUpdateSchema, request: Request, db: AsyncSession):
     try:
-        user_email = decode_jwt_token(token)
-        user = db.query(UserModel).filter(UserModel.email == user_email).first()
+        auth_user = await Helper.getAuthUser(request, db)
+        if not auth_user:
+            raise HTTPException(status_code = status.HTTP_404_NOT_FOUND, detail = "User not found")
+
+        user = await db.get(UserModel, auth_user.id, options = [selectinload(UserModel.companies).load_only(CompanyModel.company_name, CompanyModel.company_email, CompanyModel.company_country)])
 
         if not user:
             raise HTTPException(status_code = status.HTTP_404_NOT_FOUND, detail = "User not found")
@@ -146,10 +455,10 @@ def update_user_info(user_update_data: UserUpdateSchema, token: str, db: Session
             user.name = user_update_data.name
 
         if user_update_data.new_password is not None:
-            if Hash.verify(user.password, user_update_data.new_password):
+            if await Hash.verify_async(user.password, user_update_data.new_password):
                 raise HTTPException(status_code = status.HTTP_400_BAD_REQUEST, detail = "New password must be different from the current password")
 
-            user.password = Hash.bcrypt(user_update_data.new_password)
+            user.password = await Hash.bcrypt_async(user_update_data.new_password)
 
         if user_update_data.city is not None:
             user.city = user_update_data.city
@@ -161,39 +470,52 @@ def update_user_info(user_update_data: UserUpdateSchema, token: str, db: Session
             user.country = user_update_data.country
 
         user.updated_at = datetime.now() 
-        db.commit()
-        return UserResponseSchema(
-            id = user.id,
-            name = user.name,
-            email = user.email,
-            city = user.city,
-            state = user.state,
-            country = user.country,
-            companies = [], 
-            profile_img = user.profile_img
-        )
-        # return user
+        await db.commit()
+        auth_user_cache.invalidate(user.email)
+        # the name / country show up in the cached company views (creator, user list)
+        if user_update_data.name is not None or user_update_data.country is not None:
+            await _invalidate_user_companies(user.id, db)
+        return _user_response(user)
     
+    except HashPoolBusyError:
+        raise
     except Exception as e:
         print("Exception occurred:", str(e))
 
 
 
+# drop the cached views of the companies a user created or belongs to
+async def _invalidate_user_companies(user_id: int, db: AsyncSession):
+    for company_id, uuid in (await db.execute(select(CompanyModel.id, CompanyModel.uuid).filter(CompanyModel.user_id == user_id))).all():
+        await invalidate_company(company_id, uuid)
+    for company_id in (await db.execute(select(UserCompany.company_id).filter(UserCompany.user_id == user_id))).scalars().all():
+        await invalidate_company(company_id)
+
+
+
 # Delete user by id
-def delete_user_info(id: int, db: Session):
+async def delete_user_info(id: int, db: AsyncSession):
     try:
-        user = db.query(UserModel).filter(UserModel.id == id).first()
+        user = (await db.execute(select(UserModel).options(selectinload(UserModel.companies), selectinload(UserModel.user_companies)).filter(UserModel.id == id))).scalars().first()
 
         if user is None:
             return None
-        
-        if user.profile_img:
-            user.profile_img = f"{BASE_URL}{user.profile_img}"
-
-        db.delete(user)
-        db.commit()
 
-        return user
+        image_paths = [user.profile_img] if user.profile_img else []
+        await blob_store.release(db, image_paths)
+        deleted_user = _user_response(user)
+
+        await db.delete(user)
+        await db.commit()
+        auth_user_cache.invalidate(user.email)
+        for company in user.companies:
+            await invalidate_company(company.id, company.uuid)
+        for user_company in user.user_companies:
+            await invalidate_company(user_company.company_id)
+        # files from before content addressing belong to this user only
+        await blob_store.remove_unmanaged(image_paths + variant_paths(user.profile_img_variants))
+
+        return deleted_user
     
     except Exception as e:
         print("Exception occurred:", str(e))
@@ -8,7 +8,7 @@ class CompanyRegisterSchema(BaseModel):
     company_zipcode: Optional[str] = None
     company_city: Optional[str] = None
     company_state: Optional[str] = None
-    company_country: Optional[str] = None
+    company_country: str
     # company_profile: Optional[str] = None
     company_profile: Optional[List[str]] 
 
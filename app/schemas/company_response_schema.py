@@ -17,12 +17,14 @@ class CompanyResponseSchema(BaseModel):
     company_name: str
     company_email: str
     company_number: str
-    company_zipcode: str
-    company_city: str
-    company_state: str
+    # nullable on the company table, only the country is required
+    company_zipcode: Optional[str]
+    company_city: Optional[str]
+    company_state: Optional[str]
     company_country: str
     company_profile: Optional[str]
     company_images: Optional[list] = None
+    company_image_variants: Optional[list] = None
     company_creator: CompanyCreatorSchema
 
     class Config:
@@ -42,7 +44,7 @@ class CompanyWithUsersSchema(BaseModel):
     company_id: int
     company_name: str
     company_email: str
-    company_state: str
+    company_state: Optional[str]
     company_country: str
     users: List[UserDetailSchema]
 
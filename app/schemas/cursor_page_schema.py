@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+from typing import Generic, List, Optional, TypeVar
+
+T = TypeVar('T')
+
+# one page of a cursor (keyset) paginated list
+class CursorPageSchema(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+    class Config:
+        from_attributes = True
@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, Field
 
 class UserCompanySchema(BaseModel):
     user_id: int
@@ -10,3 +11,24 @@ class UserCompanySchema(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class UserCompanyBulkSchema(BaseModel):
+    user_ids: List[int] = Field(..., min_length = 1)
+
+
+class UserCompanyResultSchema(BaseModel):
+    user_id: int
+    status: bool
+    # None when added, otherwise the add_user_to_company code: 4 user not found, 5 already in the company, 6 in another company
+    code: Optional[int] = None
+    response: str
+
+
+class UserCompanyBulkResultSchema(BaseModel):
+    company_id: int
+    company_name: str
+    company_email: str
+    added: int
+    skipped: int
+    results: List[UserCompanyResultSchema]
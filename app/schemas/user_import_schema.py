@@ -0,0 +1,20 @@
+from typing import List, Optional
+from pydantic import BaseModel
+
+
+class UserImportRowSchema(BaseModel):
+    row: int
+    email: Optional[str] = None
+    # created, exists, duplicate, missing_field, invalid_email, invalid_role, role_not_allowed, too_long, invalid_row, failed
+    # or retryable (the hashing pool was saturated, import the row again later)
+    status: str
+    user_id: Optional[int] = None
+
+
+class UserImportSchema(BaseModel):
+    total: int
+    created: int
+    skipped: int
+    retryable: int = 0
+    company_id: Optional[int] = None
+    rows: List[UserImportRowSchema]
@@ -20,6 +20,7 @@ class UserResponseSchema(BaseModel):
     country: str
     companies: List[UserCompanyResponseSchema] 
     profile_img: Optional[str]
+    profile_img_variants: Optional[dict] = None
 
     class Config:
         from_attributes = True  
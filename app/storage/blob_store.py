@@ -0,0 +1,236 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Optional
+from dotenv import load_dotenv
+from sqlalchemy import case, delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from app.helper.file_upload import discard_temp_upload
+from app.models.stored_blob_model import StoredBlob
+from app.storage.storage_backend import LocalStorageBackend, S3StorageBackend
+from config.database import SessionLocal
+
+load_dotenv()
+
+# "local" stores under uploads/, "s3" in an S3 compatible bucket
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+S3_BUCKET = os.getenv("S3_BUCKET")
+S3_PREFIX = os.getenv("S3_PREFIX", "")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+S3_REGION = os.getenv("S3_REGION")
+S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY")
+S3_SECRET_KEY = os.getenv("S3_SECRET_KEY")
+# unreferenced blobs (and files without a blob row) are kept this long before garbage collection removes them
+BLOB_GC_GRACE = int(os.getenv("BLOB_GC_GRACE", 3600))
+BLOB_GC_INTERVAL = int(os.getenv("BLOB_GC_INTERVAL", 3600))
+
+# paths saved on the models are "uploads/<storage key>", so responses keep building urls as BASE_URL + path
+UPLOADS_PREFIX = "uploads/"
+BLOB_PREFIX = "blobs/"
+
+
+def file_digest(path: str):
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for chunk in iter(lambda: source.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def storage_key(path: str):
+    return path[len(UPLOADS_PREFIX):] if path.startswith(UPLOADS_PREFIX) else path
+
+
+# content addressed upload storage: identical files are stored once and reference counted,
+# the counts change in the caller's transaction together with the rows pointing at the blob
+class BlobStore:
+    def __init__(self, backend):
+        self.backend = backend
+
+    # store a finished temp file (consumed), returns the path to save on the model;
+    # with a pending list the file of a new blob is not written yet but queued for publish() after the caller's commit,
+    # so a transaction that fails leaves no file behind
+    async def store(self, db: AsyncSession, temp_path: str, extension: str, pending: Optional[list] = None):
+        digest = await run_in_threadpool(file_digest, temp_path)
+        size = os.path.getsize(temp_path)
+        key = f"{BLOB_PREFIX}{digest[:2]}/{digest}{extension.lower()}"
+
+        stored_key = await self._add_reference(db, digest, key, size, temp_path, pending)
+        return f"{UPLOADS_PREFIX}{stored_key}"
+
+    async def _add_reference(self, db: AsyncSession, digest: str, key: str, size: int, temp_path: str, pending: Optional[list] = None, references: int = 1):
+        # the content is already stored: only count the new reference
+        blob_key = await self._increment(db, digest, references)
+        if blob_key is not None:
+            discard_temp_upload(temp_path)
+            return blob_key
+
+        if pending is None:
+            await self.backend.save(temp_path, key)
+        try:
+            async with db.begin_nested():
+                db.add(StoredBlob(digest = digest, storage_key = key, size = size, ref_count = references))
+        except IntegrityError:
+            # stored by a concurrent upload of the same content in the meantime
+            blob_key = await self._increment(db, digest, references)
+            if blob_key is None:
+                raise
+            return blob_key
+        if pending is not None:
+            pending.append((temp_path, key))
+        return key
+
+    # store several temp files with a fixed number of queries (one lookup, one increment for the known blobs and one
+    # insert for the new ones), returns their paths in order; pending works as for store()
+    async def store_many(self, db: AsyncSession, files: list, pending: Optional[list] = None):
+        described = await run_in_threadpool(lambda: [(file_digest(temp_path), os.path.getsize(temp_path)) for temp_path, _ in files])
+        counts = Counter(digest for digest, _ in described)
+
+        # locked so the garbage collection (skip_locked) leaves them alone until the new references are committed
+        keys = dict((await db.execute(select(StoredBlob.digest, StoredBlob.storage_key).filter(StoredBlob.digest.in_(counts)).with_for_update())).all())
+        if keys:
+            await db.execute(
+                update(StoredBlob)
+                .where(StoredBlob.digest.in_(keys))
+                .values(ref_count = StoredBlob.ref_count + case(*((StoredBlob.digest == digest, counts[digest]) for digest in keys)), released_at = None)
+            )
+
+        new_blobs = {}
+        for (temp_path, extension), (digest, size) in zip(files, described):
+            if digest in keys or digest in new_blobs:
+                discard_temp_upload(temp_path)
+            else:
+                new_blobs[digest] = (temp_path, f"{BLOB_PREFIX}{digest[:2]}/{digest}{extension.lower()}", size)
+
+        if new_blobs:
+            try:
+                async with db.begin_nested():
+                    await db.execute(insert(StoredBlob), [
+                        {"digest": digest, "storage_key": key, "size": size, "ref_count": counts[digest]}
+                        for digest, (_, key, size) in new_blobs.items()
+                    ])
+            except IntegrityError:
+                # some of the content was stored by a concurrent upload in the meantime, go one by one
+                for digest, (temp_path, key, size) in new_blobs.items():
+                    keys[digest] = await self._add_reference(db, digest, key, size, temp_path, pending, counts[digest])
+            else:
+                # the rows are not visible before the commit, so the files can still be written after the insert
+                for digest, (temp_path, key, _) in new_blobs.items():
+                    if pending is None:
+                        await self.backend.save(temp_path, key)
+                    else:
+                        pending.append((temp_path, key))
+                    keys[digest] = key
+
+        return [f"{UPLOADS_PREFIX}{keys[digest]}" for digest, _ in described]
+
+    # write the files queued by store() / store_many() with a pending list, call after the commit
+    async def publish(self, pending: list):
+        results = await asyncio.gather(*(self.backend.save(temp_path, key) for temp_path, key in pending), return_exceptions = True)
+        for (temp_path, key), result in zip(pending, results):
+            if isinstance(result, Exception):
+                print(f"Failed to publish {key}: {str(result)}")
+
+    async def _increment(self, db: AsyncSession, digest: str, references: int = 1):
+        result = await db.execute(update(StoredBlob).where(StoredBlob.digest == digest).values(ref_count = StoredBlob.ref_count + references, released_at = None))
+        if result.rowcount == 0:
+            return None
+        return (await db.execute(select(StoredBlob.storage_key).filter(StoredBlob.digest == digest))).scalar()
+
+    # drop one reference per path, in the caller's transaction; unreferenced blobs are removed later by collect_garbage
+    async def release(self, db: AsyncSession, paths: list):
+        for path in paths:
+            if path and storage_key(path).startswith(BLOB_PREFIX):
+                await db.execute(
+                    update(StoredBlob)
+                    .where(StoredBlob.storage_key == storage_key(path), StoredBlob.ref_count > 0)
+                    .values(ref_count = StoredBlob.ref_count - 1, released_at = datetime.now())
+                )
+
+    # remove files stored before content addressing (one file per row, no blob), call after the commit
+    async def remove_unmanaged(self, paths: list):
+        for path in paths:
+            if path and not storage_key(path).startswith(BLOB_PREFIX):
+                try:
+                    await self.backend.delete(storage_key(path))
+                except Exception as e:
+                    print(f"Failed to remove {path}: {str(e)}")
+
+    # delete unreferenced blobs (with their variants) and stored files that have no blob row
+    async def collect_garbage(self):
+        removed = 0
+        released_before = datetime.now() - timedelta(seconds = BLOB_GC_GRACE)
+
+        async with SessionLocal() as db:
+            blobs = (await db.execute(
+                select(StoredBlob)
+                .filter(StoredBlob.ref_count <= 0, StoredBlob.released_at <= released_before)
+                .with_for_update(skip_locked = True)
+            )).scalars().all()
+
+            for blob in blobs:
+                # the blob and its image variants (<digest>_<size>.<format>) share the digest prefix
+                for key, _ in await self.backend.list_keys(os.path.splitext(blob.storage_key)[0]):
+                    await self.backend.delete(key)
+                removed += 1
+            if blobs:
+                await db.execute(delete(StoredBlob).where(StoredBlob.id.in_([blob.id for blob in blobs]), StoredBlob.ref_count <= 0))
+            await db.commit()
+
+            # files saved by requests whose transaction never committed
+            known = set((await db.execute(select(StoredBlob.digest))).scalars().all())
+            for key, modified in await self.backend.list_keys(BLOB_PREFIX):
+                digest = os.path.splitext(os.path.basename(key))[0].split("_")[0]
+                if digest not in known and modified < time.time() - BLOB_GC_GRACE:
+                    await self.backend.delete(key)
+                    removed += 1
+
+        return removed
+
+
+def build_storage_backend(kind: str = STORAGE_BACKEND):
+    if kind == "s3":
+        return S3StorageBackend(bucket = S3_BUCKET, prefix = S3_PREFIX, endpoint_url = S3_ENDPOINT_URL, region = S3_REGION, access_key = S3_ACCESS_KEY, secret_key = S3_SECRET_KEY)
+    return LocalStorageBackend(os.path.join(os.getcwd(), "uploads"))
+
+
+blob_store = BlobStore(build_storage_backend())
+
+
+# runs the blob garbage collection periodically
+class BlobCollector:
+    def __init__(self, store: BlobStore, interval: int):
+        self.store = store
+        self.interval = interval
+        self._task = None
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.store.collect_garbage()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print("Blob garbage collection error:", str(e))
+            await asyncio.sleep(self.interval)
+
+
+blob_collector = BlobCollector(blob_store, BLOB_GC_INTERVAL)
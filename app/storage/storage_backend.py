@@ -0,0 +1,117 @@
+import mimetypes
+import os
+from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
+
+
+# files kept under a local directory, served by the /uploads mount
+class LocalStorageBackend:
+    def __init__(self, root: str):
+        self.root = root
+
+    def local_path(self, key: str):
+        return os.path.join(self.root, key)
+
+    def _save(self, temp_path: str, key: str):
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        os.replace(temp_path, path)
+
+    # move a finished temp file to key, the rename is atomic so readers never see a partial file
+    async def save(self, temp_path: str, key: str):
+        await run_in_threadpool(self._save, temp_path, key)
+
+    async def exists(self, key: str):
+        return await run_in_threadpool(os.path.exists, self.local_path(key))
+
+    def _delete(self, key: str):
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+    async def delete(self, key: str):
+        await run_in_threadpool(self._delete, key)
+
+    # the file itself, nothing has to be copied
+    @asynccontextmanager
+    async def local_copy(self, key: str, temp_dir: str):
+        yield self.local_path(key)
+
+    def _list(self, prefix: str):
+        keys = []
+        base = self.local_path(prefix) if prefix.endswith("/") else os.path.dirname(self.local_path(prefix))
+        for directory, _, files in os.walk(base):
+            for name in files:
+                path = os.path.join(directory, name)
+                key = os.path.relpath(path, self.root).replace(os.sep, "/")
+                if key.startswith(prefix):
+                    keys.append((key, os.path.getmtime(path)))
+        return keys
+
+    # (key, modified timestamp) of every stored file below prefix
+    async def list_keys(self, prefix: str):
+        return await run_in_threadpool(self._list, prefix)
+
+
+# files kept in an S3 compatible bucket (AWS, MinIO, ...), needs the boto3 package;
+# the bucket is expected to be published under the same /uploads/ path by the front proxy or CDN
+class S3StorageBackend:
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: str = None, region: str = None, access_key: str = None, secret_key: str = None, client = None):
+        if client is None:
+            import boto3
+            client = boto3.client("s3", endpoint_url = endpoint_url, region_name = region, aws_access_key_id = access_key, aws_secret_access_key = secret_key)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _object_key(self, key: str):
+        return f"{self.prefix}{key}"
+
+    def _save(self, temp_path: str, key: str):
+        content_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+        try:
+            # keys are content addressed, so the object never changes
+            self.client.upload_file(temp_path, self.bucket, self._object_key(key), ExtraArgs = {"ContentType": content_type, "CacheControl": "public, max-age=31536000, immutable"})
+        finally:
+            os.remove(temp_path)
+
+    async def save(self, temp_path: str, key: str):
+        await run_in_threadpool(self._save, temp_path, key)
+
+    def _exists(self, key: str):
+        try:
+            self.client.head_object(Bucket = self.bucket, Key = self._object_key(key))
+            return True
+        except self.client.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    async def exists(self, key: str):
+        return await run_in_threadpool(self._exists, key)
+
+    async def delete(self, key: str):
+        await run_in_threadpool(self.client.delete_object, Bucket = self.bucket, Key = self._object_key(key))
+
+    # download the object into a temp file for code that needs a local file (image processing)
+    @asynccontextmanager
+    async def local_copy(self, key: str, temp_dir: str):
+        temp_path = os.path.join(temp_dir, f"{os.urandom(16).hex()}{os.path.splitext(key)[1]}")
+        try:
+            await run_in_threadpool(self.client.download_file, self.bucket, self._object_key(key), temp_path)
+            yield temp_path
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _list(self, prefix: str):
+        keys = []
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket = self.bucket, Prefix = self._object_key(prefix)):
+            for item in page.get("Contents", []):
+                keys.append((item["Key"][len(self.prefix):], item["LastModified"].timestamp()))
+        return keys
+
+    async def list_keys(self, prefix: str):
+        return await run_in_threadpool(self._list, prefix)
@@ -0,0 +1,201 @@
+import hashlib
+import mimetypes
+import os
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+from app.storage.blob_store import BLOB_PREFIX
+
+load_dotenv()
+
+# cache lifetime of files that are not content addressed (uploaded before blobs/ existed)
+UPLOAD_CACHE_MAX_AGE = int(os.getenv("UPLOAD_CACHE_MAX_AGE", 3600))
+# when set (e.g. "/protected-uploads/"), only headers are sent and nginx serves the file from that internal location
+UPLOAD_ACCEL_REDIRECT_PREFIX = os.getenv("UPLOAD_ACCEL_REDIRECT_PREFIX")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+CHUNK_SIZE = 256 * 1024
+
+
+# (start, end) of a single "bytes=" range, None to send the whole file, "invalid" when it cannot be satisfied
+def parse_range(header: str, size: int):
+    if not header or not header.startswith("bytes=") or "," in header:
+        # multiple ranges are answered with the whole file
+        return None
+    start, _, end = header[6:].strip().partition("-")
+    try:
+        if start == "":
+            length = int(end)
+            if length <= 0:
+                return "invalid"
+            return max(0, size - length), size - 1
+        start = int(start)
+        end = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return "invalid"
+    return start, min(end, size - 1)
+
+
+# path below the mount point: newer Starlette keeps the full path in scope["path"] with the mount in root_path,
+# older versions strip the mount from path
+def _route_path(scope):
+    path, root_path = scope["path"], scope.get("root_path", "")
+    if root_path and path.startswith(root_path):
+        return path[len(root_path):]
+    return path
+
+
+def _open_at(path: str, offset: int):
+    source = open(path, "rb")
+    source.seek(offset)
+    return source
+
+
+# ASGI app serving the uploads directory with strong ETags, conditional and range requests;
+# content addressed files (blobs/) are cached as immutable, the server's zero-copy send is used when it offers one
+class UploadFiles:
+    def __init__(self, directory: str, accel_redirect_prefix: str = UPLOAD_ACCEL_REDIRECT_PREFIX):
+        self.directory = os.path.realpath(directory)
+        self.accel_redirect_prefix = accel_redirect_prefix
+
+    def _resolve(self, key: str):
+        path = os.path.realpath(os.path.join(self.directory, key))
+        if not path.startswith(self.directory + os.sep):
+            return None
+        try:
+            stat_result = os.stat(path)
+        except OSError:
+            return None
+        if not stat.S_ISREG(stat_result.st_mode):
+            return None
+        return path, stat_result
+
+    def _validators(self, key: str, stat_result):
+        if key.startswith(BLOB_PREFIX):
+            # the file name is the sha256 of the content (plus the variant suffix)
+            etag = f'"{os.path.splitext(os.path.basename(key))[0]}"'
+            cache_control = IMMUTABLE_CACHE_CONTROL
+        else:
+            version = f"{stat_result.st_ino}-{stat_result.st_mtime_ns}-{stat_result.st_size}"
+            etag = f'"{hashlib.md5(version.encode(), usedforsecurity = False).hexdigest()}"'
+            cache_control = f"public, max-age={UPLOAD_CACHE_MAX_AGE}"
+        return etag, cache_control
+
+    def _not_modified(self, headers: dict, etag: str, stat_result):
+        if_none_match = headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags
+        if_modified_since = headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                return int(stat_result.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    # If-Range holds an etag or the Last-Modified date of the version the client has; the range is only sent when it
+    # still is the current one (strong comparison: a weak etag or any other date means the whole file is sent)
+    def _if_range_matches(self, headers: dict, etag: str, stat_result):
+        if_range = headers.get("if-range")
+        if if_range is None:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith(('"', "W/")):
+            return if_range == etag
+        try:
+            return parsedate_to_datetime(if_range).timestamp() == int(stat_result.st_mtime)
+        except (TypeError, ValueError):
+            return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        if scope["method"] not in ("GET", "HEAD"):
+            await Response(status_code = 405, headers = {"Allow": "GET, HEAD"})(scope, receive, send)
+            return
+
+        key = _route_path(scope).lstrip("/")
+        resolved = await run_in_threadpool(self._resolve, key)
+        if resolved is None:
+            await Response("Not Found", status_code = 404, media_type = "text/plain")(scope, receive, send)
+            return
+
+        path, stat_result = resolved
+        size = stat_result.st_size
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+        etag, cache_control = self._validators(key, stat_result)
+        response_headers = {
+            "etag": etag,
+            "cache-control": cache_control,
+            "last-modified": formatdate(stat_result.st_mtime, usegmt = True),
+            "accept-ranges": "bytes"
+        }
+
+        if self._not_modified(headers, etag, stat_result):
+            await send({"type": "http.response.start", "status": 304, "headers": self._raw(response_headers)})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        response_headers["content-type"] = media_type
+
+        # hand the transfer (including ranges) over to nginx
+        if self.accel_redirect_prefix:
+            response_headers["x-accel-redirect"] = f"{self.accel_redirect_prefix.rstrip('/')}/{key}"
+            await send({"type": "http.response.start", "status": 200, "headers": self._raw(response_headers)})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        status_code = 200
+        start, end = 0, size - 1
+        if "range" in headers and self._if_range_matches(headers, etag, stat_result):
+            byte_range = parse_range(headers["range"], size)
+            if byte_range == "invalid":
+                response_headers["content-range"] = f"bytes */{size}"
+                await send({"type": "http.response.start", "status": 416, "headers": self._raw(response_headers)})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            if byte_range is not None:
+                start, end = byte_range
+                status_code = 206
+                response_headers["content-range"] = f"bytes {start}-{end}/{size}"
+
+        length = end - start + 1 if size else 0
+        response_headers["content-length"] = str(length)
+        await send({"type": "http.response.start", "status": status_code, "headers": self._raw(response_headers)})
+
+        if scope["method"] == "HEAD" or length == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        extensions = scope.get("extensions") or {}
+        if "http.response.zerocopysend" in extensions:
+            with open(path, "rb") as source:
+                await send({"type": "http.response.zerocopysend", "file": source.fileno(), "offset": start, "count": length})
+            return
+        if "http.response.pathsend" in extensions and status_code == 200:
+            await send({"type": "http.response.pathsend", "path": path})
+            return
+
+        # opened once, the chunks are read one after the other in the threadpool
+        source = await run_in_threadpool(_open_at, path, start)
+        try:
+            remaining = length
+            while remaining > 0:
+                chunk = await run_in_threadpool(source.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            await run_in_threadpool(source.close)
+
+    def _raw(self, headers: dict):
+        return [(name.encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
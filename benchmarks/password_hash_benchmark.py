@@ -0,0 +1,46 @@
+# Verify latency per password hashing cost setting.
+#
+#   python benchmarks/password_hash_benchmark.py --rounds 10 11 12 13 --iterations 20
+#   python benchmarks/password_hash_benchmark.py --argon2 2:19456:1 3:65536:4   (time_cost:memory_cost_kib:parallelism, needs argon2-cffi)
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.hashing.password_hash import build_password_context
+
+
+def measure(label: str, context, iterations: int):
+    hashed = context.hash("benchmark-password")
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        context.verify("benchmark-password", hashed)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    timings.sort()
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"{label:<32} mean {statistics.mean(timings):8.2f} ms   p50 {statistics.median(timings):8.2f} ms   p99 {p99:8.2f} ms   ~{1000 / statistics.mean(timings):6.1f} verifies/s/core")
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Measure password verify latency per cost setting")
+    parser.add_argument("--rounds", type = int, nargs = "*", default = [10, 11, 12, 13], help = "bcrypt rounds (log2 cost) to measure")
+    parser.add_argument("--argon2", nargs = "*", default = [], help = "argon2 settings as time_cost:memory_cost_kib:parallelism")
+    parser.add_argument("--iterations", type = int, default = 10, help = "verifies per setting")
+    args = parser.parse_args()
+
+    for rounds in args.rounds:
+        measure(f"bcrypt rounds={rounds}", build_password_context(scheme = "bcrypt", bcrypt_rounds = rounds), args.iterations)
+
+    for setting in args.argon2:
+        time_cost, memory_cost, parallelism = (int(value) for value in setting.split(":"))
+        context = build_password_context(scheme = "argon2", argon2_time_cost = time_cost, argon2_memory_cost = memory_cost, argon2_parallelism = parallelism)
+        measure(f"argon2 t={time_cost} m={memory_cost} p={parallelism}", context, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Per-request serialization cost of the ResponseSchema envelope: FastAPI's response_model path (ResponseSchema built
+# in the route, validated again against response_model, dumped, jsonable_encoder, json.dumps) against EnvelopeSerializer.
+#
+#   python benchmarks/response_serialization_benchmark.py --items 1 20 100 --iterations 2000
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from app.helper.fast_json import EnvelopeSerializer
+from app.schemas.company_response_schema import CompanyResponseSchema
+from app.schemas.response_schema import ResponseSchema
+from app.schemas.user_response_schema import UserResponseSchema
+
+
+# rows shaped like the ones the list services hand to the routes (attribute access, as with ORM objects)
+def sample_users(count: int):
+    return [SimpleNamespace(id = i, name = f"user {i}", email = f"user{i}@example.com", city = "Pune", state = "Maharashtra", country = "India", profile_img = f"http://localhost:8000/uploads/blobs/{i:064x}.png", profile_img_variants = {"thumb": f"http://localhost:8000/uploads/variants/{i}_thumb.webp"}, companies = [SimpleNamespace(company_name = f"company {i}", company_email = f"info{i}@example.com", company_country = "India")]) for i in range(count)]
+
+
+def sample_companies(count: int):
+    return [SimpleNamespace(id = i, uuid = f"{i:032x}", company_name = f"company {i}", company_email = f"info{i}@example.com", company_number = "9999999999", company_zipcode = "411001", company_city = "Pune", company_state = "Maharashtra", company_country = "India", company_profile = None, company_images = None, company_image_variants = None, company_creator = SimpleNamespace(name = f"user {i}", email = f"user{i}@example.com", country = "India")) for i in range(count)]
+
+
+def time_calls(call, iterations: int):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - started) * 1_000_000)
+    timings.sort()
+    return statistics.mean(timings), timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+
+
+def measure(label: str, item_type, rows, iterations: int):
+    field = create_model_field(name = "Response_bench", type_ = ResponseSchema[List[item_type]], mode = "serialization")
+    envelope = EnvelopeSerializer(List[item_type])
+    loop = asyncio.new_event_loop()
+
+    def standard():
+        content = ResponseSchema(status = True, response = "found", data = rows)
+        return JSONResponse(loop.run_until_complete(serialize_response(field = field, response_content = content))).body
+
+    def fast():
+        return envelope(True, "found", rows).body
+
+    # same bytes from both paths, the comparison is only about the cost
+    assert standard() == fast()
+    for name, call in (("response_model", standard), ("EnvelopeSerializer", fast)):
+        mean, p99 = time_calls(call, iterations)
+        print(f"{label:<20} {name:<20} mean {mean:9.1f} us   p99 {p99:9.1f} us   ~{1_000_000 / mean:8.0f} responses/s/core")
+    loop.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Measure the serialization cost of list responses")
+    parser.add_argument("--items", type = int, nargs = "*", default = [1, 20, 100], help = "rows per response")
+    parser.add_argument("--iterations", type = int, default = 2000, help = "responses per measurement")
+    args = parser.parse_args()
+
+    for count in args.items:
+        measure(f"users x{count}", UserResponseSchema, sample_users(count), args.iterations)
+        measure(f"companies x{count}", CompanyResponseSchema, sample_companies(count), args.iterations)
+
+
+if __name__ == "__main__":
+    main()
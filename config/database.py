@@ -1,9 +1,10 @@
 import os
 import json
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import MetaData
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
+from config.pool_metrics import TimedQueuePool
 
 metadata = MetaData()
 
@@ -16,19 +17,35 @@ database = os.getenv("DB_NAME")
 password = os.getenv("DB_PASSWORD")
 host = os.getenv("DB_HOST")
 
-MYSQL_URL = f"mysql+pymysql://{user}:{password}@{host}/{database}"
-engine = create_engine(MYSQL_URL)
-SessionLocal = sessionmaker(autocommit = False, autoflush = False, bind = engine)
+# connection pool settings, sized per worker
+pool_size = int(os.getenv("DB_POOL_SIZE", 10))
+max_overflow = int(os.getenv("DB_MAX_OVERFLOW", 10))
+pool_timeout = int(os.getenv("DB_POOL_TIMEOUT", 30))
+# recycle connections before MySQL drops them for being idle (wait_timeout)
+pool_recycle = int(os.getenv("DB_POOL_RECYCLE", 1800))
+pool_pre_ping = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+MYSQL_URL = f"mysql+aiomysql://{user}:{password}@{host}/{database}"
+engine = create_async_engine(
+    MYSQL_URL,
+    poolclass = TimedQueuePool,
+    pool_size = pool_size,
+    max_overflow = max_overflow,
+    pool_timeout = pool_timeout,
+    pool_recycle = pool_recycle,
+    pool_pre_ping = pool_pre_ping
+)
+
+# expire_on_commit is disabled so committed objects can still be read without an implicit (blocking) reload
+SessionLocal = async_sessionmaker(bind = engine, class_ = AsyncSession, autoflush = False, expire_on_commit = False)
 
 file = open(os.getcwd() + '/response_message.json')
 msg = json.load(file)
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    except Exception as ex:
-        print("Error getting DB session : ", ex)
-        return ex
-    finally:
-        db.close()
+async def get_db():
+    async with SessionLocal() as db:
+        try:
+            yield db
+        except Exception as ex:
+            print("Error getting DB session : ", ex)
+            raise
@@ -0,0 +1,48 @@
+# Schema changes, run once per deploy before the workers start instead of from the startup hook of every worker:
+#
+#   pipenv run migrate
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+from config.database import engine, Base
+# every model registers its table on Base.metadata
+from app.models import company_images, company_model, email_outbox_model, otp_model, roles_model, stored_blob_model, user_company_model, user_model
+
+
+# add nullable columns declared on the models that are still missing on already existing tables
+def create_missing_columns(connection):
+    inspector = inspect(connection)
+    preparer = connection.dialect.identifier_preparer
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                column_ddl = CreateColumn(column).compile(dialect = connection.dialect)
+                connection.execute(text(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {column_ddl}"))
+
+
+# create indexes declared on the models that are still missing on already existing tables
+def create_missing_indexes(connection):
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst = True)
+
+
+# create the missing tables, then the columns and indexes added to the existing ones
+async def migrate():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(create_missing_columns)
+        await conn.run_sync(create_missing_indexes)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,64 @@
+import time
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+# connection wait statistics of a pool
+class PoolWaitStats:
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, waited: float):
+        self.checkouts += 1
+        self.total_wait += waited
+        if waited > self.max_wait:
+            self.max_wait = waited
+
+    def as_dict(self):
+        average_wait = self.total_wait / self.checkouts if self.checkouts else 0.0
+        return {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(average_wait * 1000, 3),
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+            "total_wait_ms": round(self.total_wait * 1000, 3)
+        }
+
+
+# queue pool that records how long every checkout waited for a connection
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.wait_stats.timeouts += 1
+            raise
+        finally:
+            self.wait_stats.record(time.perf_counter() - started)
+
+
+# current state of the engine pool
+def pool_status(engine):
+    pool = engine.pool
+    # NullPool / StaticPool keep no queue of connections, there are no sizes to report
+    if not isinstance(pool, QueuePool):
+        return {"pool_class": type(pool).__name__}
+    status = {
+        "pool_class": type(pool).__name__,
+        "pool_size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow()
+    }
+    wait_stats = getattr(pool, "wait_stats", None)
+    if wait_stats is not None:
+        status.update(wait_stats.as_dict())
+    return status
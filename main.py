@@ -1,18 +1,28 @@
-from fastapi.staticfiles import StaticFiles
 import uvicorn
 import os
-from fastapi import FastAPI
-from config.database import engine, Base
-from config.database import SessionLocal
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from config.database import msg
+from app.hashing.password_hash import HashPoolBusyError
+from app.helper.email_outbox import email_outbox
+from app.helper.fast_json import FastJSONResponse
+from app.helper.otp_store import otp_sweeper
+from app.helper.rate_limiter import RateLimitMiddleware
+from app.helper.file_upload import UPLOAD_TMP_DIR
+from app.helper.image_pipeline import image_pipeline
+from app.storage.blob_store import blob_collector
+from app.storage.upload_files import UploadFiles
 from fastapi_pagination import add_pagination
 from app.modules.user import user_route
 from app.modules.login import login_route
 from app.modules.forgot_password import forget_password_route
 from app.modules.company import company_routes
+from app.modules.metrics import metrics_route
 from fastapi.middleware.cors import CORSMiddleware
 
 
-app = FastAPI()
+# the responses of every route are encoded with orjson, the read routes hand it bytes already encoded by EnvelopeSerializer
+app = FastAPI(default_response_class = FastJSONResponse)
 
 # Ensure uploads directory exists, if not then create it
 upload_dir = os.path.join(os.getcwd(), "uploads")
@@ -21,13 +31,51 @@ company_dir = os.path.join(upload_dir, "company")
 
 os.makedirs(user_dir, exist_ok=True)
 os.makedirs(company_dir, exist_ok=True)
+os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
 
-# Mount the uploads directory as a static file route
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# Mount the uploads directory as a static file route (conditional / range requests, immutable content addressed files)
+app.mount("/uploads", UploadFiles(directory="uploads"), name="uploads")
 
 add_pagination(app)
 
-Base.metadata.create_all(bind = engine)
+# deliver queued mails in the background for the lifetime of the worker
+@app.on_event("startup")
+async def start_email_outbox():
+    email_outbox.start()
+
+@app.on_event("shutdown")
+async def stop_email_outbox():
+    await email_outbox.stop()
+
+# remove expired OTPs in the background
+@app.on_event("startup")
+async def start_otp_sweeper():
+    otp_sweeper.start()
+
+@app.on_event("shutdown")
+async def stop_otp_sweeper():
+    await otp_sweeper.stop()
+
+@app.on_event("shutdown")
+async def stop_image_pipeline():
+    image_pipeline.shutdown()
+
+# remove unreferenced uploads in the background
+@app.on_event("startup")
+async def start_blob_collector():
+    blob_collector.start()
+
+@app.on_event("shutdown")
+async def stop_blob_collector():
+    await blob_collector.stop()
+
+# shed load when the password hashing pool is saturated instead of queueing without bound
+@app.exception_handler(HashPoolBusyError)
+async def hash_pool_busy_handler(request: Request, exc: HashPoolBusyError):
+    return JSONResponse(status_code = 503, headers = {"Retry-After": "1"}, content = {"status": False, "response": msg["server_busy"], "data": None})
+
+# throttle login and OTP requests per client ip and email before they reach the routes
+app.add_middleware(RateLimitMiddleware)
 
 origins = ["*"]
 
@@ -39,8 +87,6 @@ app.add_middleware(
     allow_headers = ["*"],
 )
 
-session = SessionLocal()
-
 @app.get("/")
 def welcome():
     return {"message": "Welcome to the FastAPI Project"}
@@ -49,6 +95,7 @@ app.include_router(login_route.router)
 app.include_router(user_route.router)
 app.include_router(company_routes.router)
 app.include_router(forget_password_route.router)
+app.include_router(metrics_route.router)
 
 
 
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import sys
+import tempfile
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# response_message.json is read relative to the working directory
+os.chdir(ROOT)
+os.environ.update(DB_USER = "test", DB_PASSWORD = "test", DB_HOST = "localhost", DB_NAME = "test", SECRET_KEY = "test-secret", ALGORITHM = "HS256", EMAIL_HOST = "localhost", EMAIL_PORT = "25", EMAIL_USER = "test@example.com", EMAIL_PASSWORD = "test", BASE_URL = "http://testserver/", RATE_LIMIT_ENABLED = "false")
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, insert, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+import config.database as database
+
+# the app runs against a SQLite file through aiosqlite instead of MySQL; set up before any app module is imported,
+# several bind SessionLocal at import
+database.engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+database.SessionLocal = async_sessionmaker(bind = database.engine, class_ = AsyncSession, autoflush = False, expire_on_commit = False)
+
+from app.auth.jwt_handler import create_access_token
+from app.models.company_images import CompanyImage
+from app.models.company_model import CompanyModel
+from app.models.roles_model import Role
+from app.models.user_company_model import UserCompany
+from app.models.user_model import UserModel
+
+
+# the SQLite engine with the schema created
+@pytest.fixture(scope = "session")
+def engine():
+    engine = database.engine
+
+    # SQLite has no ON UPDATE clause, the services set updated_at themselves
+    for table in database.Base.metadata.tables.values():
+        for column in table.columns:
+            if column.server_default is not None and "ON UPDATE" in str(column.server_default.arg):
+                column.server_default.arg = text("CURRENT_TIMESTAMP")
+
+    import main
+
+    async def create_schema():
+        async with engine.begin() as connection:
+            await connection.run_sync(database.Base.metadata.create_all)
+        # the test client runs the app on its own event loop
+        await engine.dispose()
+
+    asyncio.run(create_schema())
+    return engine
+
+
+@pytest.fixture(scope = "session")
+def app(engine):
+    import main
+    return main.app
+
+
+# SQL statements sent to the database, cleared by the test before the request it measures
+@pytest.fixture
+def statements(engine):
+    executed = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+
+# runs statements in their own committed session, the way another worker would write; call outside of a request
+@pytest.fixture(scope = "session")
+def run_sql(engine):
+    def run(*statements):
+        async def execute():
+            async with database.SessionLocal() as db:
+                for statement in statements:
+                    await db.execute(statement)
+                await db.commit()
+            await engine.dispose()
+
+        asyncio.run(execute())
+    return run
+
+
+USERS = 6
+COMPANIES = 4
+
+
+# users, companies with members and images, and a client authenticated as the superadmin user1
+@pytest.fixture(scope = "session")
+def client(app, engine):
+    async def seed():
+        async with database.SessionLocal() as db:
+            await db.execute(insert(Role), [{"id": 1, "role_name": "superadmin"}, {"id": 2, "role_name": "companyadmin"}, {"id": 3, "role_name": "user"}])
+            await db.execute(insert(UserModel), [{"id": i, "name": f"user {i}", "email": f"user{i}@example.com", "password": "x", "role_id": 1 if i == 1 else 3, "city": "city", "state": "state", "country": "country"} for i in range(1, USERS + 1)])
+            # two companies per creator, every company with users and images
+            await db.execute(insert(CompanyModel), [{"id": i, "uuid": str(uuid.uuid4()), "company_name": f"company {i}", "company_email": f"company{i}@example.com", "company_number": "1", "company_zipcode": "1", "company_city": "city", "company_state": "state", "company_country": "country", "user_id": (i + 1) // 2} for i in range(1, COMPANIES + 1)])
+            await db.execute(insert(UserCompany), [{"user_id": i, "company_id": 1 + i % COMPANIES} for i in range(2, USERS + 1)])
+            await db.execute(insert(CompanyImage), [{"company_id": i, "image_path": f"company/{i}_{n}.png"} for i in range(1, COMPANIES + 1) for n in range(3)])
+            await db.commit()
+        await engine.dispose()
+
+    asyncio.run(seed())
+    # no context manager: the startup hooks (and their background loops) stay off
+    client = TestClient(app)
+    client.headers["Authorization"] = "Bearer " + create_access_token(data = {"sub": "user1@example.com"})
+    return client
@@ -0,0 +1,213 @@
+# content addressed uploads: identical files share one reference counted blob, and the garbage collection removes
+# unreferenced blobs (with their variants) and files without a blob row only once they are past the grace period
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+import boto3
+import pytest
+from moto import mock_aws
+from sqlalchemy import delete, select, update
+import config.database as database
+from app.models.stored_blob_model import StoredBlob
+from app.storage.blob_store import BLOB_GC_GRACE, BlobStore
+from app.storage.storage_backend import LocalStorageBackend, S3StorageBackend
+
+BUCKET = "uploads"
+
+
+def run(engine, steps):
+    async def main():
+        async with database.SessionLocal() as db:
+            await db.execute(delete(StoredBlob))
+            await db.commit()
+        try:
+            return await steps()
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+def temp_file(directory, content: bytes):
+    path = os.path.join(directory, f"{os.urandom(8).hex()}.upload")
+    with open(path, "wb") as upload:
+        upload.write(content)
+    return str(path)
+
+
+async def ref_counts():
+    async with database.SessionLocal() as db:
+        return dict((await db.execute(select(StoredBlob.storage_key, StoredBlob.ref_count))).all())
+
+
+async def release(store, *paths):
+    async with database.SessionLocal() as db:
+        await store.release(db, list(paths))
+        await db.commit()
+
+
+# move the release of every unreferenced blob back past the grace period
+async def expire_released():
+    async with database.SessionLocal() as db:
+        await db.execute(update(StoredBlob).where(StoredBlob.ref_count <= 0).values(released_at = datetime.now() - timedelta(seconds = BLOB_GC_GRACE + 1)))
+        await db.commit()
+
+
+@pytest.fixture
+def local_store(tmp_path):
+    return BlobStore(LocalStorageBackend(str(tmp_path / "uploads")))
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    with mock_aws():
+        client = boto3.client("s3", region_name = "us-east-1")
+        client.create_bucket(Bucket = BUCKET)
+        yield client
+
+
+def test_store_counts_references(local_store, tmp_path, engine):
+    async def steps():
+        async with database.SessionLocal() as db:
+            first = await local_store.store(db, temp_file(tmp_path, b"same"), ".PNG")
+            second = await local_store.store(db, temp_file(tmp_path, b"same"), ".png")
+            other = await local_store.store(db, temp_file(tmp_path, b"other"), ".png")
+            await db.commit()
+        stored = await ref_counts()
+
+        await release(local_store, first)
+        return first, second, other, stored, await ref_counts()
+
+    first, second, other, stored, released = run(engine, steps)
+
+    assert first == second and first != other
+    assert first.startswith("uploads/blobs/") and first.endswith(".png")
+    assert stored == {first[len("uploads/"):]: 2, other[len("uploads/"):]: 1}
+    assert released[first[len("uploads/"):]] == 1
+    # the temp files are consumed, the content is written once
+    assert [path.name for path in tmp_path.iterdir()] == ["uploads"]
+    assert os.path.exists(local_store.backend.local_path(first[len("uploads/"):]))
+
+
+def test_store_many_dedups(local_store, tmp_path, engine):
+    async def steps():
+        async with database.SessionLocal() as db:
+            known = await local_store.store(db, temp_file(tmp_path, b"known"), ".png")
+            await db.commit()
+
+        pending = []
+        async with database.SessionLocal() as db:
+            paths = await local_store.store_many(db, [
+                (temp_file(tmp_path, b"known"), ".png"),
+                (temp_file(tmp_path, b"new"), ".png"),
+                (temp_file(tmp_path, b"new"), ".jpg"),
+                (temp_file(tmp_path, b"known"), ".png")
+            ], pending = pending)
+            # nothing written before the caller's commit
+            unpublished = [await local_store.backend.exists(key) for _, key in pending]
+            await db.commit()
+        await local_store.publish(pending)
+        return known, paths, pending, unpublished, await ref_counts()
+
+    known, paths, pending, unpublished, counts = run(engine, steps)
+
+    assert paths[0] == paths[3] == known
+    assert paths[1] == paths[2] != known
+    assert counts == {known[len("uploads/"):]: 3, paths[1][len("uploads/"):]: 2}
+    # one file for the new content, the duplicates are dropped
+    assert len(pending) == 1 and unpublished == [False]
+    assert os.path.exists(local_store.backend.local_path(paths[1][len("uploads/"):]))
+    assert [path.name for path in tmp_path.iterdir()] == ["uploads"]
+
+
+def test_collect_garbage_after_grace(local_store, tmp_path, engine):
+    backend = local_store.backend
+
+    async def steps():
+        async with database.SessionLocal() as db:
+            kept, released, expired = [await local_store.store(db, temp_file(tmp_path, content), ".png") for content in (b"kept", b"released", b"expired")]
+            await db.commit()
+        # an image variant of the expired blob
+        variant = os.path.splitext(expired[len("uploads/"):])[0] + "_64.webp"
+        await backend.save(temp_file(tmp_path, b"variant"), variant)
+        # files of transactions that never committed, one of them old enough to go
+        await backend.save(temp_file(tmp_path, b"orphan"), "blobs/aa/aaaa.png")
+        await backend.save(temp_file(tmp_path, b"orphan"), "blobs/bb/bbbb.png")
+        old = time.time() - BLOB_GC_GRACE - 1
+        os.utime(backend.local_path("blobs/aa/aaaa.png"), (old, old))
+
+        await release(local_store, expired)
+        await expire_released()
+        await release(local_store, released)
+        removed = await local_store.collect_garbage()
+        return kept, released, expired, variant, removed, await ref_counts()
+
+    kept, released, expired, variant, removed, counts = run(engine, steps)
+
+    assert removed == 2
+    # the blob released just now is kept until its grace period passes
+    assert counts == {kept[len("uploads/"):]: 1, released[len("uploads/"):]: 0}
+    for key in (kept[len("uploads/"):], released[len("uploads/"):], "blobs/bb/bbbb.png"):
+        assert os.path.exists(backend.local_path(key))
+    for key in (expired[len("uploads/"):], variant, "blobs/aa/aaaa.png"):
+        assert not os.path.exists(backend.local_path(key))
+
+
+def test_s3_backend(s3_client, tmp_path):
+    backend = S3StorageBackend(bucket = BUCKET, prefix = "media/", client = s3_client)
+
+    async def steps():
+        upload = temp_file(tmp_path, b"content")
+        await backend.save(upload, "blobs/ab/abcd.png")
+        saved = not os.path.exists(upload)
+        async with backend.local_copy("blobs/ab/abcd.png", str(tmp_path)) as path:
+            with open(path, "rb") as copy:
+                content = copy.read()
+            copied = path
+        listed = await backend.list_keys("blobs/")
+        exists = await backend.exists("blobs/ab/abcd.png"), await backend.exists("blobs/ab/missing.png")
+        await backend.delete("blobs/ab/abcd.png")
+        return saved, content, os.path.exists(copied), listed, exists, await backend.exists("blobs/ab/abcd.png")
+
+    saved, content, copy_left, listed, exists, exists_after_delete = asyncio.run(steps())
+
+    assert saved and content == b"content" and not copy_left
+    # keys are returned without the bucket prefix
+    assert [key for key, _ in listed] == ["blobs/ab/abcd.png"]
+    assert exists == (True, False) and not exists_after_delete
+    head = s3_client.list_objects_v2(Bucket = BUCKET)
+    assert head["KeyCount"] == 0
+
+
+def test_s3_object_headers(s3_client, tmp_path):
+    backend = S3StorageBackend(bucket = BUCKET, client = s3_client)
+    asyncio.run(backend.save(temp_file(tmp_path, b"content"), "blobs/ab/abcd.png"))
+
+    head = s3_client.head_object(Bucket = BUCKET, Key = "blobs/ab/abcd.png")
+    assert head["ContentType"] == "image/png"
+    assert "immutable" in head["CacheControl"]
+
+
+def test_s3_blob_lifecycle(s3_client, tmp_path, engine):
+    store = BlobStore(S3StorageBackend(bucket = BUCKET, prefix = "media/", client = s3_client))
+
+    async def steps():
+        async with database.SessionLocal() as db:
+            paths = await store.store_many(db, [(temp_file(tmp_path, b"same"), ".png"), (temp_file(tmp_path, b"same"), ".png")])
+            await db.commit()
+        stored = [item["Key"] for item in s3_client.list_objects_v2(Bucket = BUCKET).get("Contents", [])]
+
+        await release(store, *paths)
+        await expire_released()
+        removed = await store.collect_garbage()
+        return paths, stored, removed
+
+    paths, stored, removed = run(engine, steps)
+
+    assert paths[0] == paths[1]
+    assert stored == ["media/" + paths[0][len("uploads/"):]]
+    assert removed == 1
+    assert s3_client.list_objects_v2(Bucket = BUCKET)["KeyCount"] == 0
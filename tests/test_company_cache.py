@@ -0,0 +1,39 @@
+# the cached company views follow writes made by another worker: the rows are changed straight in the database,
+# without the invalidation the writing worker would do, and the next request must not be served from the old entry
+import uuid
+from sqlalchemy import delete, insert, update
+from app.models.company_model import CompanyModel
+from app.models.user_company_model import UserCompany
+
+
+def member_ids(client, company_id: int):
+    data = client.get(f"/api/company/userlist/{company_id}", params = {"company_id": company_id}).json()["data"]
+    return sorted(user["user_id"] for user in data["users"])
+
+
+def test_member_list_follows_other_workers(client, run_sql):
+    before = member_ids(client, 1)
+    assert member_ids(client, 1) == before
+
+    run_sql(insert(UserCompany).values(user_id = 1, company_id = 1))
+    try:
+        assert member_ids(client, 1) == sorted(before + [1])
+    finally:
+        run_sql(delete(UserCompany).where(UserCompany.user_id == 1, UserCompany.company_id == 1))
+    assert member_ids(client, 1) == before
+
+
+def test_uuid_view_follows_other_workers(client, run_sql):
+    company_uuid = str(uuid.uuid4())
+    run_sql(insert(CompanyModel).values(id = 99, uuid = company_uuid, company_name = "cached", company_email = "cached@example.com", company_number = "1", company_zipcode = "1", company_city = "city", company_state = "state", company_country = "country", user_id = 1))
+
+    def view():
+        return client.post("/api/company/info/uuid", headers = {"uuid": company_uuid}).json()
+
+    assert view()["data"]["company_name"] == "cached"
+
+    run_sql(update(CompanyModel).where(CompanyModel.id == 99).values(company_name = "renamed"))
+    assert view()["data"]["company_name"] == "renamed"
+
+    run_sql(delete(CompanyModel).where(CompanyModel.id == 99))
+    assert view()["status"] is False
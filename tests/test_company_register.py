@@ -0,0 +1,34 @@
+# a company registered without the optional zipcode / city / state is answered (and listed) with them null
+import pytest
+from sqlalchemy import delete, insert
+from app.models.company_model import CompanyModel
+from app.models.user_company_model import UserCompany
+
+
+@pytest.mark.parametrize("route", ["json", "upload"])
+def test_register_without_optional_fields(client, run_sql, route):
+    company = {"company_name": f"minimal {route}", "company_email": f"minimal-{route}@example.com", "company_number": "1", "company_country": "country"}
+    if route == "json":
+        response = client.post("/api/company/register", json = dict(company, company_profile = None))
+    else:
+        response = client.post("/api/company/register/upload", data = company)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] is True
+    data = body["data"]
+    try:
+        assert (data["company_zipcode"], data["company_city"], data["company_state"]) == (None, None, None)
+
+        run_sql(insert(UserCompany).values(user_id = 2, company_id = data["id"]))
+        members = client.get(f"/api/company/userlist/{data['id']}", params = {"company_id": data["id"]}).json()
+        assert members["status"] is True and members["data"]["company_state"] is None
+    finally:
+        # the other tests expect the companies of user1 as seeded
+        run_sql(delete(UserCompany).where(UserCompany.company_id == data["id"]), delete(CompanyModel).where(CompanyModel.id == data["id"]))
+
+
+def test_country_is_required(client):
+    response = client.post("/api/company/register/upload", data = {"company_name": "no country", "company_email": "no-country@example.com", "company_number": "1"})
+
+    assert response.status_code == 422
@@ -0,0 +1,185 @@
+# the outbox delivering to a local aiosmtpd server: delivery over reused connections, retry with backoff, final
+# failure and rows left in 'sending' by a worker that died
+import asyncio
+import socket
+from datetime import datetime, timedelta
+import pytest
+from aiosmtpd.controller import Controller
+from sqlalchemy import delete, insert, select, update
+import config.database as database
+from app.helper.email_config import EmailSettings
+from app.helper.email_outbox import EmailOutboxSender
+from app.models.email_outbox_model import EmailOutbox
+
+RETRY_DELAY = 30
+
+
+# accepts every mail unless told to answer the DATA (temporary) or the recipient (permanent) with an error
+class Mailbox:
+    def __init__(self):
+        self.received = []
+        self.data_reply = None
+        self.refused = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.refused:
+            return "550 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.data_reply:
+            return self.data_reply
+        self.received.append(envelope.rcpt_tos)
+        return "250 OK"
+
+
+@pytest.fixture
+def mailbox():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    mailbox = Mailbox()
+    controller = Controller(mailbox, hostname = "127.0.0.1", port = port)
+    controller.start()
+    mailbox.port = port
+    yield mailbox
+    controller.stop()
+
+
+@pytest.fixture
+def sender(mailbox, engine):
+    settings = EmailSettings(
+        email_host = "127.0.0.1", email_port = mailbox.port, email_user = "outbox@example.com", email_password = "x",
+        email_starttls = False, email_login = False, email_pool_size = 2, email_max_attempts = 2,
+        email_retry_delay = RETRY_DELAY, email_retry_max_delay = 100, email_claim_timeout = 60
+    )
+    sender = EmailOutboxSender(settings)
+    yield sender
+    sender.pool.close_all()
+    sender._executor.shutdown()
+
+
+# run an outbox step against an empty outbox table, on its own event loop like every test here
+def run(engine, steps):
+    async def main():
+        async with database.SessionLocal() as db:
+            await db.execute(delete(EmailOutbox))
+            await db.commit()
+        try:
+            return await steps()
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+async def enqueue(sender, *recipients):
+    async with database.SessionLocal() as db:
+        for recipient in recipients:
+            sender.enqueue(db, recipient, "subject", "body")
+        await db.commit()
+
+
+async def rows():
+    async with database.SessionLocal() as db:
+        return {mail.recipient: mail for mail in (await db.execute(select(EmailOutbox))).scalars().all()}
+
+
+# make every waiting mail due now
+async def due_now():
+    async with database.SessionLocal() as db:
+        await db.execute(update(EmailOutbox).values(next_attempt_at = datetime.now() - timedelta(seconds = 1)))
+        await db.commit()
+
+
+def test_delivery_reuses_connections(sender, mailbox, engine):
+    async def steps():
+        sender._wakeup = asyncio.Event()
+        await enqueue(sender, "a@example.com", "b@example.com", "c@example.com")
+        # woken by the commit of the caller
+        assert sender._wakeup.is_set()
+
+        assert await sender.process_batch() == 3
+        await enqueue(sender, "d@example.com")
+        assert await sender.process_batch() == 1
+        return await rows()
+
+    mails = run(engine, steps)
+
+    assert sorted(rcpt for rcpts in mailbox.received for rcpt in rcpts) == ["a@example.com", "b@example.com", "c@example.com", "d@example.com"]
+    assert {mail.status for mail in mails.values()} == {"sent"}
+    stats = sender.pool.stats()
+    # never more connections than send threads, the later mails go over the open ones
+    assert stats["connections_opened"] <= 2
+    assert stats["connections_reused"] >= 2
+    assert sender.sent == 4
+
+
+def test_retry_with_backoff(sender, mailbox, engine):
+    async def steps():
+        await enqueue(sender, "a@example.com")
+        mailbox.data_reply = "451 Try again later"
+        started = datetime.now()
+        assert await sender.process_batch() == 1
+        first = (await rows())["a@example.com"]
+        # not due before its backoff
+        assert await sender.process_batch() == 0
+
+        mailbox.data_reply = None
+        await due_now()
+        assert await sender.process_batch() == 1
+        return started, first, (await rows())["a@example.com"]
+
+    started, first, final = run(engine, steps)
+
+    assert first.status == "pending" and first.attempts == 1 and "451" in first.last_error
+    delay = (first.next_attempt_at - started).total_seconds()
+    assert RETRY_DELAY * 0.8 - 1 <= delay <= RETRY_DELAY * 1.2 + 1
+    assert final.status == "sent" and final.last_error is None
+    assert sender.retried == 1 and sender.sent == 1
+    # doubled per attempt with jitter, capped at email_retry_max_delay
+    assert RETRY_DELAY * 2 * 0.8 <= sender._retry_delay(2) <= RETRY_DELAY * 2 * 1.2
+    assert sender._retry_delay(10) <= 100 * 1.2
+
+
+def test_final_failure(sender, mailbox, engine):
+    async def steps():
+        await enqueue(sender, "a@example.com", "refused@example.com")
+        mailbox.data_reply = "451 Try again later"
+        mailbox.refused.add("refused@example.com")
+        await sender.process_batch()
+        after_first = await rows()
+        await due_now()
+        await sender.process_batch()
+        return after_first, await rows()
+
+    after_first, final = run(engine, steps)
+
+    # a refused recipient fails at once, a temporary error once the attempts are used up
+    assert after_first["refused@example.com"].status == "failed"
+    assert after_first["a@example.com"].status == "pending"
+    assert final["a@example.com"].status == "failed" and final["a@example.com"].attempts == 2
+    assert mailbox.received == []
+    assert sender.failed == 2
+
+
+def test_reclaims_mails_left_sending(sender, mailbox, engine):
+    async def steps():
+        now = datetime.now()
+        async with database.SessionLocal() as db:
+            await db.execute(insert(EmailOutbox), [
+                # claimed by a worker that died, the claim ran out
+                {"recipient": "stuck@example.com", "subject": "s", "body": "b", "status": "sending", "attempts": 0, "next_attempt_at": now - timedelta(seconds = 1), "created_at": now},
+                # still claimed by a live worker
+                {"recipient": "claimed@example.com", "subject": "s", "body": "b", "status": "sending", "attempts": 0, "next_attempt_at": now + timedelta(seconds = 60), "created_at": now}
+            ])
+            await db.commit()
+        assert await sender.process_batch() == 1
+        return await rows()
+
+    mails = run(engine, steps)
+
+    assert mailbox.received == [["stuck@example.com"]]
+    assert mails["stuck@example.com"].status == "sent"
+    assert mails["claimed@example.com"].status == "sending"
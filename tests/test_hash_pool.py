@@ -0,0 +1,48 @@
+# a slot of the hashing pool stays taken until its job is done, even when the request waiting for it is cancelled
+import asyncio
+import threading
+import pytest
+from app.hashing.password_hash import HashPoolBusyError, HashWorkerPool
+
+
+def test_cancelled_job_keeps_its_slot_until_done():
+    pool = HashWorkerPool(max_workers = 1, max_queue = 1)
+    release = threading.Event()
+    started = threading.Event()
+    ran = []
+
+    def job(name):
+        ran.append(name)
+        started.set()
+        release.wait(5)
+        return name
+
+    async def steps():
+        running = asyncio.create_task(pool.run(job, "running"))
+        await asyncio.to_thread(started.wait, 5)
+        queued = asyncio.create_task(pool.run(job, "queued"))
+        await asyncio.sleep(0.05)
+        assert pool.in_flight == 2
+
+        # the queued job is dropped before it starts, its slot is free at once
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions = True)
+        assert pool.in_flight == 1
+
+        # the running job goes on after its caller is cancelled and still counts
+        running.cancel()
+        await asyncio.gather(running, return_exceptions = True)
+        assert pool.in_flight == 1
+        # so only one more job fits
+        following = asyncio.create_task(pool.run(job, "following"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(HashPoolBusyError):
+            await pool.run(job, "rejected")
+
+        release.set()
+        assert await following == "following"
+        return pool.in_flight
+
+    assert asyncio.run(steps()) == 0
+    assert ran == ["running", "following"]
+    assert pool.rejected == 1
@@ -0,0 +1,32 @@
+# the metrics routes are only answered for a superadmin, and the pool metrics work whatever pool the engine uses
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool, StaticPool
+from app.auth.jwt_handler import create_access_token
+from config.pool_metrics import TimedQueuePool, pool_status
+
+ROUTES = ["db", "auth-cache", "hash-pool", "email-outbox", "rate-limit", "company-cache"]
+
+
+@pytest.mark.parametrize("route", ROUTES)
+def test_superadmin_only(client, route):
+    assert client.get(f"/api/metrics/{route}").json()["status"] is True
+
+    # user2 is a plain user
+    headers = {"Authorization": "Bearer " + create_access_token(data = {"sub": "user2@example.com"})}
+    response = client.get(f"/api/metrics/{route}", headers = headers).json()
+    assert response["status"] is False and response["data"] is None
+
+
+def test_pool_status():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass = TimedQueuePool, pool_size = 3)
+    status = pool_status(engine)
+    assert status["pool_class"] == "TimedQueuePool" and status["pool_size"] == 3
+    assert {"checked_out", "overflow", "checkouts", "avg_wait_ms"} <= set(status)
+
+
+@pytest.mark.parametrize("poolclass", [NullPool, StaticPool])
+def test_pool_status_without_queue(poolclass):
+    # the test engine itself runs on a NullPool
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass = poolclass)
+    assert pool_status(engine) == {"pool_class": poolclass.__name__}
@@ -0,0 +1,143 @@
+# single use OTPs: an OTP is valid until its TTL passes or it is consumed, and only one consume of it succeeds
+import asyncio
+import fakeredis
+import pytest
+from sqlalchemy import delete, select
+import config.database as database
+from app.helper.otp_store import DatabaseOTPStore, OTPStore, OTPSweeper, RedisOTPStore
+from app.models.otp_model import OTPModel
+
+
+def run(engine, steps):
+    async def main():
+        async with database.SessionLocal() as db:
+            await db.execute(delete(OTPModel))
+            await db.commit()
+        try:
+            return await steps()
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+async def stored_emails():
+    async with database.SessionLocal() as db:
+        return sorted((await db.execute(select(OTPModel.email))).scalars().all())
+
+
+# every reply takes a moment to come back like from a real server, so concurrent consumes interleave between their
+# commands (a GET then DEL consume would let several of them through)
+class RoundTripClient:
+    def __init__(self, client):
+        self.client = client
+
+    def __getattr__(self, name):
+        command = getattr(self.client, name)
+
+        async def call(*args, **kwargs):
+            result = await command(*args, **kwargs)
+            await asyncio.sleep(0.01)
+            return result
+        return call
+
+
+def redis_store():
+    return RedisOTPStore(client = RoundTripClient(fakeredis.aioredis.FakeRedis(decode_responses = True)))
+
+
+def test_store_is_abstract():
+    with pytest.raises(TypeError):
+        OTPStore()
+
+
+@pytest.fixture(params = ["db", "redis"])
+def store(request):
+    return DatabaseOTPStore() if request.param == "db" else redis_store()
+
+
+def test_consume_once(store, engine):
+    async def steps():
+        await store.save("a@example.com", "111111")
+        # a new OTP replaces the earlier one
+        await store.save("a@example.com", "123456")
+        return [
+            await store.check("a@example.com", "111111"),
+            await store.check("a@example.com", "123456"),
+            # checking leaves the OTP valid, a wrong OTP does not consume it
+            await store.check("a@example.com", "123456"),
+            await store.consume("a@example.com", "654321"),
+            await store.consume("a@example.com", "123456"),
+            await store.consume("a@example.com", "123456"),
+            await store.check("a@example.com", "123456")
+        ]
+
+    assert run(engine, steps) == [False, True, True, False, True, False, False]
+
+
+def test_concurrent_consume(store, engine):
+    async def steps():
+        await store.save("a@example.com", "123456")
+        return await asyncio.gather(*(store.consume("a@example.com", "123456") for _ in range(5)))
+
+    assert sorted(run(engine, steps)) == [False] * 4 + [True]
+
+
+def test_expired_otp(engine):
+    store = DatabaseOTPStore()
+
+    async def steps():
+        await store.save("a@example.com", "123456", ttl = 0)
+        return await store.check("a@example.com", "123456"), await store.consume("a@example.com", "123456")
+
+    assert run(engine, steps) == (False, False)
+
+
+def test_redis_expiry():
+    store = redis_store()
+
+    async def steps():
+        await store.save("a@example.com", "123456")
+        default_ttl = await store.client.ttl("otp:a@example.com")
+        await store.save("b@example.com", "123456", ttl = 1)
+        await asyncio.sleep(1.1)
+        return default_ttl, await store.check("b@example.com", "123456"), await store.consume("b@example.com", "123456")
+
+    default_ttl, valid, consumed = asyncio.run(steps())
+    assert 590 <= default_ttl <= 600
+    assert (valid, consumed) == (False, False)
+
+
+def test_consume_in_caller_transaction(engine):
+    store = DatabaseOTPStore()
+
+    async def steps():
+        await store.save("a@example.com", "123456")
+        async with database.SessionLocal() as db:
+            assert await store.consume("a@example.com", "123456", db = db)
+            await db.rollback()
+        # rolled back with the caller's transaction, still valid
+        still_valid = await store.check("a@example.com", "123456")
+        async with database.SessionLocal() as db:
+            assert await store.consume("a@example.com", "123456", db = db)
+            await db.commit()
+        return still_valid, await store.check("a@example.com", "123456")
+
+    assert run(engine, steps) == (True, False)
+
+
+def test_sweeper_removes_expired(engine):
+    store = DatabaseOTPStore()
+    sweeper = OTPSweeper(store, interval = 60)
+
+    async def steps():
+        await store.save("expired@example.com", "123456", ttl = 0)
+        await store.save("valid@example.com", "123456")
+        sweeper.start()
+        # the first sweep runs right away
+        await asyncio.sleep(0.2)
+        await sweeper.stop()
+        return await stored_emails()
+
+    assert run(engine, steps) == ["valid@example.com"]
+    assert sweeper._task is None
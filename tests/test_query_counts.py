@@ -0,0 +1,46 @@
+# the number of SQL statements each read endpoint sends, with more rows than one per relationship so a lazy load per
+# row (N+1) or a join multiplying rows shows up as a changed count
+import pytest
+from app.auth.auth_user import auth_user_cache
+from app.helper.response_cache import company_cache
+
+
+@pytest.mark.parametrize("path, params, expected", [
+    # principal, count, page with the creators joined
+    ("/api/company/list", {}, 3),
+    ("/api/company/list", {"cursor_mode": "true"}, 2),
+    # principal, validators, company with its creator
+    ("/api/company/1", {"company_id": 1}, 3),
+    # principal, version of the member list, company, its users
+    ("/api/company/userlist/1", {"company_id": 1}, 4),
+    ("/api/company/companyinfo/1", {"company_id": 1}, 3),
+    # count, page, the companies of the whole page
+    ("/api/user/list", {}, 3),
+    ("/api/user/list", {"cursor_mode": "true"}, 2),
+    # validators, user with its companies
+    ("/api/user/2", {}, 3),
+])
+def test_statements_per_endpoint(client, statements, path, params, expected):
+    # measure cold: no cached principal and no cached company views
+    auth_user_cache.clear()
+    company_cache.local.clear()
+    del statements[:]
+
+    response = client.get(path, params = params)
+
+    assert response.status_code == 200
+    assert response.json()["status"] is True
+    assert len(statements) == expected, statements
+
+
+def test_statements_company_by_uuid(client, statements):
+    company_cache.local.clear()
+    company_uuid = client.get("/api/company/1", params = {"company_id": 1}).json()["data"]["uuid"]
+    company_cache.local.clear()
+    del statements[:]
+
+    response = client.post("/api/company/info/uuid", headers = {"uuid": company_uuid})
+
+    assert response.json()["status"] is True
+    # version of the view, company with its creator joined, its images
+    assert len(statements) == 3, statements
@@ -0,0 +1,51 @@
+# an import that runs into a saturated hashing pool keeps what it committed and reports the rest as retryable
+# instead of failing the whole request
+import pytest
+from sqlalchemy import delete
+from app.hashing.password_hash import Hash, HashPoolBusyError
+from app.helper.user_import import read_import_batch
+from app.models.user_model import UserModel
+from app.modules.user import user_service
+
+
+@pytest.fixture
+def busy_after(monkeypatch):
+    hashed = []
+
+    def busy_after(count: int):
+        async def bcrypt_async(password: str):
+            if len(hashed) >= count:
+                raise HashPoolBusyError("Password hashing pool is saturated")
+            hashed.append(password)
+            return f"hashed-{password}"
+        monkeypatch.setattr(Hash, "bcrypt_async", bcrypt_async)
+
+    # two rows per batch
+    monkeypatch.setattr(user_service, "read_import_batch", lambda records: read_import_batch(records, size = 2))
+    return busy_after
+
+
+def test_partial_report_when_pool_busy(client, run_sql, busy_after):
+    busy_after(3)
+    emails = ["import1@example.com", "import2@example.com", "import3@example.com", "import4@example.com", "not an email", "import6@example.com"]
+    users_file = "name,email,password,role_id\n" + "".join(f"user,{email},secret,3\n" for email in emails)
+
+    try:
+        response = client.post("/api/user/import", files = {"users_file": ("users.csv", users_file, "text/csv")})
+        assert response.status_code == 200
+        body = response.json()
+        assert body["status"] is True
+        report = body["data"]
+
+        # the first batch and the first row of the second are in, the rest of the file is left for a retry
+        assert [row["status"] for row in report["rows"]] == ["created", "created", "created", "retryable", "retryable", "retryable"]
+        assert [row["email"] for row in report["rows"]] == emails
+        assert (report["total"], report["created"], report["skipped"], report["retryable"]) == (6, 3, 0, 3)
+
+        # a retry of the same file once the pool has room imports the rest
+        busy_after(10)
+        report = client.post("/api/user/import", files = {"users_file": ("users.csv", users_file, "text/csv")}).json()["data"]
+        assert [row["status"] for row in report["rows"]] == ["exists", "exists", "exists", "created", "invalid_email", "created"]
+        assert report["retryable"] == 0
+    finally:
+        run_sql(delete(UserModel).where(UserModel.email.in_(emails)))
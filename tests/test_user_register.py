@@ -0,0 +1,43 @@
+# the profile image of a new user is stored under the extension of its content, whatever the client named the file
+import io
+import os
+import pytest
+from PIL import Image
+from app.storage.blob_store import blob_store
+from app.storage.storage_backend import LocalStorageBackend
+
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    backend = LocalStorageBackend(str(tmp_path))
+    monkeypatch.setattr(blob_store, "backend", backend)
+    return backend
+
+
+def png():
+    image = io.BytesIO()
+    Image.new("RGB", (8, 8)).save(image, "PNG")
+    return image.getvalue()
+
+
+def register(client, email: str, filename: str, content: bytes):
+    form = {"name": "new", "email": email, "password": "secret", "role_id": 3, "city": "city", "state": "state", "country": "country"}
+    return client.post("/api/user/register", data = form, files = {"profile_img": (filename, content, "application/octet-stream")}).json()
+
+
+def test_extension_from_content(client, uploads):
+    response = register(client, "sniffed@example.com", "avatar." + "x" * 200, png())
+
+    assert response["status"] is True
+    profile_img = response["data"]["profile_img"]
+    assert profile_img.startswith("http://testserver/uploads/blobs/") and profile_img.endswith(".png")
+    assert os.path.exists(uploads.local_path(profile_img[len("http://testserver/uploads/"):]))
+
+
+def test_rejects_non_images(client, uploads):
+    response = register(client, "script@example.com", "avatar.png", b"<?php echo 1; ?>")
+
+    assert response["status"] is False
+    assert response["response"] == "Uploaded file is not a supported image"
+    # no user is created for a rejected upload
+    assert register(client, "script@example.com", "avatar.png", png())["status"] is True
@@ -0,0 +1,50 @@
+# the update and delete routes answer with the same plain view as the read routes, never the ORM instance's __dict__
+import uuid
+from sqlalchemy import insert
+from app.models.company_model import CompanyModel
+from app.models.user_model import UserModel
+
+USER_FIELDS = {"id", "name", "email", "city", "state", "country", "companies", "profile_img", "profile_img_variants"}
+COMPANY_FIELDS = {"id", "uuid", "company_name", "company_email", "company_number", "company_zipcode", "company_city", "company_state", "company_country", "company_profile", "company_images", "company_image_variants", "company_creator"}
+
+
+def test_update_logged_user(client):
+    response = client.put("/api/user/update/loggeduser", json = {"city": "other city"}).json()
+    try:
+        assert response["status"] is True
+        assert set(response["data"]) == USER_FIELDS
+        assert response["data"]["city"] == "other city"
+        # user1 created companies 1 and 2
+        assert sorted(company["company_name"] for company in response["data"]["companies"]) == ["company 1", "company 2"]
+    finally:
+        client.put("/api/user/update/loggeduser", json = {"city": "city"})
+
+
+def test_delete_user(client, run_sql):
+    run_sql(insert(UserModel).values(id = 90, name = "gone", email = "gone@example.com", password = "x", role_id = 3, city = "city", state = "state", country = "country", profile_img = "blobs/ab/abcdef.png", profile_img_variants = {"64": {"webp": "blobs/ab/abcdef_64.webp"}}))
+
+    response = client.delete("/api/user/delete/90").json()
+
+    assert response["status"] is True
+    assert set(response["data"]) == USER_FIELDS
+    assert response["data"]["profile_img"] == "http://testserver/blobs/ab/abcdef.png"
+    # urls like the list / detail / uuid views, not the storage paths
+    assert response["data"]["profile_img_variants"] == {"64": {"webp": "http://testserver/blobs/ab/abcdef_64.webp"}}
+    assert client.get("/api/user/90").json()["status"] is False
+
+
+def test_update_and_delete_company(client, run_sql):
+    run_sql(insert(CompanyModel).values(id = 91, uuid = str(uuid.uuid4()), company_name = "written", company_email = "written@example.com", company_number = "1", company_zipcode = "1", company_city = "city", company_state = "state", company_country = "country", company_profile = "company/91.png", user_id = 1))
+
+    response = client.put("/api/company/update/91", params = {"company_id": 91}, json = {"company_name": "rewritten", "company_email": None, "company_number": None, "company_zipcode": None, "company_city": None, "company_state": None, "company_country": None}).json()
+    assert response["status"] is True
+    assert set(response["data"]) == COMPANY_FIELDS
+    assert response["data"]["company_name"] == "rewritten"
+    assert response["data"]["company_profile"] == "http://testserver/company/91.png"
+    assert response["data"]["company_creator"]["email"] == "user1@example.com"
+
+    response = client.delete("/api/company/delete/91", params = {"company_id": 91}).json()
+    assert response["status"] is True
+    assert set(response["data"]) == COMPANY_FIELDS
+    assert response["data"]["company_name"] == "rewritten"
+    assert client.get("/api/company/91", params = {"company_id": 91}).json()["status"] is False